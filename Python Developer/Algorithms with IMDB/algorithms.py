@@ -1,5 +1,16 @@
 
-from typing import Literal
+import csv
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from math import ceil
+from typing import Iterable, Iterator, Literal
+try:
+    # only needed to sort and filter the columnar storage faster
+    import numpy as np
+except ImportError:
+    np = None
 
 class Movie:
     def __init__(self, title: str, rating: float):
@@ -21,27 +32,370 @@ class Movie:
     def __ge__(self, other):
         return self.rating >= other.rating
 
+class TitleTable:
+    # The titles end to end in one buffer of UTF-8 bytes, a title is read back between its offsets.
+    # A title appended is stored once: slots is an open addressing table of the title ids by the hash of their bytes,
+    # a title appended again is found by comparing its bytes with the buffer, so no title is kept as a str.
+    # The slots are only built at the first append, a table filled straight from rows keeps its titles as given
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array("q", [0])
+        # -1 for an empty slot, the table is kept at most half full
+        self.slots: array | None = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, title_id: int) -> str:
+        return self.buffer[self.offsets[title_id]:self.offsets[title_id + 1]].decode("utf-8")
+
+    def __find(self, data: bytes) -> tuple[int, int]:
+        # the slot of the title and its id, or the empty slot where it goes and -1
+        buffer, offsets, slots = self.buffer, self.offsets, self.slots
+        mask = len(slots) - 1
+        slot = hash(data) & mask
+        while (title_id := slots[slot]) >= 0:
+            start, end = offsets[title_id], offsets[title_id + 1]
+            if end - start == len(data) and buffer[start:end] == data:
+                break
+            slot = (slot + 1) & mask
+        return slot, title_id
+
+    def __index(self):
+        # slots for twice the titles at least, a title stored several times is found under its first id
+        size = 8
+        while size < 2 * (len(self) + 1):
+            size *= 2
+        slots = self.slots = array("i", [-1]) * size
+        buffer, offsets = self.buffer, self.offsets
+        mask = size - 1
+        for title_id in range(len(self)):
+            data = bytes(buffer[offsets[title_id]:offsets[title_id + 1]])
+            slot = hash(data) & mask
+            while (found := slots[slot]) >= 0:
+                if buffer[offsets[found]:offsets[found + 1]] == data:
+                    break
+                slot = (slot + 1) & mask
+            else:
+                slots[slot] = title_id
+
+    def append(self, title: str) -> int:
+        if self.slots is None:
+            self.__index()
+        data = title.encode("utf-8")
+        slot, title_id = self.__find(data)
+        if title_id < 0:
+            title_id = len(self)
+            self.buffer += data
+            self.offsets.append(len(self.buffer))
+            self.slots[slot] = title_id
+            if 2 * len(self) > len(self.slots):
+                self.__index()
+        return title_id
+
+
+class MovieRow(Movie):
+    # A movie read from a MovieTable, which remembers its title so moving it in a table does not copy the title
+    def __init__(self, title: str, rating: float, titles: TitleTable, title_id: int):
+        super().__init__(title, rating)
+        self.titles = titles
+        self.title_id = title_id
+
+
+class MovieTable:
+    """
+    Columnar storage of movies, usable as the list of movies of a MovieCollection: the ratings are in an array
+    of doubles and the titles in a TitleTable, a row only holds the id of its title. A movie set or inserted from
+    outside the table reuses the title already stored, if any.
+    Sorting and slicing move the ratings and the title ids, never the titles.
+    """
+
+    def __init__(self, titles: TitleTable = None, ratings: array = None, title_ids: array = None):
+        self.titles: TitleTable = TitleTable() if titles is None else titles
+        self.ratings: array = array("d") if ratings is None else ratings
+        self.title_ids: array = array("q") if title_ids is None else title_ids
+
+    @staticmethod
+    def from_rows(rows: Iterable[tuple[str, float]]) -> "MovieTable":
+        # the titles are written straight to the buffer, without a Movie for each row nor looking them up
+        table = MovieTable()
+        buffer, offsets, ratings = table.titles.buffer, table.titles.offsets, table.ratings
+        for title, rating in rows:
+            buffer += title.encode("utf-8")
+            offsets.append(len(buffer))
+            ratings.append(rating)
+        table.title_ids = array("q", range(len(ratings)))
+        return table
+
+    @staticmethod
+    def from_columns(blocks: Iterable[tuple[list[str], list[float]]]) -> "MovieTable":
+        # the same as from_rows, a block of titles and ratings at a time
+        table = MovieTable()
+        buffer, offsets, ratings = table.titles.buffer, table.titles.offsets, table.ratings
+        for titles, block_ratings in blocks:
+            joined = "".join(titles)
+            if joined.isascii():
+                # an ascii title has as many bytes as characters, the block is encoded at once
+                buffer += joined.encode("ascii")
+                lengths = map(len, titles)
+            else:
+                encoded = [title.encode("utf-8") for title in titles]
+                buffer += b"".join(encoded)
+                lengths = map(len, encoded)
+            # the offsets go on from the end of the buffer, which accumulate gives back first
+            offsets.extend(accumulate(lengths, initial=offsets.pop()))
+            ratings.extend(block_ratings)
+        table.title_ids = array("q", range(len(ratings)))
+        return table
+
+    @staticmethod
+    def from_movies(movies: Iterable[Movie]) -> "MovieTable":
+        table = MovieTable()
+        for movie in movies:
+            table.append(movie)
+        return table
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return MovieTable(self.titles, self.ratings[index], self.title_ids[index])
+        title_id = self.title_ids[index]
+        return MovieRow(self.titles[title_id], self.ratings[index], self.titles, title_id)
+
+    def __setitem__(self, index: int, movie: Movie):
+        self.ratings[index] = movie.rating
+        self.title_ids[index] = self.__title_id(movie)
+
+    def __iter__(self):
+        for rating, title_id in zip(self.ratings, self.title_ids):
+            yield MovieRow(self.titles[title_id], rating, self.titles, title_id)
+
+    def __title_id(self, movie: Movie) -> int:
+        if isinstance(movie, MovieRow) and movie.titles is self.titles:
+            return movie.title_id
+        return self.titles.append(movie.title)
+
+    def append(self, movie: Movie):
+        self.ratings.append(movie.rating)
+        self.title_ids.append(self.__title_id(movie))
+
+    def insert(self, index: int, movie: Movie):
+        self.ratings.insert(index, movie.rating)
+        self.title_ids.insert(index, self.__title_id(movie))
+
+    def take(self, order: Iterable[int]) -> "MovieTable":
+        # the rows at the indexes of order, in this order
+        if np is not None:
+            order = np.asarray(order, dtype=np.int64)
+            ratings = array("d", np.frombuffer(self.ratings, dtype=np.float64)[order].tobytes())
+            title_ids = array("q", np.frombuffer(self.title_ids, dtype=np.int64)[order].tobytes())
+            return MovieTable(self.titles, ratings, title_ids)
+        return MovieTable(self.titles, array("d", (self.ratings[i] for i in order)),
+                          array("q", (self.title_ids[i] for i in order)))
+
+    def argsort(self):
+        # stable, the movies of the same rating stay in their order
+        if np is not None and len(self.ratings):
+            return np.argsort(np.frombuffer(self.ratings, dtype=np.float64), kind="stable")
+        return sorted(range(len(self.ratings)), key=self.ratings.__getitem__)
+
+    def sorted(self) -> "MovieTable":
+        return self.take(self.argsort())
+
+    def where_rating(self, rating: float) -> "MovieTable":
+        if np is not None and len(self.ratings):
+            return self.take(np.flatnonzero(np.frombuffer(self.ratings, dtype=np.float64) == rating))
+        return self.take([i for i, value in enumerate(self.ratings) if value == rating])
+
+
+class MovieCsvReader:
+    """
+    The (title, rating) rows of a CSV file, read by large blocks. A title can be quoted to hold commas,
+    the commas of a title which is not quoted are kept too as the rating is the last field.
+    The rows without a rating are not given but counted in malformed_rows.
+    A row is one line: a quote left open does not run into the next lines, its row is malformed.
+    The rows of a block are also given at once as two columns, the titles and the ratings, by blocks().
+    """
+
+    # every byte but the separators, deleted to check that each line of a block has a single comma
+    __OTHER_BYTES = bytes(range(256)).translate(None, b",\n")
+    # a line starting with a space or a blank line, which are stripped line by line
+    __LEADING_SPACE = re.compile(r"\n\s")
+
+    def __init__(self, path: str, buffer_size: int = 1 << 20):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.malformed_rows = 0
+
+    def __iter__(self):
+        for titles, ratings in self.blocks():
+            yield from zip(titles, ratings)
+
+    def blocks(self) -> Iterator[tuple[list[str], list[float]]]:
+        # the line ends are translated to "\n" on reading, a "\r\n" cut between two blocks included
+        with open(self.path, "r", encoding="utf-8") as f:
+            rest = ""
+            while block := f.read(self.buffer_size):
+                # the last line of a block goes on in the next one
+                text, _, rest = (rest + block).rpartition("\n")
+                yield self.__parse(text)
+            yield self.__parse(rest)
+
+    def __parse(self, text: str) -> tuple[list[str], list[float]]:
+        titles, ratings = [], []
+        # the lines with quotes are parsed one by one, the plain lines between them all at once
+        start = 0
+        quote = text.find('"')
+        while quote >= 0:
+            begin = text.rfind("\n", 0, quote) + 1
+            end = text.find("\n", quote)
+            if end < 0:
+                end = len(text)
+            self.__parse_plain(text[start:begin - 1] if begin > start else "", titles, ratings)
+            self.__parse_lines([text[begin:end]], titles, ratings)
+            start = end + 1
+            quote = text.find('"', start)
+        self.__parse_plain(text[start:], titles, ratings)
+        return titles, ratings
+
+    def __parse_plain(self, text: str, titles: list[str], ratings: list[float]):
+        if not text:
+            return
+        # with one comma on each line and nothing to strip, the fields alternate between titles and ratings
+        if (text.encode("utf-8").translate(None, self.__OTHER_BYTES) == b",\n" * text.count("\n") + b","
+                and not text[0].isspace() and not self.__LEADING_SPACE.search(text)):
+            fields = text.replace("\n", ",").split(",")
+            try:
+                # float ignores the spaces at the end of a line
+                ratings += map(float, fields[1::2])
+            except ValueError:
+                # the ratings of the block read so far are dropped, the lines are parsed again one by one
+                del ratings[len(titles):]
+            else:
+                titles += fields[0::2]
+                return
+        self.__parse_lines(text.split("\n"), titles, ratings)
+
+    def __parse_lines(self, lines: list[str], titles: list[str], ratings: list[float]):
+        for line in lines:
+            # stripped as the first loader did, the spaces around a line are not part of the title
+            line = line.strip()
+            if not line:
+                continue
+            if '"' in line:
+                row = self.__parse_quoted(line)
+            else:
+                # the rating after the last comma, the title before it
+                title, comma, rating = line.rpartition(",")
+                try:
+                    row = (title, float(rating)) if comma else None
+                except ValueError:
+                    row = None
+            if row is None:
+                self.malformed_rows += 1
+            else:
+                titles.append(row[0])
+                ratings.append(row[1])
+
+    @staticmethod
+    def __parse_quoted(line: str) -> tuple[str, float] | None:
+        # the csv module only parses the lines with quotes, each on its own
+        row = next(csv.reader((line,)), [])
+        try:
+            rating = float(row[-1])
+        except (ValueError, IndexError):
+            return None
+        if len(row) < 2:
+            return None
+        return ",".join(row[:-1]), rating
+
+
+class RatingIndex:
+    # The movies sorted by rating with their ratings aside, so a band of ratings is found by bisection
+    def __init__(self, movies: list[Movie] | MovieTable):
+        if isinstance(movies, MovieTable):
+            self.movies: list[Movie] | MovieTable = movies.sorted()
+            # the bisection runs on the rating column itself
+            self.ratings: list[float] | array = self.movies.ratings
+        else:
+            self.movies = sorted(movies, key=lambda movie: movie.rating)
+            self.ratings = [movie.rating for movie in self.movies]
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def insert(self, movie: Movie):
+        # after the movies of the same rating, as sorted keeps them in their order
+        position = bisect_right(self.ratings, movie.rating)
+        self.movies.insert(position, movie)
+        # a MovieTable inserts the rating in its own column, which is self.ratings
+        if isinstance(self.movies, list):
+            self.ratings.insert(position, movie.rating)
+
+    def range(self, low: float, high: float) -> list[Movie] | MovieTable:
+        # low <= rating < high
+        return self.movies[bisect_left(self.ratings, low):bisect_left(self.ratings, high)]
+
+    def exact(self, rating: float) -> list[Movie] | MovieTable:
+        return self.movies[bisect_left(self.ratings, rating):bisect_right(self.ratings, rating)]
+
+    def top(self, k: int) -> list[Movie] | MovieTable:
+        # the k best rated, the best first
+        k = min(max(k, 0), len(self.movies))
+        return self.movies[len(self.movies) - k:][::-1]
+
+    def percentile(self, percent: float) -> float:
+        # rating of the nearest rank: percent % of the movies are rated at most this
+        if not self.ratings:
+            raise ValueError("percentile of an empty collection")
+        rank = ceil(percent / 100 * len(self.ratings))
+        return self.ratings[min(max(rank, 1), len(self.ratings)) - 1]
+
+
 class MovieCollection:
 
-    def __init__(self, movies: list[Movie] ):
-        self.movies: list[Movie] = movies
+    def __init__(self, movies: list[Movie] | MovieTable):
+        # a MovieTable takes several times less memory than a list of Movie, the methods work on both
+        self.movies: list[Movie] | MovieTable = movies
+        # rows of the CSV file skipped by from_csv
+        self.malformed_rows = 0
+        # built at the first query, then kept valid by add
+        self.__rating_index: RatingIndex | None = None
+
+    @property
+    def rating_index(self) -> RatingIndex:
+        if self.__rating_index is None:
+            self.__rating_index = RatingIndex(self.movies)
+        return self.__rating_index
+
+    def add(self, movie: Movie):
+        self.movies.append(movie)
+        if self.__rating_index is not None:
+            # the row just appended to a MovieTable holds the id of its title, which the index reuses
+            self.__rating_index.insert(self.movies[-1])
 
     @staticmethod
-    def from_csv(path: str) -> "MovieCollection":
-        list_movie = []
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f.readlines():
-                if line:
-                    try:
-                        title, rating = line.strip().rsplit(",", 1)
-                        title = title.strip('"')
-                    except ValueError:
-                        print(line)
-                    else:
-                        list_movie.append(Movie(title, float(rating)))
-        return MovieCollection(list_movie)
+    def from_csv(path: str, columnar: bool = False) -> "MovieCollection":
+        reader = MovieCsvReader(path)
+        if columnar:
+            collection = MovieCollection(MovieTable.from_columns(reader.blocks()))
+        else:
+            movies = []
+            for titles, ratings in reader.blocks():
+                movies += map(Movie, titles, ratings)
+            collection = MovieCollection(movies)
+        collection.malformed_rows = reader.malformed_rows
+        return collection
+
+    def to_columnar(self) -> "MovieCollection":
+        return MovieCollection(self.movies if isinstance(self.movies, MovieTable)
+                               else MovieTable.from_movies(self.movies))
 
     def linear_search(self, rating: float) -> "MovieCollection":
+        if isinstance(self.movies, MovieTable):
+            return MovieCollection(self.movies.where_rating(rating))
         searched_movies = []
         for movie in self.movies:
             if movie.rating == rating:
@@ -71,9 +425,17 @@ class MovieCollection:
         return index_first
 
     def binary_search(self, rating: float) -> "MovieCollection":
-        start = self.binary_search_boundary(rating, bound="start")
-        end = self.binary_search_boundary(rating, bound="end")
-        return MovieCollection(self.movies[start:end+1])
+        # on the rating index, so the movies do not have to be sorted first
+        return MovieCollection(self.rating_index.exact(rating))
+
+    def search_range(self, low: float, high: float) -> "MovieCollection":
+        return MovieCollection(self.rating_index.range(low, high))
+
+    def top(self, k: int) -> "MovieCollection":
+        return MovieCollection(self.rating_index.top(k))
+
+    def percentile(self, percent: float) -> float:
+        return self.rating_index.percentile(percent)
 
 
     def bubblesort(self):
@@ -89,7 +451,8 @@ class MovieCollection:
         result = []
         i = j = 0
         while i < len(left) and j < len(right):
-            if left[i] < right[j]:
+            # the left one on ties, so the movies of the same rating keep their order as in MovieTable.sorted
+            if left[i] <= right[j]:
                 result.append(left[i])
                 i += 1
             else:
@@ -110,6 +473,10 @@ class MovieCollection:
             return self.__merge(sorted_left, sorted_right)
 
     def sort_by_merge(self):
+        if isinstance(self.movies, MovieTable):
+            # the rating column sorted at once, the movies of the same rating keep their order
+            self.movies = self.movies.sorted()
+            return
         sorted_movies = self.__mergesort(self.movies)
         self.movies = sorted_movies
 
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from dataclasses import dataclass, asdict
+from typing import Callable
+
+from algorithms import MovieCollection, MovieCsvReader
+
+
+@dataclass
+class MovieCsvConfig:
+    rows: int = 1_000_000
+    # Probability for a title to hold a comma, which makes it quoted
+    quoted_rate: float = 0.01
+    # Probability for a row to have no rating
+    malformed_rate: float = 0.001
+    seed: int = 0
+
+
+def generate_csv(config: MovieCsvConfig, path: str):
+    """
+    Writes a synthetic movie list, one "title,rating" row per line with ratings between 1.0 and 10.0
+    """
+    rng = random.Random(config.seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(config.rows):
+            title = f"Movie {index}"
+            if rng.random() < config.quoted_rate:
+                title = f'"{title}, part {rng.randint(1, 9)}"'
+            if rng.random() < config.malformed_rate:
+                f.write(f"{title}\n")
+            else:
+                f.write(f"{title},{rng.randint(10, 100) / 10}\n")
+
+
+def measure(function: Callable[[], object], repeat: int) -> tuple[float, object]:
+    """Gives the best time over repeat runs and the result of the last one"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def traced_size(function: Callable[[], object]) -> int:
+    """Bytes still allocated by the result of function"""
+    tracemalloc.start()
+    try:
+        result = function()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def run(config: MovieCsvConfig, repeat: int = 3) -> dict:
+    timing = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "movies.csv")
+        generate_csv(config, path)
+
+        timing["reader_rows"], _ = measure(lambda: sum(1 for _ in MovieCsvReader(path)), repeat)
+        timing["reader_blocks"], _ = measure(
+            lambda: sum(len(titles) for titles, _ in MovieCsvReader(path).blocks()), repeat)
+        timing["from_csv"], movies = measure(lambda: MovieCollection.from_csv(path), repeat)
+        timing["from_csv_columnar"], table = measure(lambda: MovieCollection.from_csv(path, columnar=True), repeat)
+        memory = {
+            "from_csv": traced_size(lambda: MovieCollection.from_csv(path)),
+            "from_csv_columnar": traced_size(lambda: MovieCollection.from_csv(path, columnar=True)),
+        }
+
+    timing["sorted_columnar"], _ = measure(table.movies.sorted, repeat)
+
+    return {
+        "python": sys.version.split()[0],
+        "config": asdict(config),
+        "movies": len(movies.movies),
+        "malformed_rows": movies.malformed_rows,
+        "bytes_per_movie": {storage: size / len(movies.movies) for storage, size in memory.items()},
+        "repeat": repeat,
+        "seconds": timing,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the loading of algorithms.py on a synthetic CSV.")
+    parser.add_argument("--rows", type=int, default=MovieCsvConfig.rows)
+    parser.add_argument("--quoted-rate", type=float, default=MovieCsvConfig.quoted_rate)
+    parser.add_argument("--malformed-rate", type=float, default=MovieCsvConfig.malformed_rate)
+    parser.add_argument("--seed", type=int, default=MovieCsvConfig.seed)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="File to write the JSON results to, stdout by default")
+    args = parser.parse_args()
+
+    results = run(MovieCsvConfig(rows=args.rows, quoted_rate=args.quoted_rate,
+                                 malformed_rate=args.malformed_rate, seed=args.seed),
+                  repeat=args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
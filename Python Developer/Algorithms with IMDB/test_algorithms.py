@@ -0,0 +1,241 @@
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+import unittest
+
+from algorithms import Movie, MovieCollection, MovieCsvReader, MovieTable, RatingIndex
+
+
+def rows(movies):
+    return [(movie.title, movie.rating) for movie in movies]
+
+
+class MovieTableTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(24)
+        # some titles come back several times, as remakes do
+        self.rows = [(f"Movie {rng.randrange(60)}", rng.randint(0, 20) / 2) for _ in range(200)]
+        self.table = MovieTable.from_rows(self.rows)
+
+    def test_from_rows(self):
+        self.assertEqual(rows(self.table), self.rows)
+        self.assertEqual(len(self.table), len(self.rows))
+        for (title, _), title_id in zip(self.rows, self.table.title_ids):
+            self.assertEqual(self.table.titles[title_id], title)
+
+    def test_titles_are_stored_once(self):
+        titles, size = self.table.titles, len(self.table.titles.buffer)
+        known_title = self.rows[0][0]
+        title_count = len(titles)
+        for _ in range(3):
+            self.table[5] = Movie(known_title, 1.0)
+            self.table.insert(0, Movie(known_title, 2.0))
+            self.table.append(self.table[7])
+        self.assertEqual(len(self.table.titles.buffer), size)
+        self.table.insert(3, Movie("Unknown", 3.0))
+        self.table[4] = Movie("Unknown", 4.0)
+        self.assertEqual(len(titles), title_count + 1)
+        # many titles appended, each one twice, make the slots grow
+        for i in range(2000):
+            self.assertEqual(titles.append(f"New {i}"), title_count + 1 + i)
+        for i in range(2000):
+            self.assertEqual(titles.append(f"New {i}"), title_count + 1 + i)
+            self.assertEqual(titles[title_count + 1 + i], f"New {i}")
+        self.assertEqual(rows(self.table[:5]), [(known_title, 2.0)] * 3 + [("Unknown", 3.0), ("Unknown", 4.0)])
+
+    def test_memory_per_movie(self):
+        # the columns take a few times less than a list of Movie with their titles, also once the titles are indexed
+        count = 50_000
+        titles = [f"Movie title {i}" for i in range(count)]
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        movies = [Movie(title, 5.0) for title in titles]
+        list_size = tracemalloc.get_traced_memory()[0]
+        del movies
+        tracemalloc.clear_traces()
+        table = MovieTable.from_rows((title, 5.0) for title in titles)
+        self.assertLess(tracemalloc.get_traced_memory()[0] / count, 48)
+        table.append(Movie("One more", 1.0))
+        table_size = tracemalloc.get_traced_memory()[0]
+        self.assertLess(table_size / count, 64)
+        # the titles of the list are counted too, as the table has its own copy of them
+        self.assertLess(2 * table_size, list_size + sum(map(sys.getsizeof, titles)))
+
+    def test_take(self):
+        for order in ([], [3, 1, 4, 1, 5], list(range(199, -1, -1))):
+            with self.subTest(order=order):
+                taken = self.table.take(order)
+                self.assertEqual(rows(taken), [self.rows[i] for i in order])
+                self.assertIs(taken.titles, self.table.titles)
+
+    def test_where_rating(self):
+        for rating in (0, 2.5, 3, 10, 11):
+            with self.subTest(rating=rating):
+                self.assertEqual(rows(self.table.where_rating(rating)),
+                                 [row for row in self.rows if row[1] == rating])
+        self.assertEqual(len(MovieTable().where_rating(1)), 0)
+
+    def test_slicing(self):
+        for index in (slice(None), slice(5, 17), slice(-10, None), slice(None, None, -1), slice(3, 100, 7),
+                      slice(50, 10)):
+            with self.subTest(index=index):
+                self.assertEqual(rows(self.table[index]), self.rows[index])
+        self.assertEqual((self.table[-1].title, self.table[-1].rating), self.rows[-1])
+
+    def test_insert(self):
+        expected = list(self.rows)
+        for index in (0, 50, len(expected), -1):
+            self.table.insert(index, Movie(f"Inserted {index}", 9.5))
+            expected.insert(index, (f"Inserted {index}", 9.5))
+        self.assertEqual(rows(self.table), expected)
+
+    def test_sort_by_merge_keeps_ties_in_order(self):
+        reference = sorted(self.rows, key=lambda row: row[1])
+        for columnar in (False, True):
+            with self.subTest(columnar=columnar):
+                collection = MovieCollection([Movie(title, rating) for title, rating in self.rows])
+                if columnar:
+                    collection = collection.to_columnar()
+                collection.sort_by_merge()
+                self.assertEqual(rows(collection.movies), reference)
+
+
+class RatingIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(23)
+        # a few ratings only, so most movies share their rating with others
+        self.movies = [Movie(f"Movie {i}", rng.randint(0, 40) / 4) for i in range(500)]
+        # the sorted list the index must behave as, the movies of the same rating in their order
+        self.reference = sorted(self.movies, key=lambda movie: movie.rating)
+
+    def indexes(self):
+        # the index on each storage of the movies
+        return {"list": RatingIndex(list(self.movies)), "table": RatingIndex(MovieTable.from_movies(self.movies))}
+
+    def test_range(self):
+        bounds = [(0, 10.5), (2.5, 7.5), (2.6, 2.7), (5, 5), (7.5, 2.5), (-1, 0), (10, 11), (3.25, 3.5)]
+        for name, index in self.indexes().items():
+            for low, high in bounds:
+                with self.subTest(name, low=low, high=high):
+                    self.assertEqual(rows(index.range(low, high)),
+                                     rows(movie for movie in self.reference if low <= movie.rating < high))
+
+    def test_exact(self):
+        for name, index in self.indexes().items():
+            for rating in (0, 2.5, 2.6, 10, 11):
+                with self.subTest(name, rating=rating):
+                    self.assertEqual(rows(index.exact(rating)),
+                                     rows(movie for movie in self.reference if movie.rating == rating))
+
+    def test_top(self):
+        for name, index in self.indexes().items():
+            for k in (-1, 0, 1, 7, 499, 500, 600):
+                with self.subTest(name, k=k):
+                    self.assertEqual(rows(index.top(k)), rows(self.reference[::-1][:max(k, 0)]))
+
+    def test_percentile(self):
+        ratings = [movie.rating for movie in self.reference]
+        for name, index in self.indexes().items():
+            for percent in (0, 0.1, 1, 10, 25, 33.3, 50, 90, 99, 99.9, 100):
+                with self.subTest(name, percent=percent):
+                    # the lowest rating with at least percent % of the movies rated at most this
+                    expected = min(rating for rating in ratings
+                                   if sum(other <= rating for other in ratings) >= percent / 100 * len(ratings))
+                    self.assertEqual(index.percentile(percent), expected)
+
+    def test_percentile_of_no_movie(self):
+        for index in (RatingIndex([]), RatingIndex(MovieTable())):
+            with self.assertRaises(ValueError):
+                index.percentile(50)
+
+    def test_add_keeps_the_index_valid(self):
+        rng = random.Random(24)
+        for columnar in (False, True):
+            with self.subTest(columnar=columnar):
+                collection = MovieCollection(list(self.movies[:100]))
+                if columnar:
+                    collection = collection.to_columnar()
+                collection.top(1)
+                for i in range(200):
+                    collection.add(Movie(f"Added {i}", rng.randint(0, 40) / 4))
+                movies = collection.movies
+                self.assertEqual(len(movies), 300)
+                rebuilt = RatingIndex(list(Movie(movie.title, movie.rating) for movie in movies))
+                self.assertEqual(rows(collection.search_range(2.5, 7.5).movies), rows(rebuilt.range(2.5, 7.5)))
+                self.assertEqual(rows(collection.top(20).movies), rows(rebuilt.top(20)))
+                self.assertEqual(collection.percentile(50), rebuilt.percentile(50))
+                self.assertEqual(rows(collection.binary_search(5).movies), rows(rebuilt.exact(5)))
+
+
+class MovieCsvReaderTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "movies.csv")
+
+    def read(self, content, buffer_size=1 << 20):
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        reader = MovieCsvReader(self.path, buffer_size)
+        return list(reader), reader.malformed_rows
+
+    def test_same_rows_as_the_first_loader(self):
+        rng = random.Random(25)
+        lines = [f"{rng.choice(['  ', '', ' '])}Movie {i}{rng.choice(['', ' II', ': the end'])},"
+                 f"{rng.randint(0, 100) / 10}{rng.choice(['', ' ', '  '])}" for i in range(300)]
+        content = "\r\n".join(lines) + "\n"
+        # the rows of the first loader: the line stripped then split at its last comma
+        expected = [(line.strip().rsplit(",", 1)[0], float(line.strip().rsplit(",", 1)[1])) for line in lines]
+        for buffer_size in (1, 64, 1 << 20):
+            with self.subTest(buffer_size=buffer_size):
+                self.assertEqual(self.read(content, buffer_size), (expected, 0))
+
+    def test_commas_and_quotes(self):
+        content = ('"Crouching Tiger, Hidden Dragon",7.9\n'
+                   'Hello, World,6.5\n'
+                   '"  Quoted  ",6.0\n'
+                   '"He said ""no""",5.5\n'
+                   '\n'
+                   '"Open quote,4.0\n'
+                   'After the open quote,3.0\n')
+        self.assertEqual(self.read(content), ([("Crouching Tiger, Hidden Dragon", 7.9), ("Hello, World", 6.5),
+                                               ("  Quoted  ", 6.0), ('He said "no"', 5.5),
+                                               ("After the open quote", 3.0)], 1))
+
+    def test_malformed_rows_are_counted(self):
+        content = "No rating\nBad rating,high\n,\nGood,8.1\n  \nAlso good,\t7\n"
+        self.assertEqual(self.read(content), ([("Good", 8.1), ("Also good", 7.0)], 3))
+
+    def test_lines_with_more_or_less_than_one_comma(self):
+        # as many commas as lines, which must not pair the fields of different lines
+        content = "1917,2019,8.3\n42\nAmélie,8.3\n"
+        for buffer_size in (1, 64, 1 << 20):
+            with self.subTest(buffer_size=buffer_size):
+                self.assertEqual(self.read(content, buffer_size), ([("1917,2019", 8.3), ("Amélie", 8.3)], 1))
+
+    def test_blocks_give_the_rows(self):
+        content = "".join(f'"Movie, {i}",{i % 10}.5\n' if i % 7 == 0 else f"Movie {i},{i % 10}.0\n"
+                          for i in range(200))
+        expected, _ = self.read(content)
+        reader = MovieCsvReader(self.path, buffer_size=100)
+        titles, ratings = [], []
+        for block_titles, block_ratings in reader.blocks():
+            self.assertEqual(len(block_titles), len(block_ratings))
+            titles += block_titles
+            ratings += block_ratings
+        self.assertEqual(list(zip(titles, ratings)), expected)
+        self.assertEqual(len(expected), 200)
+
+    def test_from_csv_storages(self):
+        self.read('"A, B",5.0\nC,7.5\nbroken\nÉté,6.0\n')
+        for columnar in (False, True):
+            with self.subTest(columnar=columnar):
+                collection = MovieCollection.from_csv(self.path, columnar)
+                self.assertEqual(rows(collection.movies), [("A, B", 5.0), ("C", 7.5), ("Été", 6.0)])
+                self.assertEqual(collection.malformed_rows, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
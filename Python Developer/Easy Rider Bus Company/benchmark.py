@@ -0,0 +1,153 @@
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+
+from dataclasses import dataclass, asdict
+from typing import Callable
+
+from rider import BusNetwork, HoursTime, JourneyPlanner, Validator, RULE_SET, read_records
+
+SUFFIXES = ("Road", "Avenue", "Boulevard", "Street")
+# Number of earliest arrival queries timed on the journey planner
+JOURNEY_QUERIES = 200
+
+
+@dataclass
+class TimetableConfig:
+    lines: int = 1_000
+    stops_per_line: int = 20
+    # Probability for a stop to be shared with other lines, ie to be a transfer stop
+    transfer_density: float = 0.2
+    # Probability for a record to have one corrupted field
+    error_rate: float = 0.05
+    seed: int = 0
+
+
+def stop_name(index: int) -> str:
+    return f"Stop{index} {SUFFIXES[index % len(SUFFIXES)]}"
+
+
+def corrupt(item: dict, rng: random.Random):
+    """
+    Gives a format, type or required error to one field of the record, keeping it readable by BusNetwork
+    """
+    match rng.randrange(5):
+        case 0: item["stop_name"] = item["stop_name"].lower()
+        case 1: item["stop_type"] = "X"
+        case 2:
+            # one leading zero dropped, "08:05" becomes "8:05" and "00:05" becomes "0:05"
+            hours, minutes = map(int, item["a_time"].split(":"))
+            item["a_time"] = f"{hours}:{minutes:02d}"
+        case 3: item["next_stop"] = str(item["next_stop"])
+        case 4: item["stop_name"] = ""
+
+
+def generate_timetable(config: TimetableConfig) -> list[dict]:
+    """
+    Generates the records of a synthetic bus network: each line runs once a day through its own stops,
+    and some of its stops are taken from a pool shared between the lines.
+    """
+    rng = random.Random(config.seed)
+    shared_pool = max(1, int(config.lines * config.stops_per_line * config.transfer_density / 4))
+    next_own_stop = shared_pool
+    data = []
+    for bus_id in range(1, config.lines + 1):
+        minutes = rng.randrange(5 * 60, 12 * 60)
+        stop_ids = rng.sample(range(1, 10 * config.stops_per_line), config.stops_per_line)
+        for position, stop_id in enumerate(stop_ids):
+            if rng.random() < config.transfer_density:
+                name_index = rng.randrange(shared_pool)
+            else:
+                name_index = next_own_stop
+                next_own_stop += 1
+            minutes += rng.randint(1, 5)
+            last = position == config.stops_per_line - 1
+            item = {
+                "bus_id": bus_id,
+                "stop_id": stop_id,
+                "stop_name": stop_name(name_index),
+                "next_stop": 0 if last else stop_ids[position + 1],
+                "stop_type": "S" if position == 0 else "F" if last else rng.choice(("", "O")),
+                "a_time": f"{minutes // 60 % 24:02d}:{minutes % 60:02d}",
+            }
+            if rng.random() < config.error_rate:
+                corrupt(item, rng)
+            data.append(item)
+    # The records of a feed are not grouped by line, nor ordered along the lines
+    rng.shuffle(data)
+    return data
+
+
+def journey_queries(planner: JourneyPlanner, count: int, seed: int) -> list[tuple[str, str, HoursTime]]:
+    """Random origins, destinations and departure times between 05:00 and 13:00, the hours of the synthetic lines"""
+    rng = random.Random(seed)
+    return [(rng.choice(planner.stop_names), rng.choice(planner.stop_names), HoursTime(rng.randrange(5, 13), 0))
+            for _ in range(count)]
+
+
+def measure(function: Callable[[], object], repeat: int) -> tuple[float, object]:
+    """Gives the best time over repeat runs and the result of the last one"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(config: TimetableConfig, repeat: int = 3) -> dict:
+    data = generate_timetable(config)
+    text = json.dumps(data)
+    timing = {}
+
+    timing["json_parse"], data = measure(lambda: json.loads(text), repeat)
+    timing["json_stream"], _ = measure(lambda: sum(1 for _ in read_records(io.StringIO(text))), repeat)
+    timing["bus_network"], network = measure(lambda: BusNetwork(data), repeat)
+    validator = Validator(RULE_SET)
+    timing["compute_format_error"], _ = measure(lambda: validator.compute_format_error(data), repeat)
+    timing["count_format_error"], _ = measure(lambda: validator.count_format_error(data), repeat)
+    timing["compute_network_error"], _ = measure(lambda: validator.compute_network_error(network), repeat)
+    timing["get_transfer_stop"], transfer_stop = measure(network.get_transfer_stop, repeat)
+    timing["journey_planner"], planner = measure(lambda: JourneyPlanner(network), repeat)
+    queries = journey_queries(planner, JOURNEY_QUERIES, config.seed)
+    timing["earliest_arrival"], _ = measure(lambda: [planner.earliest_arrival(*query) for query in queries], repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        timing["resume_network"], _ = measure(network.resume_network, repeat)
+
+    return {
+        "python": sys.version.split()[0],
+        "config": asdict(config),
+        "records": len(data),
+        "transfer_stops": len(transfer_stop),
+        "connections": len(planner.trip),
+        "journey_queries_per_second": len(queries) / timing["earliest_arrival"],
+        "repeat": repeat,
+        "seconds": timing,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the hot paths of rider.py on a synthetic timetable.")
+    parser.add_argument("--lines", type=int, default=TimetableConfig.lines)
+    parser.add_argument("--stops-per-line", type=int, default=TimetableConfig.stops_per_line)
+    parser.add_argument("--transfer-density", type=float, default=TimetableConfig.transfer_density)
+    parser.add_argument("--error-rate", type=float, default=TimetableConfig.error_rate)
+    parser.add_argument("--seed", type=int, default=TimetableConfig.seed)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="File to write the JSON results to, stdout by default")
+    args = parser.parse_args()
+
+    results = run(TimetableConfig(lines=args.lines, stops_per_line=args.stops_per_line,
+                                  transfer_density=args.transfer_density, error_rate=args.error_rate,
+                                  seed=args.seed),
+                  repeat=args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
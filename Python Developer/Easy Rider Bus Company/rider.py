@@ -1,13 +1,19 @@
+import io
 import json
-import string
+import mmap
 import re
+import struct
+import sys
 
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Callable
+from typing import Callable, Collection, Iterable, Iterator, Mapping, Sequence, TextIO
 from collections import Counter
-from itertools import combinations, pairwise, chain
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from itertools import pairwise, chain, batched
 from datetime import time
+from array import array
+from bisect import bisect_left
 
 test_input = """
 [
@@ -128,8 +134,16 @@ class ErrorType(Enum):
     FORMAT = "format"
     TIME = "time"
 
+class LineError(Enum):
+    CYCLE = "cycle"
+    BROKEN_CHAIN = "broken chain"
+    DUPLICATE_STOP = "duplicate stop"
+    UNREACHABLE_STOP = "unreachable stop"
+
 ErrorField = dict[FieldName, bool]
 ReportError = dict[ErrorType, list[FieldName]]
+# Marks a field absent from an item, as opposed to a field present with an empty value
+_MISSING = object()
 
 #endregion
 
@@ -141,10 +155,40 @@ class Field:
     type: FieldType
 
 
-class HoursTime:
+# Rules of the records of a bus network
+RULE_SET = [Field(name=FieldName.BUS_ID, required=True, type=FieldType.INTEGER),
+            Field(name=FieldName.STOP_ID, required=True, type=FieldType.INTEGER),
+            Field(name=FieldName.STOP_NAME, required=True, type=FieldType.STRING),
+            Field(name=FieldName.NEXT_STOP, required=True, type=FieldType.INTEGER),
+            Field(name=FieldName.STOP_TYPE, required=False, type=FieldType.CHARACTER),
+            Field(name=FieldName.A_TIME, required=True, type=FieldType.STRING)]
 
-    def __init__(self, hour, minute=0):
-        self.time = time(hour, minute)
+
+class HoursTime:
+    """
+    Time of the day stored as a number of minutes since midnight.
+    Instances are immutable and shared: there is a single object for each minute of the day.
+    """
+    # The minutes are read through a property without setter, as an instance is shared by every stop at this time
+    __slots__ = ("__minutes",)
+    MINUTES_PER_DAY = 24 * 60
+    __instances: dict[int, "HoursTime"] = {}
+
+    def __new__(cls, hour, minute=0):
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(f"Invalid time {hour}:{minute}")
+        return cls.from_minutes(hour * 60 + minute)
+
+    @classmethod
+    def from_minutes(cls, minutes: int) -> "HoursTime":
+        instance = cls.__instances.get(minutes)
+        if instance is None:
+            if not 0 <= minutes < cls.MINUTES_PER_DAY:
+                raise ValueError(f"Invalid number of minutes {minutes}")
+            instance = object.__new__(cls)
+            instance.__minutes = minutes
+            cls.__instances[minutes] = instance
+        return instance
 
     @staticmethod
     def from_string(value: str) -> "HoursTime":
@@ -152,31 +196,55 @@ class HoursTime:
             return HoursTime(0, 0)
         return HoursTime(*map(int, value.split(":")))
 
+    @property
+    def minutes(self) -> int:
+        return self.__minutes
+
+    @property
+    def hour(self) -> int:
+        return self.minutes // 60
+
+    @property
+    def minute(self) -> int:
+        return self.minutes % 60
+
+    @property
+    def time(self) -> time:
+        return time(self.hour, self.minute)
+
+    def __reduce__(self):
+        # Unpickled times are shared instances too
+        return HoursTime.from_minutes, (self.minutes,)
+
     def __add__(self, other : "HoursTime") -> "HoursTime":
-        minutes = (self.time.minute + other.time.minute) % 60
-        hours = (self.time.hour + other.time.hour + (self.time.minute + other.time.minute) // 60) % 24
-        return HoursTime(hours, minutes)
+        return HoursTime.from_minutes((self.minutes + other.minutes) % HoursTime.MINUTES_PER_DAY)
+
+    def __eq__(self, other):
+        return isinstance(other, HoursTime) and self.minutes == other.minutes
+
+    def __hash__(self):
+        return self.minutes
 
     def __lt__(self, other : "HoursTime"):
-        return self.time < other.time
+        return self.minutes < other.minutes
 
     def __gt__(self, other : "HoursTime"):
-        return self.time > other.time
+        return self.minutes > other.minutes
 
     def __le__(self, other : "HoursTime"):
-        return self.time <= other.time
+        return self.minutes <= other.minutes
 
     def __ge__(self, other : "HoursTime"):
-        return self.time >= other.time
+        return self.minutes >= other.minutes
 
     def __str__(self):
-        return f"{self.time.hour:02d}:{self.time.minute:02d}"
+        return f"{self.hour:02d}:{self.minute:02d}"
 
     def __repr__(self):
-        return f"HoursTime({self.time.hour}: {self.time.minute})"
+        return f"HoursTime({self.hour}: {self.minute})"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Stop:
     id: int = field(compare=False)
     name: str
@@ -184,17 +252,120 @@ class Stop:
     type: str = field(compare=False)
     a_time: HoursTime = field(compare=False)
 
+
+def read_records(stream: TextIO, chunk_size: int = 64 * 1024) -> Iterator[dict]:
+    """
+    Lazily parses a JSON array of records from a text stream, yielding one record at a time.
+    Only the current chunk and the record being decoded are kept in memory.
+
+    :param stream: Text stream (file, stdin...) containing a JSON array of records.
+    :type stream: TextIO
+    :param chunk_size: Number of characters read from the stream at once.
+    :type chunk_size: int
+    :return: Iterator over the records of the array.
+    :rtype: Iterator[dict]
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    end_of_stream = False
+
+    def fill() -> bool:
+        # Drop what is already parsed and append a new chunk, return False when nothing more can be read
+        nonlocal buffer, position, end_of_stream
+        if end_of_stream:
+            return False
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            end_of_stream = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def next_char() -> str:
+        # Skip whitespaces and give the next significant character without consuming it
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                return ""
+
+    if next_char() != "[":
+        raise ValueError("Expecting a JSON array of records")
+    position += 1
+    expect_item = True
+    # A comma must be followed by a record, as json.load rejects a trailing comma
+    after_comma = False
+    while True:
+        char = next_char()
+        if char == "]":
+            if after_comma:
+                raise json.JSONDecodeError("Illegal trailing comma before end of array", buffer, position)
+            return
+        if char == "":
+            raise ValueError("Unexpected end of stream, the JSON array is not closed")
+        if char == ",":
+            if expect_item:
+                raise ValueError("Unexpected ',' in the JSON array")
+            expect_item = after_comma = True
+            position += 1
+            continue
+        if not expect_item:
+            raise ValueError(f"Expecting ',' between records, got '{char}'")
+        while True:
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                # The record is cut by the end of the chunk, read more of it unless the stream is over
+                if not fill():
+                    raise
+        expect_item = after_comma = False
+        yield item
+
 #endregion
 
 
 class BusNetwork:
 
-    def __init__(self, data: list[dict]):
-        self.list_stop: list[Stop] = self.__extract_stop(data)
-        self.network_line: dict[int, list[Stop]] = self.__extract_line(data)
+    def __init__(self, data: Iterable[dict]):
+        # Stops of the records without bus_id, the other stops are kept in their line only
+        self.unassigned_stop: list[Stop] = []
+        self.network_line: dict[int, list[Stop]] = {}
         self.good_line: dict[int, bool] = {}
+        # Errors found while ordering a line along its next_stop chain
+        self.line_error: dict[int, list[LineError]] = {}
+        # Stops of each line in the order of their records, a patched line is ordered again from them
+        self.line_records: dict[int, list[Stop]] = {}
+        # Inverted index giving, for each stop name, the lines serving it and the number of records by stop type
+        self.stop_lines: dict[str, set[int]] = {}
+        self.stop_types: dict[str, Counter] = {}
+        self.stop_by_name: dict[str, Stop] = {}
+        self.__extract_network(data)
+        # The lists are not modified in place, so the ordering of a line does not alter its records
+        self.line_records.update(self.network_line)
+        self.__validate_line()
         self.__sort_lines()
 
+    @classmethod
+    def from_stream(cls, stream: TextIO) -> "BusNetwork":
+        """
+        Builds the network from a text stream containing a JSON array of records, parsing one record at a time.
+
+        :param stream: Text stream (file, stdin...) to read.
+        :type stream: TextIO
+        :return: The network built from the stream.
+        :rtype: BusNetwork
+        """
+        return cls(read_records(stream))
+
+    @property
+    def list_stop(self) -> list[Stop]:
+        return [stop for line in chain(self.network_line.values(), [self.unassigned_stop]) for stop in line]
 
     def __item_to_stop(self, item: dict) -> Stop:
         """
@@ -213,74 +384,128 @@ class BusNetwork:
             a_time=HoursTime.from_string(item.get("a_time", ""))
         )
 
-    def __extract_stop(self, data: list[dict]) -> list[Stop]:
-        """
-        Extracts a list of Stop objects from the given data.
-
-        :param data: List of dictionaries containing stop information.
-        :type data: list[dict]
-        :return: List of Stop objects.
-        :rtype: list[Stop]
-        """
-        list_stop = []
-        for item in data:
-            list_stop.append(self.__item_to_stop(item))
-        return list_stop
-
-    def __extract_line(self, data: list[dict]) -> dict[int, list[Stop]]:
+    def __extract_network(self, data: Iterable[dict]):
         """
-        Extracts bus lines from the given data and populates the network_line attribute.
+        Extracts the stops and the bus lines from the given data in a single pass.
+        Each record gives one Stop object, stored in the line it belongs to.
 
-        :param data: The input data containing bus line information.
-        :type data: list[dict]
-        :return: A dictionary mapping bus line IDs to a list of stops on that line.
-        :rtype: dict[int, list[Stop]]
+        :param data: Iterable of dictionaries containing stop information, it is consumed only once.
+        :type data: Iterable[dict]
         """
-        line: dict[int, list[Stop]] = {}
         for item in data:
+            new_stop = self.__item_to_stop(item)
             line_id = int(item.get("bus_id", 0))
             if line_id != 0:
-                new_stop = self.__item_to_stop(item)
-                if line_id not in line.keys():
-                    line[line_id] = [new_stop]
+                if line_id not in self.network_line:
+                    self.network_line[line_id] = [new_stop]
                 else:
-                    line[line_id].append(new_stop)
-        return line
+                    self.network_line[line_id].append(new_stop)
+            else:
+                self.unassigned_stop.append(new_stop)
+            self.__index_stop(new_stop, line_id)
+
+    def __index_stop(self, stop: Stop, line_id: int):
+        """
+        Registers the stop in the inverted index, a line_id of 0 means the stop does not belong to any line.
+        """
+        self.stop_by_name.setdefault(stop.name, stop)
+        if stop.type not in self.stop_types:
+            self.stop_types[stop.type] = Counter()
+        self.stop_types[stop.type][stop.name] += 1
+        if line_id != 0:
+            if stop.name not in self.stop_lines:
+                self.stop_lines[stop.name] = {line_id}
+            else:
+                self.stop_lines[stop.name].add(line_id)
+
+    def __unindex_stop(self, stop: Stop, line_id: int):
+        """
+        Removes the stop from the inverted index, the line must be unindexed entirely as the other stops
+        of the line with the same name are unregistered too.
+        """
+        type_count = self.stop_types[stop.type]
+        type_count[stop.name] -= 1
+        if type_count[stop.name] <= 0:
+            del type_count[stop.name]
+            if not any(stop.name in count for count in self.stop_types.values()):
+                self.stop_by_name.pop(stop.name, None)
+        if line_id != 0 and stop.name in self.stop_lines:
+            self.stop_lines[stop.name].discard(line_id)
+            if not self.stop_lines[stop.name]:
+                del self.stop_lines[stop.name]
 
     def __validate_line(self):
         """
         Validates the extracted bus lines by checking if they form a valid network.
         """
-        good_line = {}
-        if self.network_line:
-            for line_id, line in self.network_line.items():
-                good_line[line_id] = self.check_line(line)
+        for line_id, line in self.network_line.items():
+            self.good_line[line_id] = self.check_line(line)
 
     def __sort_lines(self):
-        good_line = [ line_id for line_id, is_valid in self.good_line.items() if is_valid ]
-        for line_id in good_line:
-            line = self.get_line_by_id(line_id)
-            self.network_line[line_id] = self.__sorted_line(line)
+        """
+        Orders the good lines along their next_stop chain, the lines without start or finish stop are kept as they are.
+        """
+        for line_id, line in self.network_line.items():
+            self.__sort_line(line_id, line)
+
+    def __sort_line(self, line_id: int, line: list[Stop]):
+        # Only a validated line is reordered, as the time check of the other lines runs on the stops as given
+        if not self.good_line[line_id]:
+            self.network_line[line_id] = line
+            return
+        sorted_line, line_error = self.__sorted_line(line)
+        self.network_line[line_id] = sorted_line
+        if line_error:
+            self.line_error[line_id] = line_error
+
+    def __sorted_line(self, line: list[Stop]) -> tuple[list[Stop], list[LineError]]:
+        """
+        Orders a line from its start stop by following the next_stop chain through a stop_id index,
+        so each stop is visited once.
 
-    def __sorted_line(self, line: list[Stop]) -> list[Stop]:
-        working_line = line[:]
-        sorted_line = []
-        start_stop = next((stop for stop in working_line if stop.type == "S"), None)
+        :param line: The stops of the line, in any order.
+        :type line: list[Stop]
+        :return: The ordered line and the errors found in the chain.
+        :rtype: tuple[list[Stop], list[LineError]]
+        """
+        line_error = []
+        stop_by_id: dict[int, Stop] = {}
+        start_stop = None
+        for stop in line:
+            if stop.id in stop_by_id:
+                if LineError.DUPLICATE_STOP not in line_error:
+                    line_error.append(LineError.DUPLICATE_STOP)
+            else:
+                stop_by_id[stop.id] = stop
+            if start_stop is None and stop.type == StopType.START.value:
+                start_stop = stop
         if start_stop is None:
-            return line
-        working_line.remove(start_stop)
+            return line, line_error
 
+        sorted_line = []
+        visited_id = set()
         current_stop = start_stop
         while current_stop is not None:
+            if current_stop.id in visited_id:
+                line_error.append(LineError.CYCLE)
+                break
+            visited_id.add(current_stop.id)
             sorted_line.append(current_stop)
-            if current_stop in working_line:
-                working_line.remove(current_stop)
-            current_stop = next((stop for stop in working_line if stop.id == current_stop.next_stop_id), None)
+            if current_stop.next_stop_id == 0:
+                break
+            current_stop = stop_by_id.get(current_stop.next_stop_id)
+            if current_stop is None:
+                line_error.append(LineError.BROKEN_CHAIN)
+
         # In case some errors occur in stop_id, we just add the remaining stops at the ends
-        if working_line:
-            sorted_line.extend(working_line)
+        if len(sorted_line) < len(line):
+            placed = {id(stop) for stop in sorted_line}
+            remaining = [stop for stop in line if id(stop) not in placed]
+            if any(stop.id not in visited_id for stop in remaining):
+                line_error.append(LineError.UNREACHABLE_STOP)
+            sorted_line.extend(remaining)
 
-        return sorted_line
+        return sorted_line, line_error
 
     def get_lines_id(self):
         return self.network_line.keys()
@@ -288,29 +513,129 @@ class BusNetwork:
     def get_line_by_id(self, bus_id: int) -> list[Stop]:
         return self.network_line.get(bus_id, [])
 
-    def __get_stop_by_type(self, stop_type: StopType) -> list[Stop]:
-        return list(set((stop for stop in self.list_stop if stop.type == stop_type.value)))
+    #region INCREMENTAL UPDATES
+    def __patch_line(self, line_id: int, new_records: list[Stop]):
+        """
+        Replaces the stops of a line, given in the order of their records, then indexes, validates and orders
+        this line only. The line is ordered from its records as a rebuild would, not from its previous order.
+        An empty line removes it from the network.
+        """
+        for stop in self.network_line.get(line_id, []):
+            self.__unindex_stop(stop, line_id)
+        self.line_error.pop(line_id, None)
+        if not new_records:
+            self.network_line.pop(line_id, None)
+            self.line_records.pop(line_id, None)
+            self.good_line.pop(line_id, None)
+            return
+        for stop in new_records:
+            self.__index_stop(stop, line_id)
+        self.line_records[line_id] = new_records
+        self.good_line[line_id] = self.check_line(new_records)
+        self.__sort_line(line_id, new_records)
+
+    def add_stop(self, item: dict):
+        """
+        Adds the stop of a record to the network, only its line is validated and ordered again.
 
-    def get_on_demand_stop(self) -> list[Stop]:
-        correct_on_demand_stop_list = []
-        on_demand_stop_list = self.__get_stop_by_type(StopType.ON_DEMAND)
-        start_stop_list = self.__get_stop_by_type(StopType.START)
-        finish_stop_list = self.__get_stop_by_type(StopType.FINISH)
-        transfer_stop_list = self.get_transfer_stop()
+        :param item: Dictionary containing stop information.
+        :type item: dict
+        """
+        new_stop = self.__item_to_stop(item)
+        line_id = int(item.get("bus_id", 0))
+        if line_id == 0:
+            self.unassigned_stop.append(new_stop)
+            self.__index_stop(new_stop, line_id)
+        else:
+            self.__patch_line(line_id, self.line_records.get(line_id, []) + [new_stop])
 
-        for stop in on_demand_stop_list:
-            if stop not in start_stop_list and stop not in finish_stop_list and stop not in transfer_stop_list:
-                correct_on_demand_stop_list.append(stop)
-        return correct_on_demand_stop_list
+    def __find_record(self, bus_id: int, stop_id: int) -> tuple[list[Stop], int | None]:
+        # The stops of the line in the order of their records, and the position of the first one with this stop_id
+        records = self.unassigned_stop if bus_id == 0 else self.line_records.get(bus_id, [])
+        return records, next((position for position, stop in enumerate(records) if stop.id == stop_id), None)
 
+    def remove_stop(self, bus_id: int, stop_id: int) -> Stop | None:
+        """
+        Removes a stop from a line, only this line is validated and ordered again.
+        If several records of the line have this stop_id, the first one is removed.
+
+        :param bus_id: The line of the stop, 0 for a stop without line.
+        :type bus_id: int
+        :param stop_id: The id of the stop.
+        :type stop_id: int
+        :return: The removed stop, None if the line has no such stop.
+        :rtype: Stop | None
+        """
+        records, position = self.__find_record(bus_id, stop_id)
+        if position is None:
+            return None
+        removed_stop = records[position]
+        if bus_id == 0:
+            # Stops are equal when they have the same name, so the stop is removed by its position
+            del self.unassigned_stop[position]
+            self.__unindex_stop(removed_stop, bus_id)
+        else:
+            self.__patch_line(bus_id, records[:position] + records[position + 1:])
+        return removed_stop
 
-    def get_transfer_stop(self) -> list[Stop]:
-        transfer_stop = []
-        for line_a, line_b in combinations(self.network_line.values(), 2):
-            intersection = set(line_a).intersection(set(line_b))
-            transfer_stop.extend(list(intersection))
+    def update_stop(self, item: dict) -> Stop | None:
+        """
+        Replaces, in place, the first stop having the same bus_id and stop_id as the record, or adds it
+        if there is none.
 
-        return list(set(transfer_stop))
+        :param item: Dictionary containing the new stop information.
+        :type item: dict
+        :return: The replaced stop, None if the stop was added.
+        :rtype: Stop | None
+        """
+        line_id = int(item.get("bus_id", 0))
+        records, position = self.__find_record(line_id, item.get("stop_id", 0))
+        if position is None:
+            self.add_stop(item)
+            return None
+        removed_stop, new_stop = records[position], self.__item_to_stop(item)
+        if line_id == 0:
+            self.__unindex_stop(removed_stop, line_id)
+            self.unassigned_stop[position] = new_stop
+            self.__index_stop(new_stop, line_id)
+        else:
+            self.__patch_line(line_id, records[:position] + [new_stop] + records[position + 1:])
+        return removed_stop
+
+    def replace_line(self, bus_id: int, data: Iterable[dict]):
+        """
+        Replaces all the stops of a line by the stops of the records, the bus_id of the records is not read.
+
+        :param bus_id: The line to replace.
+        :type bus_id: int
+        :param data: The records of the new stops of the line.
+        :type data: Iterable[dict]
+        """
+        self.__patch_line(bus_id, [self.__item_to_stop(item) for item in data])
+
+    def remove_line(self, bus_id: int):
+        self.__patch_line(bus_id, [])
+    #endregion
+
+    def __get_name_by_type(self, stop_type: StopType) -> set[str]:
+        return {name for name, count in self.stop_types.get(stop_type.value, {}).items() if count > 0}
+
+    def __get_stop_by_type(self, stop_type: StopType) -> list[Stop]:
+        return [self.stop_by_name[name] for name in self.__get_name_by_type(stop_type)]
+
+    def __get_transfer_name(self) -> set[str]:
+        return {name for name, lines in self.stop_lines.items() if len(lines) > 1}
+
+    def get_on_demand_stop(self) -> list[Stop]:
+        on_demand_name = (self.__get_name_by_type(StopType.ON_DEMAND)
+                          - self.__get_name_by_type(StopType.START)
+                          - self.__get_name_by_type(StopType.FINISH)
+                          - self.__get_transfer_name())
+        return [self.stop_by_name[name] for name in on_demand_name]
+
+    def get_transfer_stop(self) -> list[Stop]:
+        """A transfer stop is a stop served by at least two lines"""
+        return [self.stop_by_name[name] for name in self.__get_transfer_name()]
 
     def check_line(self, line: list[Stop]) -> bool:
         """Check if the line has start and end stop"""
@@ -332,13 +657,15 @@ class BusNetwork:
             print(f"bus_id: {bus_id} stops: {len(line)}")
 
         if not all(self.good_line.values()):
-            print(f"There is no start or end stop for this line: {"".join(map(str, [bus_id for bus_id, is_good in self.good_line.items() if not is_good]))}.")
+            print(f"There is no start or end stop for this line: {", ".join(map(str, [bus_id for bus_id, is_good in self.good_line.items() if not is_good]))}.")
         else:
             if debug:
                 print()
                 for bus_id, line in self.network_line.items():
                     print(f"Line {bus_id} :")
                     self.show_line(line)
+                for bus_id, line_error in self.line_error.items():
+                    print(f"Line {bus_id} is not a valid chain: {", ".join(error.value for error in line_error)}")
             print()
             for type_stop in StopType:
                 stop_list = self.get_format_stop(type_stop)
@@ -357,12 +684,522 @@ class BusNetwork:
         print("\n")
 
 
+@dataclass(frozen=True)
+class Leg:
+    """Part of a journey made on a single bus line"""
+    bus_id: int
+    departure_stop: str
+    departure_time: HoursTime
+    arrival_stop: str
+    arrival_time: HoursTime
+
+    def __str__(self):
+        return f"bus {self.bus_id}: {self.departure_stop} ({self.departure_time}) -> {self.arrival_stop} ({self.arrival_time})"
+
+
+@dataclass(frozen=True)
+class Journey:
+    legs: list[Leg]
+
+    @property
+    def arrival_time(self) -> HoursTime | None:
+        return self.legs[-1].arrival_time if self.legs else None
+
+    @property
+    def transfers(self) -> int:
+        return max(0, len(self.legs) - 1)
+
+    def __str__(self):
+        return "\n".join(str(leg) for leg in self.legs)
+
+
+class JourneyPlanner:
+    """
+    Answers earliest arrival queries over a BusNetwork with the Connection Scan Algorithm.
+    Every valid line gives one trip, or one trip by part when its times go back, split into connections between its
+    consecutive stops. The connections are
+    stored in parallel columns sorted by departure time, so a query is a single forward scan from the departure time
+    which stops as soon as the destination cannot be reached earlier.
+    Stops are identified by their name: a bus can be changed at a stop served by several lines, ie a transfer stop.
+    The arrays by stop and by trip are kept between the queries, so a planner answers one query at a time.
+    """
+    __UNREACHED = HoursTime.MINUTES_PER_DAY
+
+    def __init__(self, network: BusNetwork, transfer_time: int = 0, excluded_lines: Collection[int] = ()):
+        """
+        :param network: The network to plan journeys on, only the lines with a start, a finish and a valid chain are used.
+        :type network: BusNetwork
+        :param transfer_time: Minimum number of minutes needed to change bus at a transfer stop.
+        :type transfer_time: int
+        :param excluded_lines: bus_id of lines not to use, even if valid.
+        :type excluded_lines: Collection[int]
+        """
+        self.transfer_time = transfer_time
+        self.stop_names: Sequence[str] = []
+        self.stop_index: Mapping[str, int] = {}
+        # bus_id of each trip
+        self.trip_line: Sequence[int] = []
+        # One column by attribute of the connections, sorted by departure time
+        self.departure_time: Sequence[int] = []
+        self.arrival_time: Sequence[int] = []
+        self.trip: Sequence[int] = []
+        self.departure_stop: Sequence[int] = []
+        self.arrival_stop: Sequence[int] = []
+        self.__build_connections(network, excluded_lines)
+        self.__init_scan_state(*self.index_connections(len(self.stop_names), self.departure_stop, self.arrival_stop))
+
+    @classmethod
+    def from_columns(cls, stop_names: Sequence[str], stop_index: Mapping[str, int], trip_line: Sequence[int],
+                     departure_time: Sequence[int], arrival_time: Sequence[int], trip: Sequence[int],
+                     departure_stop: Sequence[int], arrival_stop: Sequence[int], transfer_time: int = 0,
+                     departures_by_stop: Sequence[int] | None = None, departure_offset: Sequence[int] | None = None,
+                     last_arrival: Sequence[int] | None = None) -> "JourneyPlanner":
+        """
+        Creates a planner from connection columns already built, for instance the ones of a NetworkSnapshot.
+        The connections must be sorted by departure time. The indexes given by ''index_connections'' are computed
+        from the columns when they are not given.
+        """
+        planner = cls.__new__(cls)
+        planner.transfer_time = transfer_time
+        planner.stop_names, planner.stop_index = stop_names, stop_index
+        planner.trip_line = trip_line
+        planner.departure_time, planner.arrival_time, planner.trip = departure_time, arrival_time, trip
+        planner.departure_stop, planner.arrival_stop = departure_stop, arrival_stop
+        if departures_by_stop is None or departure_offset is None or last_arrival is None:
+            departures_by_stop, departure_offset, last_arrival = cls.index_connections(
+                len(stop_names), departure_stop, arrival_stop)
+        planner.__init_scan_state(departures_by_stop, departure_offset, last_arrival)
+        return planner
+
+    @staticmethod
+    def index_connections(stop_count: int, departure_stop: Sequence[int],
+                          arrival_stop: Sequence[int]) -> tuple[array, array, array]:
+        """
+        Indexes the connections by stop, in linear time.
+
+        :return: The connections leaving each stop in the order of the scan, the ones of stop s being
+            departures_by_stop[departure_offset[s]:departure_offset[s + 1]], the offsets, and the last connection
+            arriving at each stop, -1 if none.
+        :rtype: tuple[array, array, array]
+        """
+        departure_offset = array("i", [0] * (stop_count + 1))
+        for stop in departure_stop:
+            departure_offset[stop + 1] += 1
+        for stop in range(stop_count):
+            departure_offset[stop + 1] += departure_offset[stop]
+        # Counting sort of the connections by departure stop, the order of the scan is kept within a stop
+        departures_by_stop = array("i", [0] * len(departure_stop))
+        position = departure_offset[:-1]
+        for connection, stop in enumerate(departure_stop):
+            departures_by_stop[position[stop]] = connection
+            position[stop] += 1
+        last_arrival = array("i", [-1] * stop_count)
+        for connection, stop in enumerate(arrival_stop):
+            last_arrival[stop] = connection
+        return departures_by_stop, departure_offset, last_arrival
+
+    def __init_scan_state(self, departures_by_stop: Sequence[int], departure_offset: Sequence[int],
+                          last_arrival: Sequence[int]):
+        # Earliest arrival at each stop, earliest time a bus can be taken from it and connection boarding each trip.
+        # A query only restores the entries it changed, instead of allocating them again
+        self.__earliest = [self.__UNREACHED] * len(self.stop_names)
+        self.__earliest_change = self.__earliest[:]
+        self.__trip_boarding = [-1] * len(self.trip_line)
+        # Connections leaving each stop, and last connection arriving at each stop: the scan cannot improve the
+        # arrival at a stop after it
+        self.departures_by_stop, self.departure_offset = departures_by_stop, departure_offset
+        self.last_arrival = last_arrival
+
+    def __get_stop_index(self, name: str) -> int:
+        index = self.stop_index.get(name)
+        if index is None:
+            index = self.stop_index[name] = len(self.stop_names)
+            self.stop_names.append(name)
+        return index
+
+    def __build_connections(self, network: BusNetwork, excluded_lines: Collection[int]):
+        connections = []
+        for line_id, line in network.network_line.items():
+            if not network.good_line.get(line_id, False) or line_id in network.line_error or line_id in excluded_lines:
+                continue
+            trip = None
+            for sequence, (stop_from, stop_to) in enumerate(pairwise(line)):
+                # A connection going back in time comes from a time error, it cannot be used. Staying on the bus
+                # across it would reach the next stops before leaving the previous one, the rest of the line is
+                # a new trip
+                if stop_to.a_time < stop_from.a_time:
+                    trip = None
+                    continue
+                if trip is None:
+                    trip = len(self.trip_line)
+                    self.trip_line.append(line_id)
+                connections.append((stop_from.a_time.minutes, stop_to.a_time.minutes, trip, sequence,
+                                    self.__get_stop_index(stop_from.name), self.__get_stop_index(stop_to.name)))
+        # Connections of a trip at the same minute keep the order of the line, so the scan can chain them
+        connections.sort()
+        for departure_time, arrival_time, trip, _, departure_stop, arrival_stop in connections:
+            self.departure_time.append(departure_time)
+            self.arrival_time.append(arrival_time)
+            self.trip.append(trip)
+            self.departure_stop.append(departure_stop)
+            self.arrival_stop.append(arrival_stop)
+
+    def earliest_arrival(self, origin: str, destination: str, departure: HoursTime = HoursTime(0, 0)) -> Journey | None:
+        """
+        Finds the journey reaching the destination as early as possible when leaving the origin at the departure time.
+
+        :param origin: Name of the stop to leave from.
+        :type origin: str
+        :param destination: Name of the stop to reach.
+        :type destination: str
+        :param departure: Time from which the origin can be left.
+        :type departure: HoursTime
+        :return: The journey found, or None if the destination cannot be reached the same day.
+        :rtype: Journey | None
+        """
+        for name in (origin, destination):
+            if name not in self.stop_index:
+                raise ValueError(f"Unknown stop: {name}")
+        origin_index, destination_index = self.stop_index[origin], self.stop_index[destination]
+        if origin_index == destination_index:
+            return Journey([])
+
+        earliest, earliest_change, trip_boarding = self.__earliest, self.__earliest_change, self.__trip_boarding
+        earliest[origin_index] = earliest_change[origin_index] = departure.minutes
+        # (boarding, alighting) connections reaching each stop, and trips boarded, ie the entries to restore
+        reached_by: dict[int, tuple[int, int]] = {}
+        boarded_trips = []
+        try:
+            self.__scan(self.__first_departure(origin_index, departure), destination_index, reached_by,
+                        boarded_trips)
+            if destination_index not in reached_by:
+                return None
+            return Journey(self.__extract_legs(origin_index, destination_index, reached_by))
+        finally:
+            for stop in chain(reached_by, (origin_index,)):
+                earliest[stop] = earliest_change[stop] = self.__UNREACHED
+            for trip in boarded_trips:
+                trip_boarding[trip] = -1
+
+    def __first_departure(self, origin_index: int, departure: HoursTime) -> int:
+        # No bus can be taken before the first one leaving the origin, the connections before it are not scanned
+        start = bisect_left(self.departure_time, departure.minutes)
+        low, high = self.departure_offset[origin_index], self.departure_offset[origin_index + 1]
+        position = bisect_left(self.departures_by_stop, start, low, high)
+        return self.departures_by_stop[position] if position < high else len(self.trip)
+
+    def __scan(self, start: int, destination_index: int, reached_by: dict[int, tuple[int, int]],
+               boarded_trips: list[int]):
+        earliest, earliest_change, trip_boarding = self.__earliest, self.__earliest_change, self.__trip_boarding
+        departure_time, arrival_time, trips = self.departure_time, self.arrival_time, self.trip
+        departure_stops, arrival_stops = self.departure_stop, self.arrival_stop
+        transfer_time = self.transfer_time
+        # The columns are indexed from the first connection leaving the origin to the last one reaching the destination
+        destination_minutes = earliest[destination_index]
+        for connection in range(start, self.last_arrival[destination_index] + 1):
+            departure_minutes = departure_time[connection]
+            if departure_minutes >= destination_minutes:
+                break
+            trip = trips[connection]
+            boarding = trip_boarding[trip]
+            if boarding < 0:
+                if earliest_change[departure_stops[connection]] > departure_minutes:
+                    continue
+                boarding = trip_boarding[trip] = connection
+                boarded_trips.append(trip)
+            arrival_stop, arrival_minutes = arrival_stops[connection], arrival_time[connection]
+            if arrival_minutes < earliest[arrival_stop]:
+                earliest[arrival_stop] = arrival_minutes
+                earliest_change[arrival_stop] = arrival_minutes + transfer_time
+                reached_by[arrival_stop] = (boarding, connection)
+                if arrival_stop == destination_index:
+                    destination_minutes = arrival_minutes
+
+    def __extract_legs(self, origin_index: int, destination_index: int,
+                       reached_by: dict[int, tuple[int, int]]) -> list[Leg]:
+        legs = []
+        stop = destination_index
+        while stop != origin_index:
+            boarding, alighting = reached_by[stop]
+            legs.append(Leg(bus_id=self.trip_line[self.trip[boarding]],
+                            departure_stop=self.stop_names[self.departure_stop[boarding]],
+                            departure_time=HoursTime.from_minutes(self.departure_time[boarding]),
+                            arrival_stop=self.stop_names[self.arrival_stop[alighting]],
+                            arrival_time=HoursTime.from_minutes(self.arrival_time[alighting])))
+            stop = self.departure_stop[boarding]
+        legs.reverse()
+        return legs
+
+
+class _StringTable(Sequence[str]):
+    """
+    Sorted strings of a snapshot stored as utf-8 bytes with their offsets, each one is decoded on access
+    """
+    def __init__(self, offset: memoryview, data: memoryview):
+        self.offset = offset
+        self.data = data
+
+    def __len__(self):
+        return len(self.offset) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return str(self.data[self.offset[index]:self.offset[index + 1]], "utf-8")
+
+    def find(self, value: str) -> int | None:
+        # utf-8 keeps the order of the code points, so the strings can be bisected once decoded
+        index = bisect_left(self, value)
+        return index if index < len(self) and self[index] == value else None
+
+
+class _StringIndex(Mapping[str, int]):
+    """Position of each string in a _StringTable"""
+    def __init__(self, table: _StringTable):
+        self.table = table
+
+    def __getitem__(self, value: str) -> int:
+        index = self.table.find(value)
+        if index is None:
+            raise KeyError(value)
+        return index
+
+    def __contains__(self, value):
+        return isinstance(value, str) and self.table.find(value) is not None
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __len__(self):
+        return len(self.table)
+
+
+class NetworkSnapshot:
+    """
+    Compiled network stored in a binary file: the ordered lines, the lines serving each stop and the columns of the
+    journey planner with their indexes by stop. The file is memory-mapped when loaded, so nothing is parsed or sorted
+    at start up and the processes loading the same snapshot share its pages.
+    The file starts with a header giving the offset and the size of each section, then each section is a flat
+    array in the native byte order, aligned on 8 bytes.
+    """
+    MAGIC = b"ERSNAP02"
+    __HEADER = struct.Struct("=8s8sI")
+    __SECTION = struct.Struct("=QQ")
+    __ALIGNMENT = 8
+    # Name and array typecode of each section, in the order of the file
+    __SECTIONS = (("stop_name_offset", "I"), ("stop_name_data", "B"), ("stop_type_offset", "I"), ("stop_type_data", "B"),
+                  ("line_id", "i"), ("line_good", "B"), ("line_offset", "I"),
+                  ("stop_id", "i"), ("stop_name", "i"), ("stop_next", "i"), ("stop_type", "i"), ("stop_time", "H"),
+                  ("serving_offset", "I"), ("serving_line", "i"),
+                  ("trip_line", "i"), ("departure_time", "H"), ("arrival_time", "H"), ("trip", "i"),
+                  ("departure_stop", "i"), ("arrival_stop", "i"),
+                  ("departures_by_stop", "i"), ("departure_offset", "i"), ("last_arrival", "i"))
+
+    def __init__(self, path: str):
+        """
+        Maps the snapshot file in memory.
+
+        :param path: Path of a file written by ''NetworkSnapshot.write''.
+        :type path: str
+        """
+        self.path = path
+        self.column: dict[str, memoryview] = {}
+        self.__mmap = self.__buffer = None
+        self.__file = open(path, "rb")
+        try:
+            # mmap refuses an empty file, a file too short for its header gives a struct.error and a section cut
+            # in the middle of an item cannot be cast
+            self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__buffer = memoryview(self.__mmap)
+            magic, byteorder, section_count = self.__HEADER.unpack_from(self.__buffer)
+            if magic != self.MAGIC or byteorder.rstrip(b"\0").decode() != sys.byteorder \
+                    or section_count != len(self.__SECTIONS):
+                raise ValueError("unknown header")
+            for index, (name, typecode) in enumerate(self.__SECTIONS):
+                offset, size = self.__SECTION.unpack_from(self.__buffer,
+                                                          self.__HEADER.size + index * self.__SECTION.size)
+                if offset + size > len(self.__buffer):
+                    raise ValueError(f"section {name} goes past the end of the file")
+                self.column[name] = self.__buffer[offset:offset + size].cast(typecode)
+        except (ValueError, TypeError, struct.error) as error:
+            self.close()
+            raise ValueError(f"'{path}' is not a network snapshot compatible with this version") from error
+        self.stop_names = _StringTable(self.column["stop_name_offset"], self.column["stop_name_data"])
+        self.stop_types = _StringTable(self.column["stop_type_offset"], self.column["stop_type_data"])
+        self.stop_index = _StringIndex(self.stop_names)
+        self.__line_position = {line_id: position for position, line_id in enumerate(self.column["line_id"])}
+
+    @staticmethod
+    def __is_int32(value) -> bool:
+        return isinstance(value, int) and -2 ** 31 <= value < 2 ** 31
+
+    @classmethod
+    def __is_compilable(cls, line_id: int, line: list[Stop]) -> bool:
+        # The ids are stored as 32 bits integers and the names and types as UTF-8 strings
+        return cls.__is_int32(line_id) and all(cls.__is_int32(stop.id) and cls.__is_int32(stop.next_stop_id)
+                                               and isinstance(stop.name, str) and isinstance(stop.type, str)
+                                               for stop in line)
+
+    @classmethod
+    def write(cls, network: BusNetwork, path: str) -> list[int]:
+        """
+        Compiles the network into a snapshot file. A line whose bus_id does not fit in 32 bits, or with a stop whose
+        record has a type error, cannot be stored: it is left out of the snapshot.
+
+        :param network: The validated and ordered network to compile.
+        :type network: BusNetwork
+        :param path: Path of the file to write.
+        :type path: str
+        :return: bus_id of the lines left out.
+        :rtype: list[int]
+        """
+        lines = {line_id: line for line_id, line in network.network_line.items() if cls.__is_compilable(line_id, line)}
+        skipped_lines = [line_id for line_id in network.network_line if line_id not in lines]
+        stop_names = sorted(name for name in network.stop_by_name if isinstance(name, str))
+        stop_types = sorted({stop.type for line in lines.values() for stop in line})
+        name_index = {name: index for index, name in enumerate(stop_names)}
+        type_index = {stop_type: index for index, stop_type in enumerate(stop_types)}
+        column: dict[str, array] = {name: array(typecode) for name, typecode in cls.__SECTIONS}
+
+        for table, offset_name, data_name in ((stop_names, "stop_name_offset", "stop_name_data"),
+                                              (stop_types, "stop_type_offset", "stop_type_data")):
+            column[offset_name].append(0)
+            for value in table:
+                column[data_name].frombytes(value.encode("utf-8"))
+                column[offset_name].append(len(column[data_name]))
+
+        column["line_offset"].append(0)
+        for line_id, line in lines.items():
+            column["line_id"].append(line_id)
+            column["line_good"].append(network.good_line.get(line_id, False))
+            for stop in line:
+                column["stop_id"].append(stop.id)
+                column["stop_name"].append(name_index[stop.name])
+                column["stop_next"].append(stop.next_stop_id)
+                column["stop_type"].append(type_index[stop.type])
+                column["stop_time"].append(stop.a_time.minutes)
+            column["line_offset"].append(len(column["stop_id"]))
+
+        column["serving_offset"].append(0)
+        for name in stop_names:
+            column["serving_line"].extend(sorted(line_id for line_id in network.stop_lines.get(name, ()) if line_id in lines))
+            column["serving_offset"].append(len(column["serving_line"]))
+
+        planner = JourneyPlanner(network, excluded_lines=set(skipped_lines))
+        column["trip_line"].extend(planner.trip_line)
+        column["departure_time"].extend(planner.departure_time)
+        column["arrival_time"].extend(planner.arrival_time)
+        column["trip"].extend(planner.trip)
+        # The stops of the planner are renumbered by their position in the sorted table of the snapshot
+        column["departure_stop"].extend(name_index[planner.stop_names[stop]] for stop in planner.departure_stop)
+        column["arrival_stop"].extend(name_index[planner.stop_names[stop]] for stop in planner.arrival_stop)
+        # The indexes of the planner are stored too, so loading a planner does not go through the connections
+        for name, index in zip(("departures_by_stop", "departure_offset", "last_arrival"),
+                               JourneyPlanner.index_connections(len(stop_names), column["departure_stop"],
+                                                                column["arrival_stop"])):
+            column[name] = index
+
+        data_offset = cls.__HEADER.size + len(cls.__SECTIONS) * cls.__SECTION.size
+        with open(path, "wb") as f:
+            f.write(cls.__HEADER.pack(cls.MAGIC, sys.byteorder.encode(), len(cls.__SECTIONS)))
+            offset = data_offset
+            for name, _ in cls.__SECTIONS:
+                offset += -offset % cls.__ALIGNMENT
+                size = len(column[name]) * column[name].itemsize
+                f.write(cls.__SECTION.pack(offset, size))
+                offset += size
+            for name, _ in cls.__SECTIONS:
+                f.write(b"\0" * (-f.tell() % cls.__ALIGNMENT))
+                column[name].tofile(f)
+        return skipped_lines
+
+    def close(self):
+        # The views on the map must be released before closing it, the map and the buffer are None when the file
+        # could not be mapped
+        for view in self.column.values():
+            view.release()
+        if self.__buffer is not None:
+            self.__buffer.release()
+        if self.__mmap is not None:
+            self.__mmap.close()
+        self.__file.close()
+
+    def __enter__(self) -> "NetworkSnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_lines_id(self) -> Sequence[int]:
+        return self.column["line_id"]
+
+    def is_good_line(self, bus_id: int) -> bool:
+        position = self.__line_position.get(bus_id)
+        return position is not None and bool(self.column["line_good"][position])
+
+    def get_line_by_id(self, bus_id: int) -> list[Stop]:
+        position = self.__line_position.get(bus_id)
+        if position is None:
+            return []
+        column = self.column
+        return [Stop(id=column["stop_id"][index],
+                     name=self.stop_names[column["stop_name"][index]],
+                     next_stop_id=column["stop_next"][index],
+                     type=self.stop_types[column["stop_type"][index]],
+                     a_time=HoursTime.from_minutes(column["stop_time"][index]))
+                for index in range(column["line_offset"][position], column["line_offset"][position + 1])]
+
+    def get_stop_lines(self, name: str) -> list[int]:
+        index = self.stop_names.find(name)
+        if index is None:
+            return []
+        offset = self.column["serving_offset"]
+        # A copy, a slice of the map kept by the caller would prevent closing it
+        return self.column["serving_line"][offset[index]:offset[index + 1]].tolist()
+
+    def get_transfer_stop(self) -> list[str]:
+        """Names of the stops served by at least two lines"""
+        offset = self.column["serving_offset"]
+        return [self.stop_names[index] for index in range(len(self.stop_names)) if offset[index + 1] - offset[index] > 1]
+
+    def planner(self, transfer_time: int = 0) -> JourneyPlanner:
+        """
+        Gives a journey planner working directly on the mapped columns of the snapshot.
+
+        :param transfer_time: Minimum number of minutes needed to change bus at a transfer stop.
+        :type transfer_time: int
+        :return: The journey planner.
+        :rtype: JourneyPlanner
+        """
+        column = self.column
+        return JourneyPlanner.from_columns(self.stop_names, self.stop_index, column["trip_line"],
+                                           column["departure_time"], column["arrival_time"], column["trip"],
+                                           column["departure_stop"], column["arrival_stop"], transfer_time,
+                                           column["departures_by_stop"], column["departure_offset"],
+                                           column["last_arrival"])
+
+
 class Validator:
     """
     Validator class for validating data against a set of rules and give a report of errors
     """
-    def __init__(self, rule_set: list[Field]):
+    __ROAD_NAME_PATTERN = re.compile(r"[A-Z].* (?:Road|Avenue|Boulevard|Street)", re.DOTALL)
+    __STOP_TYPE_FORMAT = frozenset({"S", "O", "F", ""})
+    __TIME_PATTERN = re.compile(r"^([0-1][0-9]|2[0-3]):([0-5][0-9])$")
+    # Errors types checked on the items themselves, the others are checked on the network
+    FORMAT_ERROR_TYPE = (ErrorType.REQUIRED, ErrorType.TYPE, ErrorType.FORMAT)
+
+    def __init__(self, rule_set: list[Field], batch_size: int = 10_000, workers: int = 1):
         self.rule_set = rule_set
+        self.batch_size = batch_size
+        # With more than one worker, the batches of records and the lines are validated in a process pool
+        self.workers = workers
+        # The rule set is compiled once into a type checker and an optional format checker for each field
+        self.__checkers = self.__compile_rule_set()
+        # Number of items with an error for each field, filled by ''watch'' when data are streamed
+        self.format_error_count: Counter = Counter()
 
     @staticmethod
     def __is_integer(value) -> bool:
@@ -378,96 +1215,139 @@ class Validator:
 
     @staticmethod
     def __check_format_road_name(value : str) -> bool:
-        suffix = {"Road", "Avenue", "Boulevard", "Street"}
-        try:
-            *name_parts, suffix_name = value.rsplit(" ", 1)
-            name = "".join(name_parts)
-            return suffix_name in suffix and name[0] in string.ascii_uppercase
-        # IndexError occurs when the string is empty
-        except (ValueError, IndexError):
-            return False
+        # A capitalized name followed by one of the allowed suffixes, separated by the last space
+        return isinstance(value, str) and Validator.__ROAD_NAME_PATTERN.fullmatch(value) is not None
 
     @staticmethod
     def __check_format_stop_type(value : str) -> bool:
-        return value in {"S", "O", "F", ""}
+        return isinstance(value, str) and value in Validator.__STOP_TYPE_FORMAT
 
     @staticmethod
     def __check_format_time(value : str) -> bool:
-        try:
-            return re.match(r"^([0-1][0-9]|2[0-3]):([0-5][0-9])$", value) is not None
-        except ValueError:
-            return False
+        return isinstance(value, str) and Validator.__TIME_PATTERN.match(value) is not None
+
+    def __compile_rule_set(self) -> list[tuple[Field, Callable[[object], bool], Callable[[object], bool] | None]]:
+        type_mapping = { FieldType.INTEGER: self.__is_integer,
+                         FieldType.STRING: self.__is_string,
+                         FieldType.CHARACTER: self.__is_character }
+        format_mapping = {FieldName.STOP_NAME: self.__check_format_road_name,
+                          FieldName.STOP_TYPE: self.__check_format_stop_type,
+                          FieldName.A_TIME: self.__check_format_time}
+        return [(rule, type_mapping[rule.type], format_mapping.get(rule.name)) for rule in self.rule_set]
+
+    def check_batch(self, data: list[dict]) -> dict[ErrorType, dict[FieldName, list[bool]]]:
+        """
+        Validate a batch of items column by column: all the values of a field go through the same compiled checker
+
+        :param data: List of data items to validate
+        :type data: list[dict]
+        :return: for each error type and each field, a list telling which items of the batch have this error
+        :rtype: dict[ErrorType, dict[FieldName, list[bool]]]
+        """
+        batch_error = { error_type: {} for error_type in self.FORMAT_ERROR_TYPE }
+        no_error = [False] * len(data)
+        for rule, is_type, is_format in self.__checkers:
+            key = rule.name.value
+            # Missing keys are kept apart as they are neither a type nor a format error
+            column = [item.get(key, _MISSING) for item in data]
+            # For the field required, if item has the keys it must be not empty
+            batch_error[ErrorType.REQUIRED][rule.name] = \
+                [value is _MISSING or value == "" for value in column] if rule.required else no_error
+            batch_error[ErrorType.TYPE][rule.name] = [value is not _MISSING and not is_type(value) for value in column]
+            batch_error[ErrorType.FORMAT][rule.name] = \
+                [value is not _MISSING and not is_format(value) for value in column] if is_format else no_error
+        return batch_error
+
+    def __check_item(self, item: dict, error_type: ErrorType) -> ErrorField:
+        return { field_name: has_error[0] for field_name, has_error in self.check_batch([item])[error_type].items() }
 
     def check_field(self, item: dict) -> ErrorField:
         """
         Provide a dictionary with a field name as a key and a boolean as a value indicating whether the field has an error
         ie must be present or not
         """
-        # For the field required, if item has the keys it must be not empty, and if it has not the field, it gives an empty string
-        return {
-            field.name: item.get(field.name.value, "") == "" if field.required else False
-            for field in self.rule_set
-        }
+        return self.__check_item(item, ErrorType.REQUIRED)
 
     def check_type(self, item: dict) -> ErrorField:
         """
             Provide a dictionary with a field name as a key and a boolean as a value indicating whether the field has an error
             ie is the type correct or not
         """
-        mapping = { FieldType.INTEGER: self.__is_integer,
-                   FieldType.STRING: self.__is_string,
-                   FieldType.CHARACTER: self.__is_character }
-        return {
-            field.name: not mapping[field.type](item[field.name.value]) if field.name.value in item.keys() else False
-            for field in self.rule_set
-        }
+        return self.__check_item(item, ErrorType.TYPE)
 
     def check_format(self, item: dict) -> ErrorField:
         """
             Provide a dictionary with a field name as a key and a boolean as a value indicating whether the format is correct or not
         """
-        mapping = {FieldName.STOP_NAME: self.__check_format_road_name,
-                   FieldName.STOP_TYPE: self.__check_format_stop_type,
-                   FieldName.A_TIME: self.__check_format_time}
-        return {
-            field.name: not mapping[field.name](item[field.name.value]) if field.name.value in item.keys() and field.name in mapping.keys() else False
-            for field in self.rule_set
-        }
+        return self.__check_item(item, ErrorType.FORMAT)
 
     def check_time(self, line: list[Stop]) -> ErrorField:
-        """Check if the time is increasing for each stop"""
-        stop_time = ([HoursTime(0, 0)] + [stop.a_time for stop in line])
-        respect_time = [time_departure < time_arrival for time_departure, time_arrival in pairwise(stop_time)]
-        return { FieldName.A_TIME : not all(respect_time) }
+        """Check if the time is increasing for each stop, the first one being after midnight"""
+        previous_minutes = 0
+        for stop in line:
+            if stop.a_time.minutes <= previous_minutes:
+                return { FieldName.A_TIME : True }
+            previous_minutes = stop.a_time.minutes
+        return { FieldName.A_TIME : False }
 
-    def compute_format_error(self, data: list[dict]) -> list[tuple[dict, ReportError]]:
+    def compute_format_error(self, data: Iterable[dict]) -> list[tuple[dict, ReportError]]:
         """
         Compute the errors for all the item inside data
 
         :param data: List of data items to validate
-        :type data: list[dict]
+        :type data: Iterable[dict]
         :return: list of tuple of items with their errors associated
         :rtype: list[tuple[dict, ReportError]]
         """
-        check_method_list: dict[ErrorType, Callable[[dict], ErrorField]] \
-            = {ErrorType.REQUIRED: self.check_field,
-               ErrorType.TYPE: self.check_type,
-               ErrorType.FORMAT: self.check_format}
-
         error_list = []
 
-        for item in data:
-            # report_error give the FieldName where a given error type occurs
-            report_error: ReportError = { error_name: [] for error_name in ErrorType }
-            for error_type, check_method in check_method_list.items():
-                error_field : ErrorField = check_method(item)
-                for field_name, has_error in error_field.items():
-                    if has_error:
-                        report_error[error_type].append(field_name)
-            error_list.append((item, report_error))
+        for batch in batched(data, self.batch_size):
+            batch_error = self.check_batch(batch)
+            for index, item in enumerate(batch):
+                # report_error give the FieldName where a given error type occurs
+                report_error: ReportError = { error_name: [] for error_name in ErrorType }
+                for error_type, error_field in batch_error.items():
+                    for field_name, has_error in error_field.items():
+                        if has_error[index]:
+                            report_error[error_type].append(field_name)
+                error_list.append((item, report_error))
 
         return error_list
 
+    def compute_error_field(self, data: list[dict]) -> list[frozenset[FieldName]]:
+        """
+        Compute, for each item of a batch, the fields having at least one format error
+
+        :param data: List of data items to validate
+        :type data: list[dict]
+        :return: the fields in error of each item
+        :rtype: list[frozenset[FieldName]]
+        """
+        batch_error = self.check_batch(data)
+        columns = [(rule.name, [batch_error[error_type][rule.name] for error_type in self.FORMAT_ERROR_TYPE])
+                   for rule, _, _ in self.__checkers]
+        return [frozenset(field_name for field_name, column in columns if any(has_error[index] for has_error in column))
+                for index in range(len(data))]
+
+    def count_format_error(self, data: Iterable[dict]) -> Counter:
+        """
+        Count, for each field, the number of items having at least one error on it, without building
+        the report of each item
+
+        :param data: Iterable of data items to validate
+        :type data: Iterable[dict]
+        :return: the number of items in error for each field
+        :rtype: Counter
+        """
+        count_error = Counter()
+        for batch in batched(data, self.batch_size):
+            batch_error = self.check_batch(batch)
+            for rule, _, _ in self.__checkers:
+                columns = [batch_error[error_type][rule.name] for error_type in self.FORMAT_ERROR_TYPE]
+                count_error[rule.name] += sum(map(any, zip(*columns)))
+        # Keep only the fields in error, as done by ''count_error''
+        return +count_error
+
     def compute_network_error(self, network: BusNetwork) -> list[tuple[int, ReportError]]:
         """
         Computes the errors in the provided network's lines and returns a list of error
@@ -480,49 +1360,173 @@ class Validator:
         """
 
         error_list = []
-        # For now, we have just ErrorType.TIME for the network, if further method is required, we can add them here
-        # and use the same structure as ''compute_format_error''
         if network is not None:
             lines_id_list = network.get_lines_id()
             for line_id in lines_id_list:
                 line = network.get_line_by_id(line_id)
-                report_error: ReportError = { error_name: [] for error_name in ErrorType }
-
-                error_time : ErrorField = self.check_time(line)
-                for field_name, has_error in error_time.items():
-                    if has_error:
-                        report_error[ErrorType.TIME].append(field_name)
-                error_list.append((line_id, report_error))
+                error_list.append(self.compute_line_error(line_id, line))
             return error_list
         else:
             return error_list
 
-    def generate_report_error(self, data: list[dict], network: BusNetwork = None, debug=False):
+    def compute_line_error(self, line_id: int, line: list[Stop]) -> tuple[int, ReportError]:
+        """
+        Computes the errors of a single line of the network
+
+        :param line_id: The id of the line.
+        :type line_id: int
+        :param line: The ordered stops of the line.
+        :type line: list[Stop]
+        :return: tuple of line_id with its errors associated
+        :rtype: tuple[int, ReportError]
+        """
+        # For now, we have just ErrorType.TIME for the network, if further method is required, we can add them here
+        # and use the same structure as ''compute_format_error''
+        report_error: ReportError = { error_name: [] for error_name in ErrorType }
+
+        error_time : ErrorField = self.check_time(line)
+        for field_name, has_error in error_time.items():
+            if has_error:
+                report_error[ErrorType.TIME].append(field_name)
+        return line_id, report_error
+
+    def count_network_error(self, network: BusNetwork) -> Counter:
+        """
+        Count, for each field, the number of lines of the network having at least one error on it.
+        With several workers, each worker checks a subset of the lines.
+
+        :param network: The bus network instance to evaluate for potential errors.
+        :type network: BusNetwork
+        :return: the number of lines in error for each field
+        :rtype: Counter
+        """
+        if network is None:
+            return Counter()
+        if self.workers <= 1:
+            return self.count_error(self.compute_network_error(network))
+        lines_per_shard = max(1, len(network.network_line) // (4 * self.workers))
+        return self.__map_shard(_count_network_shard, batched(network.network_line.items(), lines_per_shard))
+
+    def __map_shard(self, function: Callable[[list[Field], tuple], Counter], shards: Iterable[tuple]) -> Counter:
+        """
+        Runs the function on each shard in a process pool and merges the counters they give back.
+        The shards are submitted lazily, so only a few of them are in memory at once.
+        """
+        count_error = Counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for shard in shards:
+                pending.add(executor.submit(function, self.rule_set, shard))
+                shard_count, pending = self.__merge_shard(pending, 2 * self.workers)
+                count_error += shard_count
+            shard_count, _ = self.__merge_shard(pending, 0)
+            count_error += shard_count
+        return count_error
+
+    @staticmethod
+    def __merge_shard(pending: set[Future], max_pending: int) -> tuple[Counter, set[Future]]:
+        """
+        Waits until no more than max_pending shards are running and merges the counters of the finished ones
+        """
+        count_error = Counter()
+        while len(pending) > max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                count_error += future.result()
+        return count_error, pending
+
+    @staticmethod
+    def count_error(report: Iterable[tuple[dict | int, ReportError]]) -> Counter:
+        """
+        Count, for each field, the number of items having at least one error on it
+
+        :param report: list of tuple of items (or line_id) with their errors associated
+        :type report: Iterable[tuple[dict | int, ReportError]]
+        :return: the number of items in error for each field
+        :rtype: Counter
+        """
+        count_error = Counter()
+        # item can be item from data or line_id from network
+        for item, error in report:
+            list_error = set()
+            for errors in error.values():
+                list_error.update(errors)
+            count_error.update(list_error)
+        return count_error
+
+    def watch(self, data: Iterable[dict], debug=False) -> Iterator[dict]:
+        """
+        Validate the items on the fly, batch by batch, and let them through, so a single stream can feed a BusNetwork
+        while its format errors are counted in ''format_error_count''
+
+        :param data: Iterable of data items to validate
+        :type data: Iterable[dict]
+        :param debug: Flag to print detailed error report of each item
+        :type debug: bool
+        :return: the items of data, unchanged
+        :rtype: Iterator[dict]
+        """
+        if self.workers > 1 and not debug:
+            # The batches are validated by the pool while the next ones are read and given to the caller
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                pending = set()
+                for batch in batched(data, self.batch_size):
+                    pending.add(executor.submit(_count_format_shard, self.rule_set, batch))
+                    shard_count, pending = self.__merge_shard(pending, 2 * self.workers)
+                    self.format_error_count += shard_count
+                    yield from batch
+                shard_count, _ = self.__merge_shard(pending, 0)
+                self.format_error_count += shard_count
+            return
+
+        for batch in batched(data, self.batch_size):
+            if debug:
+                report_format = self.compute_format_error(batch)
+                print(*report_format, sep="\n")
+                self.format_error_count += self.count_error(report_format)
+            else:
+                self.format_error_count += self.count_format_error(batch)
+            yield from batch
+
+    def generate_report_error(self, data: Iterable[dict] | None = None, network: BusNetwork = None, debug=False):
         """
         Generate and report an error summary for a list of data items
 
         :param network: the bus network instance to evaluate for potential errors.
         :type network: BusNetwork
-        :param data: List of data items to validate
-        :type data: list[dict]
+        :param data: List of data items to validate, if None the errors collected by ''watch'' are reported
+        :type data: Iterable[dict] | None
         :param debug: Flag to print detailed error report
         :type debug: bool
         """
 
-        report_format = self.compute_format_error(data)
-        report_network = self.compute_network_error(network)
         if debug:
+            report_format = self.compute_format_error(data) if data is not None else []
+            report_network = self.compute_network_error(network)
             print("Format errors:")
             print(*report_format, sep="\n")
             print("Network errors:")
             print(*report_network, sep="\n")
-        count_error = Counter()
-        # item can be item from data or line_id from network
-        for item, error in chain(report_format, report_network):
-            list_error = set()
-            for errors in error.values():
-                list_error.update(errors)
-            count_error += Counter(list_error)
+            count_error = self.count_error(chain(report_format, report_network))
+        else:
+            count_error = self.count_network_error(network)
+            if data is not None:
+                if self.workers > 1:
+                    count_error += self.__map_shard(_count_format_shard, batched(data, self.batch_size))
+                else:
+                    count_error += self.count_format_error(data)
+        if data is None:
+            count_error += self.format_error_count
+        self.print_report(count_error)
+
+    @staticmethod
+    def print_report(count_error: Counter):
+        """
+        Print the summary of the errors
+
+        :param count_error: the number of items in error for each field
+        :type count_error: Counter
+        """
         total_error = sum(count_error.values())
 
         print(f"Type and field validation: {total_error} errors")
@@ -531,20 +1535,128 @@ class Validator:
         print()
 
 
+class LiveNetwork:
+    """
+    A BusNetwork with its error counts, both updated in place when the timetable is patched.
+    Only the records and the lines touched by a patch are validated again. The records are identified
+    by their bus_id and stop_id.
+    """
+    def __init__(self, validator: Validator, data: Iterable[dict]):
+        self.validator = validator
+        # Fields in error of the records of each (bus_id, stop_id), in the order of the records as the network
+        # patches the first one, and fields in error of each line having some
+        self.record_error: dict[tuple, list[frozenset[FieldName]]] = {}
+        self.line_error_field: dict[int, frozenset[FieldName]] = {}
+        self.error_count: Counter = Counter()
+        self.network = BusNetwork(self.__track(data))
+        for line_id in self.network.get_lines_id():
+            self.__check_line(line_id)
+
+    @staticmethod
+    def __record_key(item: dict) -> tuple:
+        # The bus_id is read as BusNetwork reads it, so a record with "bus_id": "128" is filed under the line 128
+        return int(item.get("bus_id", 0)), item.get("stop_id", 0)
+
+    def __track(self, data: Iterable[dict]) -> Iterator[dict]:
+        for batch in batched(data, self.validator.batch_size):
+            for item, error_field in zip(batch, self.validator.compute_error_field(batch)):
+                self.__add_record_error(self.__record_key(item), error_field)
+            yield from batch
+
+    def __add_record_error(self, key: tuple, error_field: frozenset[FieldName]):
+        self.record_error.setdefault(key, []).append(error_field)
+        self.error_count.update(error_field)
+
+    def __remove_record_error(self, key: tuple):
+        record_error = self.record_error.get(key)
+        if record_error:
+            self.error_count.subtract(record_error.pop(0))
+            if not record_error:
+                del self.record_error[key]
+
+    def __replace_record_error(self, key: tuple, error_field: frozenset[FieldName]):
+        record_error = self.record_error[key]
+        self.error_count.subtract(record_error[0])
+        record_error[0] = error_field
+        self.error_count.update(error_field)
+
+    def __check_line(self, line_id: int):
+        """Validates a single line again and updates the counts with the difference"""
+        self.error_count.subtract(self.line_error_field.pop(line_id, ()))
+        line = self.network.get_line_by_id(line_id)
+        if line:
+            _, report_error = self.validator.compute_line_error(line_id, line)
+            error_field = frozenset(chain.from_iterable(report_error.values()))
+            if error_field:
+                self.line_error_field[line_id] = error_field
+                self.error_count.update(error_field)
+
+    def add_stop(self, item: dict):
+        self.__add_record_error(self.__record_key(item), self.validator.compute_error_field([item])[0])
+        self.network.add_stop(item)
+        self.__check_line(self.__record_key(item)[0])
+
+    def remove_stop(self, bus_id: int, stop_id: int) -> Stop | None:
+        removed_stop = self.network.remove_stop(bus_id, stop_id)
+        if removed_stop is not None:
+            self.__remove_record_error((bus_id, stop_id))
+            self.__check_line(bus_id)
+        return removed_stop
+
+    def update_stop(self, item: dict) -> Stop | None:
+        key = self.__record_key(item)
+        error_field = self.validator.compute_error_field([item])[0]
+        removed_stop = self.network.update_stop(item)
+        if removed_stop is not None:
+            self.__replace_record_error(key, error_field)
+        else:
+            self.__add_record_error(key, error_field)
+        self.__check_line(key[0])
+        return removed_stop
+
+    def replace_line(self, bus_id: int, data: Iterable[dict]):
+        data = list(data)
+        for stop in self.network.get_line_by_id(bus_id):
+            self.__remove_record_error((bus_id, stop.id))
+        for item, error_field in zip(data, self.validator.compute_error_field(data)):
+            self.__add_record_error((bus_id, item.get("stop_id", 0)), error_field)
+        self.network.replace_line(bus_id, data)
+        self.__check_line(bus_id)
+
+    def remove_line(self, bus_id: int):
+        self.replace_line(bus_id, [])
+
+    def generate_report_error(self):
+        self.validator.print_report(+self.error_count)
+
+
+def _count_format_shard(rule_set: list[Field], shard: tuple[dict, ...]) -> Counter:
+    """Worker of the process pool counting the format errors of a batch of records"""
+    return Validator(rule_set).count_format_error(shard)
+
+
+def _count_network_shard(rule_set: list[Field], shard: tuple[tuple[int, list[Stop]], ...]) -> Counter:
+    """Worker of the process pool counting the errors of a subset of the lines"""
+    validator = Validator(rule_set)
+    return validator.count_error(validator.compute_line_error(line_id, line) for line_id, line in shard)
+
+
 if __name__ == '__main__':
     debug = False
+    # Number of processes validating the records, more than one is worth it for large timetables only
+    workers = 1
     env_dev = False
-    data = test_input if env_dev else input()
-    data = json.loads(data)
-
-    rule_set = [Field(name=FieldName.BUS_ID, required=True, type=FieldType.INTEGER),
-                Field(name=FieldName.STOP_ID, required=True, type=FieldType.INTEGER),
-                Field(name=FieldName.STOP_NAME, required=True, type=FieldType.STRING),
-                Field(name=FieldName.NEXT_STOP, required=True, type=FieldType.INTEGER),
-                Field(name=FieldName.STOP_TYPE, required=False, type=FieldType.CHARACTER),
-                Field(name=FieldName.A_TIME, required=True, type=FieldType.STRING)]
-
-    bus_network = BusNetwork(data)
-    Validator(rule_set).generate_report_error(data, network=bus_network, debug=debug)
+    stream = io.StringIO(test_input) if env_dev else sys.stdin
+
+    # The records are parsed one at a time and validated while the network is built
+    validator = Validator(RULE_SET, workers=workers)
+    bus_network = BusNetwork(validator.watch(read_records(stream), debug=debug))
+    validator.generate_report_error(network=bus_network, debug=debug)
     bus_network.resume_network(debug=debug)
 
+    # python rider.py compile <path> writes the network to a snapshot which can be loaded by NetworkSnapshot
+    if len(sys.argv) > 2 and sys.argv[1] == "compile":
+        skipped_lines = NetworkSnapshot.write(bus_network, sys.argv[2])
+        if skipped_lines:
+            print(f"Lines not compiled because of type or range errors: {" ".join(map(str, skipped_lines))}")
+
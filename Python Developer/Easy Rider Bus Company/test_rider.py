@@ -0,0 +1,523 @@
+import collections
+import contextlib
+import datetime
+import gc
+import io
+import itertools
+import json
+import os
+import pickle
+import random
+import re
+import string
+import tempfile
+import unittest
+import warnings
+
+from rider import (BusNetwork, ErrorType, FieldName, FieldType, HoursTime, JourneyPlanner, LineError, LiveNetwork,
+                   NetworkSnapshot, RULE_SET, StopType, Validator, read_records, test_input)
+
+
+def stop_record(bus_id, stop_id, next_stop, stop_type="", a_time="08:00", stop_name=None):
+    return {"bus_id": bus_id, "stop_id": stop_id, "stop_name": stop_name or f"Stop {stop_id} Street",
+            "next_stop": next_stop, "stop_type": stop_type, "a_time": a_time}
+
+
+def random_timetable(rng, lines=8, stop_names=10):
+    """Records of valid lines over a few shared stop names, the times of a line strictly increase"""
+    records = []
+    for bus_id in range(1, lines + 1):
+        minutes = rng.randrange(6 * 60, 12 * 60)
+        length = rng.randint(2, 6)
+        for stop_id in range(1, length + 1):
+            stop_type = "S" if stop_id == 1 else "F" if stop_id == length else "O"
+            records.append(stop_record(bus_id, stop_id, 0 if stop_id == length else stop_id + 1, stop_type,
+                                       str(HoursTime.from_minutes(minutes)),
+                                       f"Stop {rng.randrange(stop_names)} Street"))
+            minutes += rng.randint(1, 30)
+    return records
+
+
+class ReadRecordsTest(unittest.TestCase):
+    documents = [
+        test_input,
+        "[]",
+        " [ ] ",
+        '[{"bus_id": 1, "stop_name": "Elm Street, \\"the\\" ] [ {"}]',
+        '[{"a": [1, {"b": [2, 3]}]}, {"c": "\\u00e9t\\u00e9"}, {}]',
+        '[\n{"bus_id": 1}\n,\n{"bus_id": 2}\n]\n',
+    ]
+
+    def test_same_records_as_json_load(self):
+        for document in self.documents:
+            for chunk_size in (1, 2, 7, 64 * 1024):
+                with self.subTest(document=document[:30], chunk_size=chunk_size):
+                    self.assertEqual(list(read_records(io.StringIO(document), chunk_size)),
+                                     json.load(io.StringIO(document)))
+
+    def test_trailing_comma(self):
+        for chunk_size in (1, 64 * 1024):
+            with self.subTest(chunk_size=chunk_size), self.assertRaises(json.JSONDecodeError):
+                list(read_records(io.StringIO('[{"bus_id": 1}, ]'), chunk_size))
+
+    def test_malformed_array(self):
+        for document in ("", '{"bus_id": 1}', '[{"bus_id": 1}', '[, {"bus_id": 1}]', '[{"bus_id": 1} {"bus_id": 2}]',
+                         '[{"bus_id": 1'):
+            with self.subTest(document=document), self.assertRaises(ValueError):
+                list(read_records(io.StringIO(document), 4))
+
+    def test_records_are_yielded_lazily(self):
+        stream = io.StringIO('[{"bus_id": 1}, {"bus_id": 2}, ' + " " * 1000 + '{"bus_id": 3}]')
+        records = read_records(stream, 16)
+        self.assertEqual(next(records), {"bus_id": 1})
+        self.assertLess(stream.tell(), 100)
+
+
+class LineOrderTest(unittest.TestCase):
+    @staticmethod
+    def stop_ids(network, bus_id):
+        return [stop.id for stop in network.get_line_by_id(bus_id)]
+
+    def test_line_follows_next_stop_chain(self):
+        chain = list(range(1, 21))
+        records = [stop_record(1, stop_id, next_stop, "O", f"08:{stop_id:02d}")
+                   for stop_id, next_stop in zip(chain, chain[1:] + [0])]
+        records[0]["stop_type"], records[-1]["stop_type"] = "S", "F"
+        random.Random(0).shuffle(records)
+        network = BusNetwork(records)
+        self.assertEqual(self.stop_ids(network, 1), chain)
+        self.assertNotIn(1, network.line_error)
+
+    def test_test_input_lines(self):
+        network = BusNetwork(json.loads(test_input))
+        self.assertEqual({bus_id: self.stop_ids(network, bus_id) for bus_id in network.get_lines_id()},
+                         {128: [1, 3, 5, 7], 256: [2, 3, 6, 7], 512: [4, 6]})
+        self.assertEqual(network.line_error, {})
+
+    def test_line_errors(self):
+        cases = {
+            "duplicate": ([stop_record(1, 1, 2, "S"), stop_record(1, 2, 0, "F"), stop_record(1, 2, 0, "O")],
+                          [1, 2, 2], [LineError.DUPLICATE_STOP]),
+            "cycle": ([stop_record(1, 1, 2, "S"), stop_record(1, 2, 3), stop_record(1, 3, 2), stop_record(1, 4, 0, "F")],
+                      [1, 2, 3, 4], [LineError.CYCLE, LineError.UNREACHABLE_STOP]),
+            "broken": ([stop_record(1, 1, 5, "S"), stop_record(1, 2, 0, "F")],
+                       [1, 2], [LineError.BROKEN_CHAIN, LineError.UNREACHABLE_STOP]),
+        }
+        for name, (records, stop_ids, line_error) in cases.items():
+            with self.subTest(name):
+                network = BusNetwork(records)
+                self.assertEqual(self.stop_ids(network, 1), stop_ids)
+                self.assertEqual(network.line_error[1], line_error)
+
+    def test_line_without_start_or_finish_is_kept_as_given(self):
+        records = [stop_record(1, 3, 0, "F"), stop_record(1, 2, 3), stop_record(1, 1, 2)]
+        network = BusNetwork(records)
+        self.assertFalse(network.good_line[1])
+        self.assertEqual(self.stop_ids(network, 1), [3, 2, 1])
+        self.assertNotIn(1, network.line_error)
+
+    def test_lines_without_start_or_finish_are_listed(self):
+        records = json.loads(test_input)
+        records += [stop_record(13, 1, 2, "S"), stop_record(13, 2, 0, "O"), stop_record(24, 1, 0, "F")]
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            BusNetwork(records).resume_network()
+        self.assertIn("There is no start or end stop for this line: 13, 24.", output.getvalue())
+
+
+class StopClassificationTest(unittest.TestCase):
+    def test_against_pairwise_line_intersections(self):
+        network = BusNetwork(random_timetable(random.Random(6), lines=40, stop_names=60))
+        lines = list(network.network_line.values())
+        # The stops shared by two lines, found by intersecting the lines two by two as before the stop index
+        transfer = {stop.name for line_a, line_b in itertools.combinations(lines, 2)
+                    for stop in set(line_a) & set(line_b)}
+        names = {stop_type: {stop.name for line in lines for stop in line if stop.type == stop_type}
+                 for stop_type in ("S", "O", "F")}
+        on_demand = names["O"] - names["S"] - names["F"] - transfer
+        self.assertTrue(transfer and on_demand)
+        self.assertEqual(network.get_format_stop(StopType.TRANSFER), sorted(transfer))
+        self.assertEqual(network.get_format_stop(StopType.ON_DEMAND), sorted(on_demand))
+        self.assertEqual(network.get_format_stop(StopType.START), sorted(names["S"]))
+        self.assertEqual(network.get_format_stop(StopType.FINISH), sorted(names["F"]))
+
+
+class ValidatorTest(unittest.TestCase):
+    VALUES = (None, "", 0, 7, True, 1.5, "S", "X", "SO", "08:00", "8:00", "25:00", "08:00\n", "Elm Street",
+              "elm Street", "Elm Road", "Street", " Street", "Élan Street", "Elm  Avenue")
+
+    @staticmethod
+    def corrupt_records(rng, records, rate=0.3):
+        """Copies of the records with format and type errors and lines going back in time, readable by BusNetwork"""
+        records = [dict(item) for item in records]
+        for position, item in enumerate(records):
+            if rng.random() >= rate:
+                continue
+            match rng.randrange(5):
+                case 0: item["stop_name"] = item["stop_name"].lower()
+                case 1: item["stop_type"] = "X"
+                case 2: item["a_time"] = item["a_time"].lstrip("0")
+                case 3: item["next_stop"] = str(item["next_stop"])
+                case 4:
+                    previous = records[position - 1]
+                    if position and previous["bus_id"] == item["bus_id"]:
+                        item["a_time"], previous["a_time"] = previous["a_time"], item["a_time"]
+        return records
+
+    @staticmethod
+    def reference_errors(item):
+        # The checks of each field on a single item, written as they were before the rule set was compiled
+        errors = {error_type: set() for error_type in Validator.FORMAT_ERROR_TYPE}
+        for rule in RULE_SET:
+            key = rule.name.value
+            if rule.required and item.get(key, "") == "":
+                errors[ErrorType.REQUIRED].add(rule.name)
+            if key not in item:
+                continue
+            value = item[key]
+            match rule.type:
+                case FieldType.INTEGER: valid_type = isinstance(value, int)
+                case FieldType.STRING: valid_type = isinstance(value, str)
+                case FieldType.CHARACTER: valid_type = isinstance(value, str) and len(value) <= 1
+            if not valid_type:
+                errors[ErrorType.TYPE].add(rule.name)
+            match rule.name:
+                case FieldName.STOP_NAME:
+                    name, _, suffix = value.rpartition(" ") if isinstance(value, str) else ("", "", "")
+                    valid_format = suffix in {"Road", "Avenue", "Boulevard", "Street"} \
+                        and name != "" and name[0] in string.ascii_uppercase
+                case FieldName.STOP_TYPE: valid_format = value in {"S", "O", "F", ""}
+                case FieldName.A_TIME:
+                    valid_format = isinstance(value, str) \
+                        and re.match(r"^([0-1][0-9]|2[0-3]):([0-5][0-9])$", value) is not None
+                case _: valid_format = True
+            if not valid_format:
+                errors[ErrorType.FORMAT].add(rule.name)
+        return errors
+
+    def test_check_batch_against_the_checks_of_each_item(self):
+        rng = random.Random(8)
+        records = random_timetable(rng, lines=30)
+        for item in records:
+            for key in rng.sample(sorted(item), rng.randint(0, 2)):
+                if rng.random() < 0.2:
+                    del item[key]
+                else:
+                    item[key] = rng.choice(self.VALUES)
+        batch_error = Validator(RULE_SET).check_batch(records)
+        for index, item in enumerate(records):
+            with self.subTest(item=item):
+                self.assertEqual({error_type: {field_name for field_name, has_error in error_field.items()
+                                               if has_error[index]}
+                                  for error_type, error_field in batch_error.items()},
+                                 self.reference_errors(item))
+        expected = collections.Counter(field_name for item in records
+                                       for field_name in set().union(*self.reference_errors(item).values()))
+        self.assertEqual(Validator(RULE_SET, batch_size=7).count_format_error(records), expected)
+
+    def test_parallel_counts_equal_serial_counts(self):
+        rng = random.Random(5)
+        records = self.corrupt_records(rng, random_timetable(rng, lines=60))
+        network = BusNetwork(records)
+        serial, parallel = Validator(RULE_SET), Validator(RULE_SET, batch_size=16, workers=2)
+        self.assertTrue(serial.count_network_error(network))
+        self.assertEqual(parallel.count_network_error(network), serial.count_network_error(network))
+        self.assertEqual(parallel.count_format_error(records), serial.count_format_error(records))
+        # The format errors of the batches validated by the pool, while streaming the records and for the report
+        self.assertEqual(list(parallel.watch(records)), records)
+        self.assertEqual(parallel.format_error_count, serial.count_format_error(records))
+        reports = []
+        for validator in (serial, parallel):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                validator.generate_report_error(records, network)
+            reports.append(output.getvalue())
+        self.assertEqual(reports[1], reports[0])
+
+
+class HoursTimeTest(unittest.TestCase):
+    def test_against_datetime_time(self):
+        rng = random.Random(9)
+        for _ in range(300):
+            a, b = (datetime.time(rng.randrange(24), rng.randrange(60)) for _ in range(2))
+            x, y = HoursTime(a.hour, a.minute), HoursTime(b.hour, b.minute)
+            with self.subTest(a=str(a), b=str(b)):
+                self.assertEqual(x.time, a)
+                self.assertEqual(str(x), a.strftime("%H:%M"))
+                self.assertIs(HoursTime.from_string(str(x)), x)
+                # The sum wraps around midnight, as the sum of two times of a day did
+                total = datetime.datetime.combine(datetime.date.min, a) + datetime.timedelta(hours=b.hour,
+                                                                                             minutes=b.minute)
+                self.assertEqual((x + y).time, total.time())
+                self.assertEqual([x < y, x <= y, x > y, x >= y, x == y], [a < b, a <= b, a > b, a >= b, a == b])
+
+    def test_one_instance_by_minute(self):
+        self.assertIs(HoursTime(8, 5), HoursTime.from_minutes(8 * 60 + 5))
+        self.assertIs(HoursTime(23, 50) + HoursTime(0, 20), HoursTime(0, 10))
+        self.assertIs(pickle.loads(pickle.dumps(HoursTime(8, 5))), HoursTime(8, 5))
+        with self.assertRaises(AttributeError):
+            HoursTime(8, 5).minutes = 0
+        for hour, minute in ((24, 0), (8, 60), (-1, 0)):
+            with self.subTest(hour=hour, minute=minute), self.assertRaises(ValueError):
+                HoursTime(hour, minute)
+
+
+class JourneyPlannerTest(unittest.TestCase):
+    @staticmethod
+    def connections(records):
+        # (departure stop, departure, arrival stop, arrival, bus_id) between the consecutive records of each line
+        return [(stop_from["stop_name"], HoursTime.from_string(stop_from["a_time"]).minutes,
+                 stop_to["stop_name"], HoursTime.from_string(stop_to["a_time"]).minutes, stop_from["bus_id"])
+                for stop_from, stop_to in zip(records, records[1:]) if stop_from["bus_id"] == stop_to["bus_id"]]
+
+    @staticmethod
+    def brute_force_arrival(connections, origin, destination, departure, transfer_time):
+        # Marks the usable connections until nothing changes: a connection is usable when it leaves the origin after
+        # the departure, follows a usable connection of its bus, or leaves after a usable connection of another bus
+        # arrived at its stop, with the time to change
+        usable = set()
+        changed = True
+        while changed:
+            changed = False
+            for index, (stop_from, departs, _, _, bus_id) in enumerate(connections):
+                if index in usable:
+                    continue
+                if (stop_from == origin and departs >= departure
+                        or index > 0 and index - 1 in usable and connections[index - 1][4] == bus_id
+                        and connections[index - 1][2] == stop_from
+                        or any(connections[other][2] == stop_from and connections[other][4] != bus_id
+                               and connections[other][3] + transfer_time <= departs for other in usable)):
+                    usable.add(index)
+                    changed = True
+        arrivals = [connections[index][3] for index in usable if connections[index][2] == destination]
+        return min(arrivals, default=None)
+
+    def assert_valid_journey(self, journey, origin, destination, departure, transfer_time):
+        self.assertEqual(journey.legs[0].departure_stop, origin)
+        self.assertGreaterEqual(journey.legs[0].departure_time.minutes, departure)
+        self.assertEqual(journey.legs[-1].arrival_stop, destination)
+        for leg in journey.legs:
+            self.assertLessEqual(leg.departure_time, leg.arrival_time)
+        for leg, next_leg in zip(journey.legs, journey.legs[1:]):
+            self.assertEqual(leg.arrival_stop, next_leg.departure_stop)
+            self.assertLessEqual(leg.arrival_time.minutes + transfer_time, next_leg.departure_time.minutes)
+
+    def test_earliest_arrival_against_brute_force(self):
+        rng = random.Random(7)
+        for case in range(40):
+            records = random_timetable(rng)
+            connections = self.connections(records)
+            transfer_time = rng.choice((0, 0, 5))
+            planner = JourneyPlanner(BusNetwork(records), transfer_time)
+            names = sorted(planner.stop_index)
+            for _ in range(15):
+                origin, destination = rng.sample(names, 2)
+                departure = rng.randrange(6 * 60, 14 * 60)
+                with self.subTest(case=case, origin=origin, destination=destination, departure=departure):
+                    journey = planner.earliest_arrival(origin, destination, HoursTime.from_minutes(departure))
+                    expected = self.brute_force_arrival(connections, origin, destination, departure, transfer_time)
+                    if expected is None:
+                        self.assertIsNone(journey)
+                    else:
+                        self.assertEqual(journey.arrival_time.minutes, expected)
+                        self.assert_valid_journey(journey, origin, destination, departure, transfer_time)
+
+    def test_test_input_journeys(self):
+        planner = JourneyPlanner(BusNetwork(json.loads(test_input)))
+        journey = planner.earliest_arrival("Bourbon Street", "Sesame Street", HoursTime(8, 0))
+        self.assertEqual([str(leg) for leg in journey.legs],
+                         ["bus 512: Bourbon Street (08:13) -> Abbey Road (08:16)",
+                          "bus 256: Abbey Road (09:59) -> Sesame Street (10:12)"])
+        self.assertEqual(journey.transfers, 1)
+        self.assertIsNone(planner.earliest_arrival("Prospekt Avenue", "Sesame Street", HoursTime(9, 0)))
+        self.assertEqual(planner.earliest_arrival("Elm Street", "Elm Street").legs, [])
+        with self.assertRaises(ValueError):
+            planner.earliest_arrival("Elm Street", "Unknown Street")
+
+    def test_connections_at_the_same_minute_keep_the_line_order(self):
+        records = [stop_record(1, 3, 1, "S", "07:00", "C Street"), stop_record(1, 1, 0, "F", "07:30", "A Street"),
+                   stop_record(2, 2, 1, "S", "08:00", "B Street"), stop_record(2, 1, 3, "O", "08:00", "A Street"),
+                   stop_record(2, 3, 0, "F", "08:00", "C Street")]
+        planner = JourneyPlanner(BusNetwork(records))
+        journey = planner.earliest_arrival("B Street", "C Street", HoursTime(7, 50))
+        self.assertEqual([str(leg) for leg in journey.legs], ["bus 2: B Street (08:00) -> C Street (08:00)"])
+
+    def test_a_line_going_back_in_time_is_not_ridden_across(self):
+        records = [stop_record(1, 1, 2, "S", "08:00", "Alpha Road"), stop_record(1, 2, 3, "", "09:00", "Beta Road"),
+                   stop_record(1, 3, 4, "", "08:30", "Gamma Road"), stop_record(1, 4, 0, "F", "08:45", "Delta Road")]
+        planner = JourneyPlanner(BusNetwork(records))
+        self.assertIsNone(planner.earliest_arrival("Alpha Road", "Delta Road", HoursTime(7, 0)))
+        journey = planner.earliest_arrival("Gamma Road", "Delta Road", HoursTime(7, 0))
+        self.assertEqual([str(leg) for leg in journey.legs], ["bus 1: Gamma Road (08:30) -> Delta Road (08:45)"])
+
+    def test_excluded_lines(self):
+        planner = JourneyPlanner(BusNetwork(json.loads(test_input)), excluded_lines={256})
+        self.assertIsNone(planner.earliest_arrival("Bourbon Street", "Sesame Street", HoursTime(8, 0)))
+
+
+class NetworkSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "network.snap")
+
+    @staticmethod
+    def stops(line):
+        # Stop only compares the names
+        return [(stop.id, stop.name, stop.next_stop_id, stop.type, stop.a_time) for stop in line]
+
+    def test_round_trip(self):
+        records = random_timetable(random.Random(3), lines=30) + json.loads(test_input)
+        records.append(stop_record(99, 1, 2, "O", "09:00", "Elm Street"))
+        network = BusNetwork(records)
+        self.assertEqual(NetworkSnapshot.write(network, self.path), [])
+        with NetworkSnapshot(self.path) as snapshot:
+            self.assertEqual(list(snapshot.get_lines_id()), list(network.get_lines_id()))
+            for bus_id in network.get_lines_id():
+                self.assertEqual(self.stops(snapshot.get_line_by_id(bus_id)), self.stops(network.get_line_by_id(bus_id)))
+                self.assertEqual(snapshot.is_good_line(bus_id), network.good_line[bus_id])
+            self.assertFalse(snapshot.is_good_line(99))
+            self.assertEqual(snapshot.get_line_by_id(12345), [])
+            for name in network.stop_by_name:
+                self.assertEqual(list(snapshot.get_stop_lines(name)), sorted(network.stop_lines.get(name, ())))
+            self.assertEqual(snapshot.get_transfer_stop(), network.get_format_stop(StopType.TRANSFER))
+
+            planner, mapped = JourneyPlanner(network, 2), snapshot.planner(2)
+            # The indexes of the planner are read from the snapshot, the same as computed from its columns
+            indexes = JourneyPlanner.index_connections(len(snapshot.stop_names), mapped.departure_stop,
+                                                       mapped.arrival_stop)
+            for index, expected in zip((mapped.departures_by_stop, mapped.departure_offset, mapped.last_arrival),
+                                       indexes):
+                self.assertIsInstance(index, memoryview)
+                self.assertEqual(index.tolist(), expected.tolist())
+            rng = random.Random(4)
+            names = sorted(planner.stop_index)
+            for _ in range(200):
+                origin, destination = rng.sample(names, 2)
+                departure = HoursTime.from_minutes(rng.randrange(6 * 60, 14 * 60))
+                journey = planner.earliest_arrival(origin, destination, departure)
+                self.assertEqual(mapped.earliest_arrival(origin, destination, departure), journey)
+
+    def test_lines_not_compilable_are_left_out(self):
+        records = json.loads(test_input)
+        records += [stop_record(2 ** 31, 1, 2, "S"), stop_record(2 ** 31, 2, 0, "F", "08:30"),
+                    stop_record(7, "1", 2, "S"), stop_record(7, 2, 0, "F", "08:30")]
+        network = BusNetwork(records)
+        self.assertEqual(NetworkSnapshot.write(network, self.path), [2 ** 31, 7])
+        with NetworkSnapshot(self.path) as snapshot:
+            self.assertEqual(list(snapshot.get_lines_id()), [128, 256, 512])
+            self.assertEqual(snapshot.get_line_by_id(7), [])
+            self.assertEqual(list(snapshot.get_stop_lines("Stop 1 Street")), [])
+            self.assertEqual(snapshot.planner().trip_line.tolist(), [128, 256, 512])
+
+    def test_closed_while_stop_lines_are_kept(self):
+        NetworkSnapshot.write(BusNetwork(json.loads(test_input)), self.path)
+        snapshot = NetworkSnapshot(self.path)
+        stop_lines = snapshot.get_stop_lines("Sesame Street")
+        snapshot.close()
+        self.assertEqual(stop_lines, [128, 256])
+
+    def test_not_a_snapshot(self):
+        NetworkSnapshot.write(BusNetwork(json.loads(test_input)), self.path)
+        with open(self.path, "rb") as f:
+            content = f.read()
+        # An empty file, a header cut short, a snapshot cut short and a file of another format
+        for data in (b"", content[:10], content[:len(content) // 2], b"\0" * 64):
+            with self.subTest(size=len(data)):
+                with open(self.path, "wb") as f:
+                    f.write(data)
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter("always", ResourceWarning)
+                    with self.assertRaisesRegex(ValueError, "not a network snapshot"):
+                        NetworkSnapshot(self.path)
+                    # A file left open would warn when collected
+                    gc.collect()
+                self.assertEqual([warning.message for warning in caught], [])
+
+
+class LiveNetworkTest(unittest.TestCase):
+    """Patches a network at random and compares it with the network rebuilt from the patched records"""
+
+    @staticmethod
+    def random_record(rng, bus_id):
+        return stop_record(bus_id, rng.randint(1, 8), rng.randint(0, 8), rng.choice(["S", "F", "O", "", "S", "F"]),
+                           f"{rng.randint(8, 12):02d}:{rng.choice([0, 15, 30, 45]):02d}",
+                           rng.choice(["Elm Street", "Oak Road", "Pine Avenue", "bad"]))
+
+    @staticmethod
+    def state(network):
+        lines = {bus_id: [(stop.id, stop.name, stop.next_stop_id, stop.type, stop.a_time) for stop in line]
+                 for bus_id, line in network.network_line.items()}
+        return (lines, network.good_line, network.line_error, network.stop_lines,
+                {stop_type: +count for stop_type, count in network.stop_types.items() if +count},
+                set(network.stop_by_name), [(stop.id, stop.name) for stop in network.unassigned_stop])
+
+    @staticmethod
+    def find_record(records, bus_id, stop_id):
+        return next((position for position, item in enumerate(records)
+                     if int(item["bus_id"]) == bus_id and item["stop_id"] == stop_id), None)
+
+    def patch_at_random(self, rng, target, records):
+        # Applies random patches to the target and to the records, gives the patched records
+        for _ in range(rng.randint(1, 10)):
+            bus_id = rng.randint(0, 3)
+            match rng.randrange(5):
+                case 0:
+                    item = self.random_record(rng, bus_id)
+                    target.add_stop(item)
+                    records.append(item)
+                case 1:
+                    stop_id = rng.randint(1, 8)
+                    target.remove_stop(bus_id, stop_id)
+                    position = self.find_record(records, bus_id, stop_id)
+                    if position is not None:
+                        del records[position]
+                case 2:
+                    item = self.random_record(rng, bus_id)
+                    target.update_stop(item)
+                    position = self.find_record(records, bus_id, item["stop_id"])
+                    if position is None:
+                        records.append(item)
+                    else:
+                        records[position] = item
+                case 3 if bus_id:
+                    items = [self.random_record(rng, bus_id) for _ in range(rng.randint(0, 4))]
+                    target.replace_line(bus_id, items)
+                    records = [item for item in records if int(item["bus_id"]) != bus_id] + items
+                case 4 if bus_id:
+                    target.remove_line(bus_id)
+                    records = [item for item in records if int(item["bus_id"]) != bus_id]
+        return records
+
+    def random_records(self, rng):
+        records = [self.random_record(rng, rng.randint(0, 3)) for _ in range(rng.randint(0, 12))]
+        if records and rng.random() < 0.3:
+            # a bus_id given as a string is read as an int by BusNetwork
+            records.insert(0, dict(self.random_record(rng, 2), bus_id="2"))
+        return records
+
+    def test_patched_network_equals_rebuilt_network(self):
+        rng = random.Random(0)
+        for case in range(300):
+            records = self.random_records(rng)
+            network = BusNetwork(list(records))
+            records = self.patch_at_random(rng, network, records)
+            with self.subTest(case=case):
+                self.assertEqual(self.state(network), self.state(BusNetwork(records)))
+
+    def test_live_error_counts_equal_rebuilt_counts(self):
+        rng = random.Random(1)
+        validator = Validator(RULE_SET)
+        for case in range(300):
+            records = self.random_records(rng)
+            live = LiveNetwork(validator, list(records))
+            records = self.patch_at_random(rng, live, records)
+            rebuilt = BusNetwork(list(records))
+            with self.subTest(case=case):
+                self.assertEqual(self.state(live.network), self.state(rebuilt))
+                self.assertEqual(+live.error_count,
+                                 +(validator.count_format_error(records) + validator.count_network_error(rebuilt)))
+
+
+if __name__ == "__main__":
+    unittest.main()
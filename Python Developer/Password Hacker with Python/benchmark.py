@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from dataclasses import dataclass, asdict
+
+import hack
+from hack import ConnectionPool, Credentials, GeneratorMethod, calibration_candidates
+from server import ServerConfig, serve
+
+HOSTNAME = "127.0.0.1"
+LOGINS = ["root", "user", "guest", "super", "test", "admin", "operator"]
+# the dictionary password is a case variation of one of its words
+PASSWORDS = ["qwerty", "letmein", "dragon", "sunshine", "monkey"]
+
+
+@dataclass
+class BenchmarkConfig:
+    # seconds added by the server to every response
+    latency: float = 0.0
+    # seconds added by the server to a wrong password whose beginning is correct
+    leak: float = 0.1
+    requests: int = 2000
+    connections: tuple = (1, 4, 16)
+    port: int = 9090
+
+
+# password to find and leak of the server for each method: the brute force methods other than by characters
+# restart from the beginning on a late response, so they are timed without the leak
+CREDENTIAL_CASES = {
+    GeneratorMethod.BruteForce: ("a1b", False),
+    GeneratorMethod.Dictionary: ("DrAgon", False),
+    GeneratorMethod.BruteForceByCharacters: ("aB3x9Q", True),
+}
+
+
+class LocalServer:
+    """The server of server.py in its own process, so it does not share the interpreter with the client"""
+
+    def __init__(self, port: int, config: ServerConfig) -> None:
+        self.port = port
+        self.process = multiprocessing.Process(target=serve, args=(HOSTNAME, port, config), daemon=True)
+
+    def __enter__(self) -> "LocalServer":
+        self.process.start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection((HOSTNAME, self.port)).close()
+                return self
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def __exit__(self, *exc_info) -> None:
+        self.process.terminate()
+        self.process.join()
+
+
+def sync_round_trips(port: int, requests: int) -> float:
+    with socket.create_connection((HOSTNAME, port)) as client_socket:
+        start = time.perf_counter()
+        for credentials in calibration_candidates("nobody", requests):
+            hack.send_credentials(client_socket, credentials)
+        return requests / (time.perf_counter() - start)
+
+
+async def async_round_trips(port: int, requests: int, connections: int) -> float:
+    async with ConnectionPool(HOSTNAME, port, connections) as pool:
+        start = time.perf_counter()
+        await pool.probe(calibration_candidates("nobody", requests), lambda *_: False)
+        return requests / (time.perf_counter() - start)
+
+
+def time_to_credential(port: int, method: GeneratorMethod, connections: int) -> tuple[float, Credentials]:
+    # the timings of a previous attack must not be the baseline of this one
+    hack.response_time.clear()
+    start = time.perf_counter()
+    if connections > 1:
+        credentials = asyncio.run(hack.async_attack(HOSTNAME, port, connections, method=method))
+    else:
+        with socket.create_connection((HOSTNAME, port)) as client_socket:
+            login = hack.login_attack(client_socket)
+            credentials = Credentials(login, hack.password_attack(client_socket, login=login, method=method))
+    return time.perf_counter() - start, credentials
+
+
+def run(config: BenchmarkConfig) -> dict:
+    round_trips = {}
+    with LocalServer(config.port, ServerConfig(latency=config.latency, leak=config.leak)):
+        for connections in config.connections:
+            if connections > 1:
+                round_trips[connections] = asyncio.run(async_round_trips(config.port, config.requests, connections))
+            else:
+                round_trips[connections] = sync_round_trips(config.port, config.requests)
+
+    time_to_solve = {}
+    for method, (password, with_leak) in CREDENTIAL_CASES.items():
+        server_config = ServerConfig(login="admin", password=password, latency=config.latency,
+                                     leak=config.leak if with_leak else 0.0)
+        time_to_solve[method.value] = {}
+        with LocalServer(config.port, server_config):
+            for connections in config.connections:
+                seconds, credentials = time_to_credential(config.port, method, connections)
+                time_to_solve[method.value][connections] = {
+                    "seconds": seconds,
+                    "found": asdict(credentials) == asdict(Credentials("admin", password)),
+                }
+
+    return {
+        "python": sys.version.split()[0],
+        "config": asdict(config),
+        "round_trips_per_second": round_trips,
+        "time_to_credential": time_to_solve,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round-trips per second and time to find the credentials of "
+                                                 "hack.py against the local server of server.py.")
+    parser.add_argument("--latency", type=float, default=BenchmarkConfig.latency)
+    parser.add_argument("--leak", type=float, default=BenchmarkConfig.leak)
+    parser.add_argument("--requests", type=int, default=BenchmarkConfig.requests)
+    parser.add_argument("--connections", type=int, nargs="+", default=BenchmarkConfig.connections)
+    parser.add_argument("--port", type=int, default=BenchmarkConfig.port)
+    parser.add_argument("--output", help="File to write the JSON results to, stdout by default")
+    args = parser.parse_args()
+
+    config = BenchmarkConfig(latency=args.latency, leak=args.leak, requests=args.requests,
+                             connections=tuple(args.connections), port=args.port)
+    # hack.py reads the logins and the dictionary from the working directory
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        with open("logins.txt", "w") as f:
+            f.write("\n".join(LOGINS))
+        with open("passwords.txt", "w") as f:
+            f.write("\n".join(PASSWORDS))
+        try:
+            results = run(config)
+        finally:
+            os.chdir(working_directory)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
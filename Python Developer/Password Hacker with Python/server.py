@@ -0,0 +1,90 @@
+import argparse
+import json
+import socketserver
+import time
+
+from dataclasses import dataclass
+
+from hack import NetworkMessage
+
+
+@dataclass
+class ServerConfig:
+    login: str = "admin"
+    password: str = "aB3x"
+    # seconds added to every response, as the network would
+    latency: float = 0.0
+    # seconds added to the response of a wrong password whose beginning is correct, the leak hack.py relies on
+    leak: float = 0.1
+    # requests answered on a connection before the server closes it, 0 for no limit
+    max_requests: int = 0
+
+
+class AuthenticationHandler(socketserver.BaseRequestHandler):
+    """
+    Answers each request of a connection as the test server of the course: a JSON object with the login and
+    the password is answered by a JSON object with the result, one of the NetworkMessage.
+    """
+
+    def handle(self) -> None:
+        config: ServerConfig = self.server.config
+        answered = 0
+        while data := self.request.recv(1024):
+            message = self.__check(config, data)
+            if config.latency:
+                time.sleep(config.latency)
+            self.request.sendall(json.dumps({"result": message.value}).encode())
+            answered += 1
+            if answered == config.max_requests:
+                return
+
+    @staticmethod
+    def __check(config: ServerConfig, data: bytes) -> NetworkMessage:
+        try:
+            credentials = json.loads(data)
+            login, password = credentials["login"], credentials["password"]
+        except (ValueError, KeyError, TypeError):
+            return NetworkMessage.BAD_REQUEST
+        if login != config.login:
+            return NetworkMessage.WRONG_LOGIN
+        if password == config.password:
+            return NetworkMessage.CORRECT_CONNECTION
+        if password and config.password.startswith(password):
+            time.sleep(config.leak)
+        return NetworkMessage.WRONG_PASSWORD
+
+
+class AuthenticationServer(socketserver.ThreadingTCPServer):
+    """Local stand-in of the test server of the course, each connection is handled by its own thread"""
+    allow_reuse_address = True
+    daemon_threads = True
+    # the default backlog of 5 makes a pool of more connections wait for the SYN retransmissions
+    request_queue_size = 128
+
+    def __init__(self, address: tuple[str, int], config: ServerConfig) -> None:
+        super().__init__(address, AuthenticationHandler)
+        self.config = config
+
+
+def serve(hostname: str, port: int, config: ServerConfig) -> None:
+    with AuthenticationServer((hostname, port), config) as server:
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local authentication server speaking the protocol of hack.py.")
+    parser.add_argument("hostname", nargs="?", default="127.0.0.1")
+    parser.add_argument("port", nargs="?", type=int, default=9090)
+    parser.add_argument("--login", default=ServerConfig.login)
+    parser.add_argument("--password", default=ServerConfig.password)
+    parser.add_argument("--latency", type=float, default=ServerConfig.latency,
+                        help="seconds added to every response")
+    parser.add_argument("--leak", type=float, default=ServerConfig.leak,
+                        help="seconds added to a wrong password whose beginning is correct")
+    parser.add_argument("--max-requests", type=int, default=ServerConfig.max_requests,
+                        help="requests answered on a connection before closing it, 0 for no limit")
+    args = parser.parse_args()
+
+    serve(args.hostname, args.port,
+          ServerConfig(login=args.login, password=args.password, latency=args.latency, leak=args.leak,
+                       max_requests=args.max_requests))
@@ -0,0 +1,273 @@
+import asyncio
+import os
+import random
+import socket
+import string
+import tempfile
+import threading
+import unittest
+from itertools import chain, islice, product
+
+import hack
+from hack import ConnectionPool, Credentials, GeneratorMethod, PasswordGenerator, TimingClassifier, \
+    calibration_candidates
+from server import AuthenticationServer, ServerConfig
+
+
+class PasswordGeneratorTest(unittest.TestCase):
+    words = ["ab", "", "Pass1", "qwerty", "   ", "123", "zZ"]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "passwords.txt")
+        with open(self.filename, "w") as f:
+            f.write("\n".join(self.words) + "\n")
+
+    def generator(self, max_length=2):
+        return PasswordGenerator(max_length=max_length, filename=self.filename)
+
+    @staticmethod
+    def brute_force(max_length):
+        choice = string.ascii_lowercase + string.digits
+        return [''.join(password) for password in
+                chain.from_iterable(product(choice, repeat=length) for length in range(1, max_length + 1))]
+
+    def passwords(self, method, **kwargs):
+        return list(self.generator().generator(method=method, **kwargs))
+
+    def test_brute_force_order(self):
+        self.assertEqual(self.passwords(GeneratorMethod.BruteForce), self.brute_force(2))
+
+    def test_dictionary_case_variations(self):
+        passwords = self.passwords(GeneratorMethod.Dictionary)
+        self.assertEqual(len(passwords), len(set(passwords)))
+        expected = set()
+        for word in filter(str.strip, self.words):
+            expected.update(''.join(variation) for variation in product(*({c, c.upper()} for c in word.strip())))
+        self.assertEqual(set(passwords), expected)
+        # in the order of the Gray code, each variation of a word changes one character of the previous one
+        for password, next_password in zip(passwords, passwords[1:]):
+            if password.lower() == next_password.lower():
+                self.assertEqual(sum(a != b for a, b in zip(password, next_password)), 1)
+
+    def test_resume_from_any_start(self):
+        for method in GeneratorMethod:
+            full = self.passwords(method, begin_char="x")
+            for start in chain(range(0, 40), range(len(full) - 3, len(full) + 2)):
+                with self.subTest(method=method, start=start):
+                    self.assertEqual(self.passwords(method, begin_char="x", start=start), full[start:])
+
+    def test_resume_from_position(self):
+        for method in GeneratorMethod:
+            full = self.passwords(method, begin_char="x")
+            for taken in (0, 1, 17, 40):
+                with self.subTest(method=method, taken=taken):
+                    generator = self.generator()
+                    first = list(islice(generator.generator(method=method, begin_char="x"), taken))
+                    self.assertEqual(generator.position, len(first))
+                    rest = list(generator.generator(method=method, begin_char="x", start=generator.position))
+                    self.assertEqual(first + rest, full)
+
+    def test_shards_share_all_passwords(self):
+        for method in GeneratorMethod:
+            full = self.passwords(method, begin_char="x")
+            for count in (1, 2, 3, 7):
+                with self.subTest(method=method, count=count):
+                    shards = [self.passwords(method, begin_char="x", shard=(index, count)) for index in range(count)]
+                    self.assertEqual(shards, [full[index::count] for index in range(count)])
+
+    def test_shard_resumed_from_position(self):
+        full = self.brute_force(3)
+        generator = self.generator(3)
+        first = list(islice(generator.generator(shard=(2, 5)), 1000))
+        rest = list(generator.generator(shard=(2, 5), start=generator.position))
+        self.assertEqual(first + rest, full[2::5])
+
+    def test_start_beyond_the_first_lengths(self):
+        full = self.brute_force(3)
+        for start in (35, 36, 37, 1331, 1332, 1333, 40000):
+            with self.subTest(start=start):
+                self.assertEqual(list(islice(self.generator(3).generator(start=start), 50)), full[start:start + 50])
+
+
+class TimingClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(20)
+
+    def noise(self, count, middle=1.0, deviation=0.05):
+        return [self.rng.gauss(middle, deviation) for _ in range(count)]
+
+    def test_not_ready_before_min_samples(self):
+        classifier = TimingClassifier(self.noise(19))
+        self.assertFalse(classifier.ready)
+        self.assertFalse(classifier.is_outlier(1000.0))
+        classifier.samples.append(1.0)
+        self.assertTrue(classifier.is_outlier(1000.0))
+
+    def test_clear_outlier(self):
+        classifier = TimingClassifier(self.noise(200))
+        self.assertTrue(classifier.is_outlier(100.0))
+        self.assertTrue(classifier.is_late([100.0, 101.0]))
+        self.assertEqual(classifier.late_samples, [100.0, 101.0])
+        # once a late response is known, an outlier closer to the baseline than to it is a jitter
+        self.assertGreater(classifier.score(30.0), classifier.threshold)
+        self.assertFalse(classifier.is_outlier(30.0))
+        self.assertTrue(classifier.is_outlier(80.0))
+
+    def test_late_request_needs_all_its_response_times(self):
+        classifier = TimingClassifier(self.noise(200))
+        self.assertFalse(classifier.is_late([100.0, 1.0]))
+        self.assertEqual(classifier.late_samples, [])
+
+    def test_noise_only(self):
+        samples = self.noise(500)
+        classifier = TimingClassifier(samples)
+        # the samples keep growing as the requests are sent, with a few spikes of the network among them
+        for elapsed_time in self.noise(2000):
+            self.assertFalse(classifier.is_outlier(elapsed_time))
+            samples.append(elapsed_time if self.rng.random() > 0.01 else elapsed_time * 3)
+
+    def test_constant_time_server(self):
+        classifier = TimingClassifier([2.0] * 50)
+        self.assertEqual(classifier.baseline(), (2.0, classifier.min_spread))
+        for jitter in (0.0, 0.3, 1.0, 4.0):
+            self.assertFalse(classifier.is_outlier(2.0 + jitter))
+        self.assertTrue(classifier.is_outlier(2.0 + classifier.min_spread * classifier.threshold + 0.1))
+
+
+class LocalServerTestCase(unittest.TestCase):
+    """An AuthenticationServer on a free port, with logins.txt in the working directory of the attack"""
+    config = ServerConfig(login="admin", password="aB3x", leak=0.05)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        with open("logins.txt", "w") as f:
+            f.write("root\nuser\nadmin\nguest\n")
+        # the response times of other tests must not be in the baseline
+        hack.response_time.clear()
+        self.addCleanup(hack.response_time.clear)
+        self.server = self.create_server()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.hostname, self.port = self.server.server_address
+
+    def create_server(self):
+        return AuthenticationServer(("127.0.0.1", 0), self.config)
+
+    def sync_attack(self):
+        with socket.create_connection((self.hostname, self.port)) as client_socket:
+            login = hack.login_attack(client_socket)
+            return login, hack.password_attack(client_socket, login=login,
+                                               method=GeneratorMethod.BruteForceByCharacters)
+
+
+class TimingAttackTest(LocalServerTestCase):
+    def test_password_found(self):
+        self.assertEqual(self.sync_attack(), ("admin", "aB3x"))
+
+
+class ConstantTimeServerTest(LocalServerTestCase):
+    config = ServerConfig(login="admin", password="aB3x", leak=0.0)
+
+    def test_password_not_found(self):
+        # without the leak no character stands out
+        self.assertEqual(self.sync_attack(), ("admin", None))
+
+
+class CountingServer(AuthenticationServer):
+    """Counts the connections accepted, and the most of them open at the same time"""
+
+    def __init__(self, address, config):
+        super().__init__(address, config)
+        self.lock = threading.Lock()
+        self.accepted = self.open = self.peak = 0
+
+    def finish_request(self, request, client_address):
+        with self.lock:
+            self.accepted += 1
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+        try:
+            super().finish_request(request, client_address)
+        finally:
+            with self.lock:
+                self.open -= 1
+
+
+class PoolTestCase(LocalServerTestCase):
+    size = 4
+
+    def create_server(self):
+        return CountingServer(("127.0.0.1", 0), self.config)
+
+    def run_with_pool(self, coroutine):
+        async def main():
+            async with ConnectionPool(self.hostname, self.port, self.size) as pool:
+                return await coroutine(pool)
+
+        return asyncio.run(main())
+
+    def async_attack(self):
+        return asyncio.run(hack.async_attack(self.hostname, self.port, self.size))
+
+
+class ConnectionPoolTest(PoolTestCase):
+    def test_async_attack(self):
+        self.assertEqual(self.async_attack(), Credentials("admin", "aB3x"))
+        self.assertEqual(self.server.accepted, self.size)
+
+    def test_pool_size_limit(self):
+        async def probe(pool):
+            self.assertEqual(len(pool.connections), self.size)
+            return await pool.probe(calibration_candidates("nobody", 200), lambda *_: False)
+
+        self.assertEqual(self.run_with_pool(probe), [])
+        self.assertEqual(len(hack.response_time), 200)
+        self.assertEqual((self.server.accepted, self.server.peak), (self.size, self.size))
+
+    def test_connections_are_reused(self):
+        async def probe_twice(pool):
+            connections = list(pool.connections)
+            candidates = (Credentials(login, "12345") for login in ["root", "user", "admin", "guest"] * 10)
+            first = await pool.probe(candidates, lambda message, _: message == hack.NetworkMessage.WRONG_PASSWORD)
+            # the next probe goes on with the candidates left, over the same connections
+            second = await pool.probe(candidates, lambda message, _: message == hack.NetworkMessage.WRONG_PASSWORD)
+            await pool.request(Credentials("admin", "aB3x"))
+            self.assertEqual(pool.connections, connections)
+            return first, second
+
+        first, second = self.run_with_pool(probe_twice)
+        for found in (first, second):
+            self.assertTrue(found)
+            self.assertEqual({credentials.login for credentials, _, _ in found}, {"admin"})
+        self.assertEqual(self.server.accepted, self.size)
+
+
+class DroppedConnectionTest(PoolTestCase):
+    """The server closes each connection after a few requests, the pool opens it again"""
+    config = ServerConfig(login="admin", password="aB3x", leak=0.05, max_requests=7)
+
+    def test_reconnect(self):
+        async def probe(pool):
+            await pool.probe(calibration_candidates("nobody", 100), lambda *_: False)
+            self.assertEqual(len(pool.connections), self.size)
+            return pool.reconnections
+
+        reconnections = self.run_with_pool(probe)
+        self.assertEqual(len(hack.response_time), 100)
+        self.assertGreaterEqual(reconnections, 100 // 7 - self.size)
+        self.assertEqual(self.server.accepted, self.size + reconnections)
+        self.assertLessEqual(self.server.peak, self.size)
+
+    def test_async_attack(self):
+        self.assertEqual(self.async_attack(), Credentials("admin", "aB3x"))
+        self.assertGreater(self.server.accepted, self.size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,24 @@
+import asyncio
+import queue
 import random
-from sqlalchemy import create_engine, Column, Integer, String
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+from sqlalchemy import bindparam, create_engine, event, func, text, Column, Integer, String
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 # project requirement sqlachemy : 1.3.19
+try:
+    # only needed to validate the card numbers by batch
+    import numpy as np
+except ImportError:
+    np = None
 
 class MoneyTransferError(Exception):
     pass
@@ -12,13 +28,57 @@ class CardNumberError(Exception):
     pass
 class CardNotFoundError(Exception):
     pass
+class SchemaMigrationError(Exception):
+    pass
+class AmountError(Exception):
+    pass
+
+
+class TransferStatus(Enum):
+    SUCCESS = "success"
+    INVALID_AMOUNT = "invalid amount"
+    SAME_CARD = "same card"
+    CARD_NOT_FOUND = "card not found"
+    NOT_ENOUGH_MONEY = "not enough money"
+
+
+class LedgerOperation(Enum):
+    # balance of a card found when the ledger was added to its database
+    OPENING = "opening"
+    INCOME = "income"
+    TRANSFER_IN = "transfer in"
+    TRANSFER_OUT = "transfer out"
+    # the remaining balance leaves with the closed card
+    CLOSE = "close"
+
+
+@dataclass
+class TransferResult:
+    status: TransferStatus
+    # balance of the debited card after the transfer, when it succeeds
+    balance: Optional[int] = None
+
+@dataclass
+class BalanceMismatch:
+    number: str
+    balance: int
+    # sum of the ledger entries of the card
+    ledger_balance: int
+
+@dataclass
+class CardValidation:
+    # True for each number with a correct check digit
+    valid: "np.ndarray"
+    # expected check digit of each number, -1 when the digits before it are not all numbers
+    check_digit: "np.ndarray"
+
 
 Base = declarative_base()
 
 class Card(Base):
     __tablename__ = 'card'
     id = Column(Integer, primary_key=True)
-    number = Column(String)
+    number = Column(String, index=True, unique=True)
     pin = Column(String)
     balance = Column(Integer)
 
@@ -49,6 +109,17 @@ class Card(Base):
         customer_number = self._generate_number(9)
         return f"{code_bank}{customer_number}{Card.checksum(code_bank + customer_number)}"
 
+    @staticmethod
+    def generate_credentials(code_bank, count, excluded=()):
+        # Draws count distinct (number, pin) without creating Card objects, the numbers in excluded are skipped
+        credentials = {}
+        while len(credentials) < count:
+            customer_number = f"{random.randrange(10 ** 9):09d}"
+            number = f"{code_bank}{customer_number}{Card.checksum(code_bank + customer_number)}"
+            if number not in excluded and number not in credentials:
+                credentials[number] = f"{random.randrange(10 ** 4):04d}"
+        return list(credentials.items())
+
     def _generate_pin(self):
         return self._generate_number(4)
 
@@ -58,12 +129,78 @@ class Card(Base):
         test_check = sequence[-1]
         return check == test_check
 
+    @staticmethod
+    def _checksum_digits(digits):
+        # Same computation as checksum on a matrix of digits, one row by sequence
+        doubled = digits[:, 0::2] * 2
+        total = (doubled - 9 * (doubled > 9)).sum(axis=1) + digits[:, 1::2].sum(axis=1)
+        return (10 - total % 10) % 10
+
+    @staticmethod
+    def _group_by_length(sequences):
+        # Gives the rows of the sequences of each length, with their code points as a matrix
+        if np is None:
+            raise ImportError("numpy is required to check the card numbers by batch")
+        sequences = np.asarray(sequences, dtype=str)
+        lengths = np.char.str_len(sequences) if sequences.size else np.zeros(0, dtype=int)
+        for length in np.unique(lengths):
+            rows = np.flatnonzero(lengths == length)
+            codes = sequences[rows].astype(f"<U{max(length, 1)}").view(np.uint32).reshape(len(rows), -1)[:, :length]
+            yield length, rows, codes.astype(np.int64) - ord("0")
+
+    @staticmethod
+    def checksum_batch(sequences):
+        # checksum of each sequence as an int, -1 for a sequence which is not made of digits
+        sequences_count = len(sequences)
+        check_digit = np.full(sequences_count, -1, dtype=np.int8)
+        for length, rows, digits in Card._group_by_length(sequences):
+            is_number = ((digits >= 0) & (digits <= 9)).all(axis=1)
+            check_digit[rows[is_number]] = Card._checksum_digits(digits[is_number])
+        return check_digit
+
+    @staticmethod
+    def validate_cards(numbers):
+        # validate_card of each number, along with the check digit each number should end with
+        numbers_count = len(numbers)
+        valid = np.zeros(numbers_count, dtype=bool)
+        check_digit = np.full(numbers_count, -1, dtype=np.int8)
+        for length, rows, digits in Card._group_by_length(numbers):
+            if length == 0:
+                continue
+            # As for validate_card, only the digits before the check digit must be numbers
+            is_number = ((digits[:, :-1] >= 0) & (digits[:, :-1] <= 9)).all(axis=1)
+            rows, digits = rows[is_number], digits[is_number]
+            check_digit[rows] = Card._checksum_digits(digits[:, :-1])
+            valid[rows] = check_digit[rows] == digits[:, -1]
+        return CardValidation(valid=valid, check_digit=check_digit)
+
     def __str__(self):
         return f"Card number: {self.number} - Pin: {self.pin} - Balance: {self.balance}"
 
 
+class LedgerEntry(Base):
+    # Append-only history of the balance changes, the balance of a card is the sum of the amounts of its entries
+    __tablename__ = 'ledger'
+    id = Column(Integer, primary_key=True)
+    number = Column(String, index=True)
+    operation = Column(String)
+    amount = Column(Integer)
+
+
+# Callables given the name and the duration in seconds of each query, ie to record the latencies of a load test
+query_hooks = []
+
+
+def _call_query_hooks(func, start):
+    if query_hooks:
+        elapsed = time.perf_counter() - start
+        for hook in query_hooks:
+            hook(func.__name__, elapsed)
+
+
 def query(func):
     def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
         session = self.Session()
         try:
             result = func(self, session, *args, **kwargs)
@@ -71,33 +208,292 @@ def query(func):
             return result
         finally:
             session.close()
+            _call_query_hooks(func, start)
+
+    return wrapper
+
+
+def batched(func):
+    # A write operation: in group commit mode it shares the transaction of the other operations of its batch
+    run_alone = query(func)
+
+    def wrapper(self, *args, **kwargs):
+        if self.committer is None:
+            return run_alone(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return self.committer.submit(lambda session: func(self, session, *args, **kwargs)).result()
+        finally:
+            _call_query_hooks(func, start)
 
     return wrapper
 
 
+class GroupCommitter:
+    """
+    Runs the write operations submitted by many threads in batches, with one commit, and so one sync, per batch.
+    A thread waits for the commit of the batch of its operation, the operations are never acknowledged before.
+    """
+
+    def __init__(self, Session, batch_size=100, max_delay=0.002):
+        self.Session = Session
+        self.batch_size = batch_size
+        # time the first operation of a batch waits for others to join
+        self.max_delay = max_delay
+        self.batches = 0
+        self.operations = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+        self._thread.start()
+
+    def submit(self, operation):
+        future = Future()
+        self._queue.put((future, operation))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def __run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self.__commit(batch)
+
+    def __commit(self, batch):
+        session = self.Session()
+        try:
+            results = [operation(session) for _, operation in batch]
+            session.commit()
+        except Exception:
+            session.rollback()
+            # One operation failed: each one is run again alone, so the others still succeed
+            for future, operation in batch:
+                self.__commit_alone(future, operation)
+            return
+        finally:
+            session.close()
+        self.batches += 1
+        self.operations += len(batch)
+        for (future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def __commit_alone(self, future, operation):
+        session = self.Session()
+        try:
+            result = operation(session)
+            session.commit()
+        except Exception as e:
+            future.set_exception(e)
+            return
+        finally:
+            session.close()
+        self.batches += 1
+        self.operations += 1
+        future.set_result(result)
+
+
+class BalanceCache:
+    # LRU cache of the balances by card number, shared between the threads of a BankService
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._balances = OrderedDict()
+        # incremented by each invalidation, a balance read before an invalidation is not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        reads = self.hits + self.misses
+        return self.hits / reads if reads else 0.0
+
+    def get(self, number, load):
+        with self._lock:
+            if number in self._balances:
+                self.hits += 1
+                self._balances.move_to_end(number)
+                return self._balances[number]
+            self.misses += 1
+            generation = self._generation
+        balance = load(number)
+        with self._lock:
+            # a write committed while the balance was read makes it possibly stale
+            if generation == self._generation and balance is not None:
+                self._balances[number] = balance
+                if len(self._balances) > self.size:
+                    self._balances.popitem(last=False)
+        return balance
+
+    def invalidate(self, *numbers):
+        with self._lock:
+            self._generation += 1
+            for number in numbers:
+                self._balances.pop(number, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._balances.clear()
+
+
+def _move_duplicate_cards(connection):
+    # A number issued more than once keeps its first card, the others are moved to card_duplicate to be settled by
+    # hand. The table is only created when there are duplicates
+    duplicates = "FROM card WHERE number IS NOT NULL AND id NOT IN (SELECT MIN(id) FROM card GROUP BY number)"
+    if connection.execute(text(f"SELECT 1 {duplicates} LIMIT 1")).scalar() is None:
+        return
+    connection.execute(text("CREATE TABLE IF NOT EXISTS card_duplicate AS SELECT * FROM card WHERE 0"))
+    connection.execute(text(f"INSERT INTO card_duplicate SELECT * {duplicates}"))
+    connection.execute(text(f"DELETE {duplicates}"))
+
+
 class Bank:
     _IIN_CODE = "400000"
-    engine = None
+    # Steps bringing the schema from the version of their index to the next one, the version of a database is kept
+    # in its user_version. A step is a statement, or a function run on the connection when it depends on the data
+    _MIGRATIONS = [
+        # the duplicates are moved aside so the unique index can be created
+        [_move_duplicate_cards,
+         "CREATE UNIQUE INDEX IF NOT EXISTS ix_card_number ON card (number)"],
+        # the ledger table is created with the others, it starts with the balances already there
+        [f"INSERT INTO ledger (number, operation, amount) "
+         f"SELECT number, '{LedgerOperation.OPENING.value}', balance FROM card WHERE balance != 0"],
+    ]
+    _engines = {}
+
+    def __init__(self, path="card.s3db", pool_size=None, busy_timeout=5.0, cache_size=0, group_commit=0):
+        # Without pool_size, the engine is the one of the interactive menu. With pool_size, the connections are
+        # pooled and shared between threads, in WAL mode so the readers do not wait for the writer
+        url = f"sqlite:///{path}"
+        # the busy timeout is set on each connection of a pooled engine, so it is part of the engine looked up
+        key = (url, pool_size, busy_timeout)
+        if key not in Bank._engines:
+            engine = Bank._create_engine(url, pool_size, busy_timeout)
+            Base.metadata.create_all(engine)
+            Bank._migrate(engine)
+            Bank._engines[key] = engine
+        self.engine = Bank._engines[key]
+
+        self.Session = sessionmaker(bind=self.engine)
+        # With cache_size, the balances are read through an LRU cache invalidated by every write
+        self.balance_cache = BalanceCache(cache_size) if cache_size else None
+        # With group_commit, the writes of concurrent threads are committed by batches of up to that many operations
+        self.committer = GroupCommitter(self.Session, batch_size=group_commit) if group_commit else None
+
+    def close(self):
+        if self.committer is not None:
+            self.committer.close()
 
-    def __init__(self):
-        if Bank.engine is None:
-            Bank.engine = create_engine("sqlite:///card.s3db")
-            Base.metadata.create_all(Bank.engine)
+    @staticmethod
+    def _create_engine(url, pool_size, busy_timeout):
+        if pool_size is None:
+            return create_engine(url)
+        engine = create_engine(url, poolclass=QueuePool, pool_size=pool_size, max_overflow=0,
+                               connect_args={"timeout": busy_timeout, "check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragma(connection, _):
+            cursor = connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # each commit is synced before it returns, so an acknowledged transfer survives a crash: NORMAL would
+            # skip the sync under WAL and could lose the last commits. The group commit amortizes the syncs instead
+            cursor.execute("PRAGMA synchronous=FULL")
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+            cursor.close()
+
+        return engine
 
-        self.Session = sessionmaker(bind=Bank.engine)
+    @staticmethod
+    def _migrate(engine):
+        with engine.begin() as connection:
+            version = connection.execute(text("PRAGMA user_version")).scalar()
+            for target_version in range(version + 1, len(Bank._MIGRATIONS) + 1):
+                try:
+                    for step in Bank._MIGRATIONS[target_version - 1]:
+                        if callable(step):
+                            step(connection)
+                        else:
+                            connection.execute(text(step))
+                except Exception as e:
+                    raise SchemaMigrationError(f"Migration to version {target_version} failed: {e}") from e
+                connection.execute(text(f"PRAGMA user_version = {target_version}"))
+
+    def create_account(self, attempts=3):
+        # A number issued meanwhile by another connection is caught by the unique index and the card is drawn
+        # again, as in BankService.create_cards. The card is only shown once it is stored
+        for attempt in range(attempts):
+            try:
+                card = self._create_account()
+                break
+            except IntegrityError:
+                if attempt == attempts - 1:
+                    raise
+        print("\nYour card has been created")
+        print(f"Your card number is:\n{card.number}")
+        print(f"Your card code is:\n{card.pin}")
+        return card
 
     @query
-    def create_account(self, session):
-        print("\nYour card has been created")
-        card = Card(Bank._IIN_CODE)
-        session.add(Card(number=card.number,
-                         pin=card.pin,
-                         balance=card.balance))
+    def _create_account(self, session):
+        (number, pin), = Card.generate_credentials(Bank._IIN_CODE, 1)
+        session.execute(Card.__table__.insert(), {"number": number, "pin": pin, "balance": 0})
+        # not bound to the session, so it is still readable once the session is closed
+        return Card(number=number, pin=pin, balance=0)
 
     @query
-    def log_in(self, session):
+    def create_accounts(self, session, count, batch_size=10000):
+        # Bulk creation in a single transaction: nothing is printed and the cards are inserted by batches
+        credentials = dict(Card.generate_credentials(Bank._IIN_CODE, count))
+        # only the generated numbers are looked up, through the index on the numbers, the ones already issued
+        # are drawn again until none is
+        pending = list(credentials)
+        while pending:
+            taken = Bank._issued_numbers(session, pending)
+            for number in taken:
+                del credentials[number]
+            replacements = Card.generate_credentials(Bank._IIN_CODE, len(taken), excluded=credentials.keys() | taken)
+            credentials.update(replacements)
+            pending = [number for number, _ in replacements]
+        credentials = list(credentials.items())
+        for start in range(0, len(credentials), batch_size):
+            session.execute(Card.__table__.insert(),
+                            [{"number": number, "pin": pin, "balance": 0}
+                             for number, pin in credentials[start:start + batch_size]])
+        return credentials
+
+    # compiled once, the list of numbers is expanded at each execution
+    _ISSUED_NUMBERS = text("SELECT number FROM card WHERE number IN :numbers") \
+        .bindparams(bindparam("numbers", expanding=True))
+
+    @staticmethod
+    def _issued_numbers(session, numbers, chunk_size=500):
+        # The numbers already in the card table, looked up by chunks below the SQLite limit of bound parameters
+        return {number for start in range(0, len(numbers), chunk_size)
+                for number, in session.execute(Bank._ISSUED_NUMBERS, {"numbers": numbers[start:start + chunk_size]})}
+
+    def log_in(self):
         card_number = input("\nEnter your card number:\n")
         code = input("Enter your PIN:\n")
+        return self.authenticate(card_number, code)
+
+    @query
+    def authenticate(self, session, card_number, code):
         # We need to create a new object so the object is no more related to the session which is closed at each request
         card = session.query(Card).filter(Card.number == card_number, Card.pin == code).first()
         if card is None:
@@ -117,27 +513,179 @@ class Bank:
         for account in session.query(Card).all():
             print(account)
 
-    @query
-    def get_balance(self, session, account):
-        card = session.query(Card).filter(Card.number == account.number).first().balance
-        return card
+    def get_balance(self, account):
+        if self.balance_cache is None:
+            return self._read_balance(account.number)
+        return self.balance_cache.get(account.number, self._read_balance)
 
     @query
-    def add_income(self, session, account, balance):
-        card = session.query(Card).filter(Card.number == account.number).first()
-        new_balance = card.balance + balance
-        # update in db and the current object
-        session.query(Card).filter(Card.number == account.number).update({Card.balance: new_balance})
-        account.balance = new_balance
+    def _read_balance(self, session, number):
+        # None for a card which does not exist, or no longer does
+        return session.query(Card.balance).filter(Card.number == number).scalar()
+
+    def add_income(self, account, balance):
+        self._add_income(account, balance)
+        # invalidated once committed, so no reader can cache the balance from before the income
+        self._invalidate_balance(account.number)
+
+    @batched
+    def _add_income(self, session, account, balance):
+        # The increment is done by the database, so concurrent incomes are not lost
+        credited = session.query(Card).filter(Card.number == account.number) \
+            .update({Card.balance: Card.balance + balance}, synchronize_session=False)
+        if credited == 0:
+            raise CardNotFoundError
+        session.add(LedgerEntry(number=account.number, operation=LedgerOperation.INCOME.value, amount=balance))
+        # update the current object
+        account.balance = session.query(Card.balance).filter(Card.number == account.number).scalar()
+
+    def close_account(self, account):
+        self._close_account(account)
+        self._invalidate_balance(account.number)
+
+    @batched
+    def _close_account(self, session, account):
+        # The update changes nothing but takes the write lock, so no transfer can credit the card between the read
+        # of its balance and its deletion
+        if not session.query(Card).filter(Card.number == account.number) \
+                .update({Card.balance: Card.balance}, synchronize_session=False):
+            return
+        balance = session.query(Card.balance).filter(Card.number == account.number).scalar()
+        if session.query(Card).filter(Card.number == account.number).delete() and balance:
+            session.add(LedgerEntry(number=account.number, operation=LedgerOperation.CLOSE.value, amount=-balance))
+
+    def transfer(self, number_from, number_to, amount):
+        result = self._transfer(number_from, number_to, amount)
+        if result.status == TransferStatus.SUCCESS:
+            self._invalidate_balance(number_from, number_to)
+        return result
+
+    @batched
+    def _transfer(self, session, number_from, number_to, amount):
+        # Debit and credit in one transaction, the debit only happens if the balance is enough at this very moment
+        if amount <= 0:
+            return TransferResult(TransferStatus.INVALID_AMOUNT)
+        if number_from == number_to:
+            return TransferResult(TransferStatus.SAME_CARD)
+        debited = session.query(Card).filter(Card.number == number_from, Card.balance >= amount) \
+            .update({Card.balance: Card.balance - amount}, synchronize_session=False)
+        if debited == 0:
+            exists = session.query(Card.id).filter(Card.number == number_from).first() is not None
+            return TransferResult(TransferStatus.NOT_ENOUGH_MONEY if exists else TransferStatus.CARD_NOT_FOUND)
+        credited = session.query(Card).filter(Card.number == number_to) \
+            .update({Card.balance: Card.balance + amount}, synchronize_session=False)
+        if credited == 0:
+            # the debit is given back rather than rolled back, the transaction may hold other operations of a batch
+            session.query(Card).filter(Card.number == number_from) \
+                .update({Card.balance: Card.balance + amount}, synchronize_session=False)
+            return TransferResult(TransferStatus.CARD_NOT_FOUND)
+        session.add_all([
+            LedgerEntry(number=number_from, operation=LedgerOperation.TRANSFER_OUT.value, amount=-amount),
+            LedgerEntry(number=number_to, operation=LedgerOperation.TRANSFER_IN.value, amount=amount),
+        ])
+        balance = session.query(Card.balance).filter(Card.number == number_from).scalar()
+        return TransferResult(TransferStatus.SUCCESS, balance)
 
     @query
-    def close_account(self, session, account):
-        session.query(Card).filter(Card.number == account.number).delete()
+    def audit_balances(self, session):
+        return Bank._find_mismatches(session)
 
-    @query
-    def transfer_money(self, session, account, amount, account_to_transfer):
-        session.query(Card).filter(Card.number == account.number).update({Card.balance: account.balance - amount})
-        session.query(Card).filter(Card.number == account_to_transfer.number).update({Card.balance: account_to_transfer.balance + amount})
+    @staticmethod
+    def _find_mismatches(session):
+        # Cards whose balance is not the sum of their ledger entries
+        ledger_balance = func.coalesce(func.sum(LedgerEntry.amount), 0)
+        rows = session.query(Card.number, Card.balance, ledger_balance) \
+            .outerjoin(LedgerEntry, LedgerEntry.number == Card.number) \
+            .group_by(Card.id) \
+            .having(Card.balance != ledger_balance)
+        return [BalanceMismatch(number, balance, ledger) for number, balance, ledger in rows]
+
+    def rebuild_balances(self):
+        mismatches = self._rebuild_balances()
+        if self.balance_cache is not None:
+            self.balance_cache.clear()
+        return mismatches
+
+    @batched
+    def _rebuild_balances(self, session):
+        # Sets the balances back to the sums of the ledger, gives the cards which were wrong
+        mismatches = Bank._find_mismatches(session)
+        for mismatch in mismatches:
+            session.query(Card).filter(Card.number == mismatch.number) \
+                .update({Card.balance: mismatch.ledger_balance}, synchronize_session=False)
+        return mismatches
+
+    def _invalidate_balance(self, *numbers):
+        if self.balance_cache is not None:
+            self.balance_cache.invalidate(*numbers)
+
+    def transfer_money(self, account, amount, account_to_transfer):
+        result = self.transfer(account.number, account_to_transfer.number, amount)
+        if result.status == TransferStatus.SUCCESS:
+            account.balance = result.balance
+        return result
+
+
+class BankService:
+    """
+    Headless access to the Bank operations, safe to use from several threads or asyncio tasks.
+    Each call runs in its own session on a pooled engine, the async calls run in a thread pool of the same size.
+    """
+
+    def __init__(self, path="card.s3db", workers=8, busy_timeout=5.0, cache_size=0, group_commit=0):
+        self._bank = Bank(path, pool_size=workers, busy_timeout=busy_timeout, cache_size=cache_size,
+                          group_commit=group_commit)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def create_card(self):
+        return self.create_cards(1)[0]
+
+    def create_cards(self, count, attempts=3):
+        # Only the drawn numbers are checked before the insert, so a number issued meanwhile by a concurrent
+        # request is caught by the unique index: the transaction is rolled back and the cards are drawn again
+        for attempt in range(attempts):
+            try:
+                return self._bank.create_accounts(count)
+            except IntegrityError:
+                if attempt == attempts - 1:
+                    raise
+
+    def log_in(self, number, pin):
+        return self._bank.authenticate(number, pin)
+
+    def get_balance(self, number):
+        return self._bank.get_balance(Card(number=number))
+
+    def add_income(self, number, amount):
+        account = Card(number=number)
+        self._bank.add_income(account, amount)
+        return account.balance
+
+    def transfer(self, number_from, number_to, amount):
+        return self._bank.transfer(number_from, number_to, amount)
+
+    def close_account(self, number):
+        self._bank.close_account(Card(number=number))
+
+    def audit_balances(self):
+        return self._bank.audit_balances()
+
+    def rebuild_balances(self):
+        return self._bank.rebuild_balances()
+
+    @property
+    def cache_hit_rate(self):
+        cache = self._bank.balance_cache
+        return None if cache is None else cache.hit_rate
+
+    async def call(self, operation, *args):
+        # ie: await service.call(service.transfer, number_from, number_to, amount)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, operation, *args)
+
+    def close(self):
+        self._executor.shutdown()
+        self._bank.close()
+        self._bank.engine.dispose()
 
 
 class MenuBank:
@@ -228,11 +776,16 @@ class MenuBank:
                 raise SameCardError
             else:
                 amount = int(input("Enter how much money you want to transfer:\n"))
-                reserve = self._bank.get_balance(self._account_logged)
-                if amount > reserve:
-                    raise MoneyTransferError
-                else:
-                    self._bank.transfer_money(self._account_logged, amount, account_to_transfer)
+                result = self._bank.transfer_money(self._account_logged, amount, account_to_transfer)
+                match result.status:
+                    case TransferStatus.INVALID_AMOUNT:
+                        raise AmountError
+                    case TransferStatus.SAME_CARD:
+                        raise SameCardError
+                    case TransferStatus.CARD_NOT_FOUND:
+                        raise CardNotFoundError
+                    case TransferStatus.NOT_ENOUGH_MONEY:
+                        raise MoneyTransferError
         except CardNotFoundError:
             print("Such a card does not exist.")
         except CardNumberError:
@@ -241,6 +794,8 @@ class MenuBank:
             print("You can't transfer money to the same account!")
         except MoneyTransferError:
             print("Not enough money!")
+        except AmountError:
+            print("The amount must be positive.")
         else:
             print("Success!")
         finally:
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from banking import Bank, BankService
+
+
+def lookup_latency(bank, numbers, lookups):
+    # Mean time of get_account_by_number on random existing cards
+    sample = random.choices(numbers, k=lookups)
+    start = time.perf_counter()
+    for number in sample:
+        bank.get_account_by_number(number)
+    return (time.perf_counter() - start) / lookups
+
+
+def run_lookup(sizes, lookups):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        bank = Bank(os.path.join(directory, "card.s3db"))
+        numbers = []
+        for size in sorted(sizes):
+            start = time.perf_counter()
+            numbers.extend(number for number, _ in bank.create_accounts(size - len(numbers)))
+            creation = time.perf_counter() - start
+            results.append({
+                "rows": size,
+                "creation_seconds": creation,
+                "lookup_mean_seconds": lookup_latency(bank, numbers, lookups),
+            })
+        bank.engine.dispose()
+    return {"python": sys.version.split()[0], "lookups": lookups, "results": results}
+
+
+def service_throughput(path, workers, accounts, operations, cache_size=0, group_commit=0):
+    # Transactions per second of a mix of transfers, incomes and balance reads sent by a thread pool,
+    # along with the hit rate of the balance cache
+    service = BankService(path, workers=workers, cache_size=cache_size, group_commit=group_commit)
+    numbers = [number for number, _ in service.create_cards(accounts)]
+    for number in numbers:
+        service.add_income(number, 1000)
+
+    def operation(_):
+        number_from, number_to = random.sample(numbers, 2)
+        match random.randrange(3):
+            case 0: service.transfer(number_from, number_to, random.randint(1, 50))
+            case 1: service.add_income(number_from, random.randint(1, 50))
+            case 2: service.get_balance(number_from)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(operation, range(operations)))
+    elapsed = time.perf_counter() - start
+    hit_rate = service.cache_hit_rate
+    service.close()
+    return operations / elapsed, hit_rate
+
+
+def run_service(workers_list, accounts, operations, cache_size=0, group_commit=0):
+    results = []
+    for workers in workers_list:
+        with tempfile.TemporaryDirectory() as directory:
+            tps, hit_rate = service_throughput(os.path.join(directory, "card.s3db"), workers, accounts, operations,
+                                               cache_size, group_commit)
+        results.append({"workers": workers, "transactions_per_second": tps, "cache_hit_rate": hit_rate})
+    return {"python": sys.version.split()[0], "accounts": accounts, "operations": operations,
+            "cache_size": cache_size, "group_commit": group_commit, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the Simple Banking System.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    lookup_parser = subparsers.add_parser("lookup", help="card lookup latency as the card table grows")
+    lookup_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    lookup_parser.add_argument("--lookups", type=int, default=1000)
+    service_parser = subparsers.add_parser("service", help="sustained transactions per second of BankService")
+    service_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    service_parser.add_argument("--accounts", type=int, default=1000)
+    service_parser.add_argument("--operations", type=int, default=5000)
+    service_parser.add_argument("--cache-size", type=int, default=0, help="balance cache size, 0 to disable it")
+    service_parser.add_argument("--group-commit", type=int, default=0,
+                                help="maximum number of writes per commit, 0 to commit each write alone")
+    args = parser.parse_args()
+
+    match args.benchmark:
+        case "lookup":
+            results = run_lookup(args.sizes, args.lookups)
+        case "service":
+            results = run_service(args.workers, args.accounts, args.operations, args.cache_size,
+                                  args.group_commit)
+    print(json.dumps(results, indent=2))
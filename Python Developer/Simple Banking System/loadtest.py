@@ -0,0 +1,209 @@
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+
+import banking
+from banking import Bank, MenuBank
+
+OPERATIONS = ("create", "login", "balance", "income", "transfer")
+
+
+@dataclass
+class WorkloadConfig:
+    operations: int = 2000
+    # cards created before the replay, the logins and transfers are done on them
+    accounts: int = 100
+    # weights of the operations, in the order of OPERATIONS
+    mix: tuple = (1, 2, 4, 2, 2)
+    seed: int = 0
+
+
+class LatencyRecorder:
+    # Durations in seconds by name, of the queries when installed as a query hook, or of the timed operations
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def __call__(self, name, seconds):
+        self.samples[name].append(seconds)
+
+    @contextlib.contextmanager
+    def installed(self):
+        banking.query_hooks.append(self)
+        try:
+            yield self
+        finally:
+            banking.query_hooks.remove(self)
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self(name, time.perf_counter() - start)
+
+    @staticmethod
+    def percentile(samples, percent):
+        # nearest rank of sorted samples
+        return samples[max(0, math.ceil(percent / 100 * len(samples)) - 1)]
+
+    def summary(self):
+        summary = {}
+        for name, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            summary[name] = {"count": len(samples),
+                             "p50": self.percentile(samples, 50),
+                             "p95": self.percentile(samples, 95),
+                             "p99": self.percentile(samples, 99)}
+        return summary
+
+
+def generate_workload(config: WorkloadConfig) -> list[tuple]:
+    """
+    Gives the operations to replay with their arguments: the index of the card for a login, a balance or an income,
+    the amount of an income, the index of the card receiving a transfer and its amount.
+    """
+    rng = random.Random(config.seed)
+    workload = []
+    for operation in rng.choices(OPERATIONS, weights=config.mix, k=config.operations):
+        match operation:
+            case "create" | "balance":
+                workload.append((operation,))
+            case "login":
+                workload.append((operation, rng.randrange(config.accounts)))
+            case "income":
+                workload.append((operation, rng.randint(1, 100)))
+            case "transfer":
+                workload.append((operation, rng.randrange(config.accounts), rng.randint(1, 50)))
+    return workload
+
+
+def replay_bank(bank: Bank, credentials: list[tuple], workload: list[tuple], recorder: LatencyRecorder):
+    # Calls the Bank operations as MenuBank does, each operation is timed as a whole
+    account = bank.authenticate(*credentials[0])
+    for operation, *args in workload:
+        with recorder.timed(operation):
+            match operation:
+                case "create":
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        bank.create_account()
+                case "login":
+                    account = bank.authenticate(*credentials[args[0]])
+                case "balance":
+                    bank.get_balance(account)
+                case "income":
+                    bank.add_income(account, args[0])
+                case "transfer":
+                    number_to, amount = credentials[args[0]][0], args[1]
+                    if number_to != account.number:
+                        bank.transfer_money(account, amount, bank.get_account_by_number(number_to))
+
+
+def menu_script(credentials: list[tuple], workload: list[tuple]) -> list[str]:
+    """Gives the inputs typed by a user of MenuBank doing the operations of the workload"""
+    script = []
+    logged = None
+    for operation, *args in workload:
+        if operation in ("create", "login") and logged is not None:
+            script.append("5")
+            logged = None
+        elif operation not in ("create", "login") and logged is None:
+            operation, args = "login", [0]
+            script.extend(("2", *credentials[0]))
+            logged = 0
+        match operation:
+            case "create":
+                script.append("1")
+            case "login":
+                script.extend(("2", *credentials[args[0]]))
+                logged = args[0]
+            case "balance":
+                script.append("1")
+            case "income":
+                script.extend(("2", str(args[0])))
+            case "transfer":
+                # MenuBank refuses the card logged in before asking the amount, replay_bank skips it too
+                if args[0] != logged:
+                    script.extend(("3", credentials[args[0]][0], str(args[1])))
+    script.append("0")
+    return script
+
+
+def replay_menu(bank: Bank, credentials: list[tuple], workload: list[tuple]):
+    # Runs MenuBank on the scripted inputs, its output is dropped, the latencies come from the query hooks
+    inputs = iter(menu_script(credentials, workload))
+    real_input = builtins.input
+    builtins.input = lambda prompt="": next(inputs)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            MenuBank(bank)
+    except SystemExit:
+        pass
+    finally:
+        builtins.input = real_input
+
+
+def run(config: WorkloadConfig, driver="bank", cache_size=0, group_commit=0) -> dict:
+    recorder = LatencyRecorder()
+    query_recorder = LatencyRecorder()
+    with tempfile.TemporaryDirectory() as directory:
+        # the group commit thread shares the connections, which needs the pooled engine
+        bank = Bank(os.path.join(directory, "card.s3db"), pool_size=1 if group_commit else None,
+                    cache_size=cache_size, group_commit=group_commit)
+        credentials = bank.create_accounts(config.accounts)
+        workload = generate_workload(config)
+        start = time.perf_counter()
+        with query_recorder.installed():
+            if driver == "bank":
+                replay_bank(bank, credentials, workload, recorder)
+            else:
+                replay_menu(bank, credentials, workload)
+        elapsed = time.perf_counter() - start
+        bank.close()
+        bank.engine.dispose()
+    return {
+        "python": sys.version.split()[0],
+        "driver": driver,
+        "config": asdict(config),
+        "cache_size": cache_size,
+        "group_commit": group_commit,
+        "seconds": elapsed,
+        "operations": recorder.summary(),
+        "queries": query_recorder.summary(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays a synthetic workload on a temporary bank and gives "
+                                                 "the p50/p95/p99 latencies in seconds.")
+    parser.add_argument("--driver", choices=("bank", "menu"), default="bank",
+                        help="call the Bank operations directly, or type the inputs of MenuBank")
+    parser.add_argument("--operations", type=int, default=WorkloadConfig.operations)
+    parser.add_argument("--accounts", type=int, default=WorkloadConfig.accounts)
+    parser.add_argument("--mix", type=int, nargs=len(OPERATIONS), default=WorkloadConfig.mix,
+                        metavar="WEIGHT", help=f"weights of {', '.join(OPERATIONS)}")
+    parser.add_argument("--seed", type=int, default=WorkloadConfig.seed)
+    parser.add_argument("--cache-size", type=int, default=0, help="balance cache size, 0 to disable it")
+    parser.add_argument("--group-commit", type=int, default=0,
+                        help="maximum number of writes per commit, 0 to commit each write alone")
+    parser.add_argument("--output", help="File to write the JSON results to, stdout by default")
+    args = parser.parse_args()
+
+    results = run(WorkloadConfig(operations=args.operations, accounts=args.accounts, mix=tuple(args.mix),
+                                 seed=args.seed),
+                  driver=args.driver, cache_size=args.cache_size, group_commit=args.group_commit)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
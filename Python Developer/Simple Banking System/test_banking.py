@@ -0,0 +1,387 @@
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from banking import Bank, BankService, Card, CardNotFoundError, TransferStatus, np
+
+
+class BankTestCase(unittest.TestCase):
+    # A bank on a database of its own, removed after the test
+    pool_size = None
+    cache_size = 0
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "card.s3db")
+        self.bank = Bank(self.path, pool_size=self.pool_size, cache_size=self.cache_size)
+        self.addCleanup(self.bank.engine.dispose)
+        self.addCleanup(self.bank.close)
+
+    def card_numbers(self):
+        with self.bank.engine.connect() as connection:
+            return [number for number, in connection.execute(text("SELECT number FROM card"))]
+
+
+class CreateAccountsTest(BankTestCase):
+    def test_numbers_are_unique_and_valid(self):
+        credentials = self.bank.create_accounts(2500, batch_size=1000)
+        numbers = [number for number, _ in credentials]
+        self.assertEqual(len(set(numbers)), 2500)
+        self.assertEqual(sorted(self.card_numbers()), sorted(numbers))
+        for number, pin in credentials:
+            self.assertRegex(number, r"^400000\d{10}$")
+            self.assertTrue(Card.validate_card(number))
+            self.assertRegex(pin, r"^\d{4}$")
+        self.assertEqual(self.bank.authenticate(*credentials[0]).number, numbers[0])
+
+    def test_issued_numbers_are_drawn_again(self):
+        # the same seed draws the same numbers again, which are all issued already
+        self.addCleanup(random.setstate, random.getstate())
+        random.seed(11)
+        issued = self.bank.create_accounts(50)
+        random.seed(11)
+        credentials = self.bank.create_accounts(60)
+        numbers = {number for number, _ in credentials}
+        self.assertEqual(len(numbers), 60)
+        self.assertFalse(numbers & {number for number, _ in issued})
+        self.assertEqual(len(set(self.card_numbers())), 110)
+
+    def test_account_drawn_again_on_a_number_collision(self):
+        # the same seed draws the same number, the second card is drawn again and only shown once stored
+        self.addCleanup(random.setstate, random.getstate())
+        random.seed(12)
+        with contextlib.redirect_stdout(io.StringIO()):
+            issued = self.bank.create_account()
+        random.seed(12)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            card = self.bank.create_account()
+        self.assertNotEqual(card.number, issued.number)
+        self.assertEqual(output.getvalue(), f"\nYour card has been created\nYour card number is:\n{card.number}\n"
+                                            f"Your card code is:\n{card.pin}\n")
+        self.assertEqual(sorted(self.card_numbers()), sorted([issued.number, card.number]))
+        self.assertEqual(self.bank.authenticate(card.number, card.pin).number, card.number)
+
+    def test_no_account(self):
+        self.assertEqual(self.bank.create_accounts(0), [])
+        self.assertEqual(self.card_numbers(), [])
+
+
+class TransferTest(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        (self.number_a, _), (self.number_b, _) = self.bank.create_accounts(2)
+        self.bank.add_income(Card(number=self.number_a), 100)
+
+    def balances(self):
+        return [self.bank.get_balance(Card(number=number)) for number in (self.number_a, self.number_b)]
+
+    def test_success(self):
+        result = self.bank.transfer(self.number_a, self.number_b, 40)
+        self.assertEqual((result.status, result.balance), (TransferStatus.SUCCESS, 60))
+        self.assertEqual(self.balances(), [60, 40])
+        # the whole balance can be sent
+        self.assertEqual(self.bank.transfer(self.number_a, self.number_b, 60).status, TransferStatus.SUCCESS)
+        self.assertEqual(self.balances(), [0, 100])
+
+    def test_refused_transfers_leave_the_balances(self):
+        unknown = "4000000000000002"
+        cases = [(self.number_a, self.number_b, 0, TransferStatus.INVALID_AMOUNT),
+                 (self.number_a, self.number_b, -5, TransferStatus.INVALID_AMOUNT),
+                 (self.number_a, self.number_a, 10, TransferStatus.SAME_CARD),
+                 (unknown, self.number_b, 10, TransferStatus.CARD_NOT_FOUND),
+                 (self.number_a, unknown, 10, TransferStatus.CARD_NOT_FOUND),
+                 (self.number_a, self.number_b, 101, TransferStatus.NOT_ENOUGH_MONEY),
+                 (self.number_b, self.number_a, 1, TransferStatus.NOT_ENOUGH_MONEY)]
+        for number_from, number_to, amount, status in cases:
+            with self.subTest(status=status, amount=amount):
+                result = self.bank.transfer(number_from, number_to, amount)
+                self.assertEqual((result.status, result.balance), (status, None))
+                self.assertEqual(self.balances(), [100, 0])
+
+    def test_transfer_money_updates_the_account(self):
+        account = self.bank.get_account_by_number(self.number_a)
+        self.bank.transfer_money(account, 30, Card(number=self.number_b))
+        self.assertEqual(account.balance, 70)
+        self.bank.transfer_money(account, 500, Card(number=self.number_b))
+        self.assertEqual(account.balance, 70)
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "card.s3db")
+
+    def open_bank(self):
+        bank = Bank(self.path)
+        self.addCleanup(bank.engine.dispose)
+        return bank
+
+    def create_legacy_database(self, cards):
+        # the schema of the bank before the migrations, at user_version 0
+        connection = sqlite3.connect(self.path)
+        with connection:
+            connection.execute("CREATE TABLE card (id INTEGER PRIMARY KEY, number TEXT, pin TEXT, "
+                               "balance INTEGER DEFAULT 0)")
+            connection.executemany("INSERT INTO card (number, pin, balance) VALUES (?, ?, ?)", cards)
+        connection.close()
+
+    @staticmethod
+    def fetch(bank, statement):
+        with bank.engine.connect() as connection:
+            return connection.execute(text(statement)).fetchall()
+
+    def assert_up_to_date(self, bank):
+        self.assertEqual(self.fetch(bank, "PRAGMA user_version"), [(len(Bank._MIGRATIONS),)])
+        indexes = {name: unique for _, name, unique, *_ in self.fetch(bank, "PRAGMA index_list(card)")}
+        self.assertEqual(indexes.get("ix_card_number"), 1)
+
+    def test_fresh_database(self):
+        bank = self.open_bank()
+        self.assert_up_to_date(bank)
+        self.assertEqual(self.fetch(bank, "SELECT * FROM ledger"), [])
+        # without duplicates there is nothing to settle, and no table for them
+        self.assertEqual(self.fetch(bank, "SELECT name FROM sqlite_master WHERE name = 'card_duplicate'"), [])
+
+    def test_upgrade_from_version_0(self):
+        self.create_legacy_database([("4000001111111111", "1234", 100), ("4000002222222222", "4321", 0)])
+        bank = self.open_bank()
+        self.assert_up_to_date(bank)
+        self.assertEqual(self.fetch(bank, "SELECT number, operation, amount FROM ledger"),
+                         [("4000001111111111", "opening", 100)])
+        self.assertEqual(bank.audit_balances(), [])
+        self.assertEqual(bank.authenticate("4000002222222222", "4321").balance, 0)
+        self.assertEqual(self.fetch(bank, "SELECT name FROM sqlite_master WHERE name = 'card_duplicate'"), [])
+        with self.assertRaises(IntegrityError), bank.engine.begin() as connection:
+            connection.execute(text("INSERT INTO card (number, pin, balance) VALUES ('4000002222222222', '0', 0)"))
+
+    def test_duplicate_numbers_are_moved_aside(self):
+        self.create_legacy_database([("4000001111111111", "1234", 100), ("4000002222222222", "4321", 0),
+                                     ("4000001111111111", "9999", 40), ("4000001111111111", "5555", 0)])
+        bank = self.open_bank()
+        self.assert_up_to_date(bank)
+        self.assertEqual(self.fetch(bank, "SELECT id, number, pin, balance FROM card ORDER BY id"),
+                         [(1, "4000001111111111", "1234", 100), (2, "4000002222222222", "4321", 0)])
+        self.assertEqual(self.fetch(bank, "SELECT id, number, pin, balance FROM card_duplicate ORDER BY id"),
+                         [(3, "4000001111111111", "9999", 40), (4, "4000001111111111", "5555", 0)])
+        self.assertEqual(bank.audit_balances(), [])
+        # the migrated database opens again, with an engine of its own so the migrations are checked again
+        bank.engine.dispose()
+        del Bank._engines[f"sqlite:///{self.path}", None, 5.0]
+        self.assert_up_to_date(self.open_bank())
+
+
+class BalanceCacheTest(BankTestCase):
+    cache_size = 2
+
+    def setUp(self):
+        super().setUp()
+        (self.number_a, _), (self.number_b, _), (self.number_c, _) = self.bank.create_accounts(3)
+        self.cache = self.bank.balance_cache
+
+    def balance(self, number):
+        return self.bank.get_balance(Card(number=number))
+
+    def assert_counters(self, hits, misses):
+        self.assertEqual((self.cache.hits, self.cache.misses), (hits, misses))
+        self.assertAlmostEqual(self.cache.hit_rate, hits / (hits + misses))
+
+    def test_reads_are_cached(self):
+        self.assertEqual(self.cache.hit_rate, 0.0)
+        self.assertEqual(self.balance(self.number_a), 0)
+        self.assert_counters(0, 1)
+        # a change made behind the bank is not seen until the card is invalidated
+        with self.bank.engine.begin() as connection:
+            connection.execute(text("UPDATE card SET balance = 7 WHERE number = :number"), {"number": self.number_a})
+        self.assertEqual(self.balance(self.number_a), 0)
+        self.assertEqual(self.balance(self.number_a), 0)
+        self.assert_counters(2, 1)
+
+    def test_least_recently_used_balance_is_evicted(self):
+        for number in (self.number_a, self.number_b, self.number_a, self.number_c, self.number_a, self.number_b):
+            self.balance(number)
+        # b is evicted by c, then read again
+        self.assert_counters(2, 4)
+
+    def test_writes_invalidate_the_cached_balance(self):
+        self.balance(self.number_a)
+        self.bank.add_income(Card(number=self.number_a), 100)
+        self.assertEqual(self.balance(self.number_a), 100)
+        self.assert_counters(0, 2)
+
+        self.balance(self.number_b)
+        self.assertEqual(self.bank.transfer(self.number_a, self.number_b, 30).status, TransferStatus.SUCCESS)
+        self.assertEqual([self.balance(self.number_a), self.balance(self.number_b)], [70, 30])
+        self.assert_counters(0, 5)
+        # a refused transfer changes nothing, the balances stay cached
+        self.assertEqual(self.bank.transfer(self.number_b, self.number_a, 500).status, TransferStatus.NOT_ENOUGH_MONEY)
+        self.assertEqual([self.balance(self.number_a), self.balance(self.number_b)], [70, 30])
+        self.assert_counters(2, 5)
+
+        # the ledger of b gets an entry its balance misses, the rebuild fixes the balance
+        with self.bank.engine.begin() as connection:
+            connection.execute(text("INSERT INTO ledger (number, operation, amount) VALUES (:number, 'income', 5)"),
+                               {"number": self.number_b})
+        self.assertEqual(self.balance(self.number_b), 30)
+        self.assertEqual(len(self.bank.rebuild_balances()), 1)
+        self.assertEqual(self.balance(self.number_b), 35)
+        self.assert_counters(3, 6)
+
+        self.bank.close_account(Card(number=self.number_a))
+        self.assertIsNone(self.balance(self.number_a))
+        self.assert_counters(3, 7)
+
+
+class LedgerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "card.s3db")
+
+    def run_concurrent_transfers(self, service, transfers=400):
+        numbers = [number for number, _ in service.create_cards(20)]
+        for number in numbers:
+            service.add_income(number, 100)
+        rng = random.Random(17)
+        orders = [(*rng.sample(numbers, 2), rng.randint(1, 80)) for _ in range(transfers)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda order: service.transfer(*order), orders))
+        balances = [service.get_balance(number) for number in numbers]
+        return numbers, results, balances
+
+    def test_audit_after_concurrent_transfers(self):
+        for group_commit in (0, 16):
+            with self.subTest(group_commit=group_commit):
+                service = BankService(f"{self.path}.{group_commit}", workers=8, group_commit=group_commit)
+                try:
+                    numbers, results, balances = self.run_concurrent_transfers(service)
+                    self.assertEqual({result.status for result in results},
+                                     {TransferStatus.SUCCESS, TransferStatus.NOT_ENOUGH_MONEY})
+                    self.assertEqual(sum(balances), 2000)
+                    self.assertTrue(all(balance >= 0 for balance in balances))
+                    self.assertEqual(service.audit_balances(), [])
+                finally:
+                    service.close()
+
+    def test_pooled_connections_sync_each_commit(self):
+        service = BankService(self.path, workers=2)
+        self.addCleanup(service.close)
+        with service._bank.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            # 2 is FULL
+            self.assertEqual(connection.execute(text("PRAGMA synchronous")).scalar(), 2)
+
+    def test_engines_keep_their_busy_timeout(self):
+        for busy_timeout in (5.0, 0.5):
+            with self.subTest(busy_timeout=busy_timeout):
+                bank = Bank(self.path, pool_size=2, busy_timeout=busy_timeout)
+                self.addCleanup(bank.engine.dispose)
+                with bank.engine.connect() as connection:
+                    self.assertEqual(connection.execute(text("PRAGMA busy_timeout")).scalar(), busy_timeout * 1000)
+
+    def test_rebuild_balances_from_the_ledger(self):
+        service = BankService(self.path, workers=2)
+        self.addCleanup(service.close)
+        number_a, number_b = (number for number, _ in service.create_cards(2))
+        service.add_income(number_a, 100)
+        service.transfer(number_a, number_b, 30)
+        with service._bank.engine.begin() as connection:
+            connection.execute(text("UPDATE card SET balance = 1000 WHERE number = :number"), {"number": number_b})
+        mismatches = service.audit_balances()
+        self.assertEqual([(mismatch.number, mismatch.balance, mismatch.ledger_balance) for mismatch in mismatches],
+                         [(number_b, 1000, 30)])
+        self.assertEqual(len(service.rebuild_balances()), 1)
+        self.assertEqual(service.audit_balances(), [])
+        self.assertEqual([service.get_balance(number_a), service.get_balance(number_b)], [70, 30])
+
+    def test_closed_card_leaves_the_ledger_balanced(self):
+        service = BankService(self.path, workers=2)
+        self.addCleanup(service.close)
+        number_a, number_b = (number for number, _ in service.create_cards(2))
+        service.add_income(number_a, 100)
+        service.transfer(number_a, number_b, 30)
+        service.close_account(number_b)
+        self.assertEqual(service.audit_balances(), [])
+        self.assertEqual(service.transfer(number_a, number_b, 10).status, TransferStatus.CARD_NOT_FOUND)
+
+    def test_card_closed_during_transfers_leaves_the_ledger_balanced(self):
+        service = BankService(self.path, workers=8)
+        self.addCleanup(service.close)
+        source, _ = service.create_card()
+        service.add_income(source, 10_000)
+        closed = [number for number, _ in service.create_cards(10)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for number in closed:
+                transfers = [executor.submit(service.transfer, source, number, 1) for _ in range(20)]
+                service.close_account(number)
+                for transfer in transfers:
+                    transfer.result()
+        # the amount recorded on closing is the balance deleted, whatever was transferred before
+        with service._bank.engine.connect() as connection:
+            totals = dict(connection.execute(text("SELECT number, SUM(amount) FROM ledger GROUP BY number")).fetchall())
+        self.assertEqual([totals.get(number, 0) for number in closed], [0] * len(closed))
+        self.assertEqual(service.audit_balances(), [])
+
+    def test_income_to_an_unknown_card(self):
+        for group_commit in (0, 16):
+            with self.subTest(group_commit=group_commit):
+                service = BankService(f"{self.path}.{group_commit}", workers=2, group_commit=group_commit)
+                try:
+                    number, _ = service.create_card()
+                    with self.assertRaises(CardNotFoundError):
+                        service.add_income("4000009999999999", 50)
+                    service.add_income(number, 20)
+                    with service._bank.engine.connect() as connection:
+                        ledger = connection.execute(text("SELECT number, amount FROM ledger")).fetchall()
+                    self.assertEqual(ledger, [(number, 20)])
+                    self.assertEqual(service.audit_balances(), [])
+                finally:
+                    service.close()
+
+
+@unittest.skipIf(np is None, "numpy is required to check the card numbers by batch")
+class BatchChecksumTest(unittest.TestCase):
+    @staticmethod
+    def is_number(sequence):
+        # only the ASCII digits, int() would also read the other digits of unicode
+        return all(char in "0123456789" for char in sequence)
+
+    def setUp(self):
+        rng = random.Random(15)
+        self.sequences = ["".join(rng.choice("0123456789") for _ in range(rng.randint(1, 19))) for _ in range(2000)]
+        self.sequences += ["", "0", "9", "400000123456789", "4000001234567890"]
+        self.numbers = [sequence + rng.choice((Card.checksum(sequence), rng.choice("0123456789")))
+                        for sequence in self.sequences]
+
+    def test_checksum_batch(self):
+        sequences = self.sequences + ["12a4", "4000 0012", "\uff14\uff10"]
+        self.assertEqual(Card.checksum_batch(sequences).tolist(),
+                         [int(Card.checksum(sequence)) if self.is_number(sequence) else -1 for sequence in sequences])
+
+    def test_validate_cards(self):
+        validation = Card.validate_cards(self.numbers)
+        self.assertEqual(validation.valid.tolist(), [Card.validate_card(number) for number in self.numbers])
+        self.assertEqual(validation.check_digit.tolist(), [int(Card.checksum(number[:-1])) for number in self.numbers])
+
+    def test_validate_cards_not_made_of_digits(self):
+        # only the digits before the check digit must be numbers, a wrong check digit only makes the number invalid
+        validation = Card.validate_cards(["40000a12345678", "4000001234567a", ""])
+        self.assertEqual(validation.valid.tolist(), [False, False, False])
+        self.assertEqual(validation.check_digit.tolist(), [-1, int(Card.checksum("4000001234567")), -1])
+
+    def test_empty_batch(self):
+        self.assertEqual(Card.checksum_batch([]).tolist(), [])
+        self.assertEqual(Card.validate_cards([]).valid.tolist(), [])
+
+if __name__ == "__main__":
+    unittest.main()